@@ -1,19 +1,42 @@
-from langchain_openai import ChatOpenAI
-from langchain_core.prompts import ChatPromptTemplate
-
 from langchain_core.messages import HumanMessage, SystemMessage
+from pydantic import BaseModel, Field, field_validator
 from ..config.settings import settings
-from typing import Dict, Any
+from ..services.llm_cache import llm_cache
+from ..services.llm_clients import Deadline, LLMUnavailable, ainvoke_within, build_chat_model, invoke_within
+from ..services.circuit_breaker import llm_breakers
+from ..services.metrics import StageTimer
+from ..services.structured_output import StructuredOutput
+from ..services.token_usage import estimate_tokens, token_ledger
+from typing import Dict, Any, List, Literal, Optional, Tuple
 import uuid
+import json
 from datetime import datetime
 
+AGENT_VERSION = "v1.0"
+
+class CreditAssessment(BaseModel):
+    """The JSON answer the credit prompt asks the LLM for"""
+    risk_score: int = Field(ge=0, le=1000)
+    decision: Literal["approved", "rejected", "manual_review"]
+    confidence: float = Field(ge=0, le=1)
+    positive_factors: List[str] = []
+    risk_factors: List[str] = []
+    reasoning: str = ""
+    
+    @field_validator("decision", mode="before")
+    @classmethod
+    def _normalize_decision(cls, value):
+        return value.strip().lower().replace(" ", "_") if isinstance(value, str) else value
+
 class CreditAssessmentAgent:
     def __init__(self):
-        self.llm = ChatOpenAI(
-            model=settings.OPENAI_MODEL,
-            api_key=settings.OPENAI_API_KEY,
-            temperature=0.3
-        )
+        self.model = settings.OPENAI_MODEL
+        self.temperature = 0.3
+        self._llm = None  # Built on the first LLM call
+        self.output = StructuredOutput("credit", CreditAssessment)
+        self.prompt_variant = settings.CREDIT_PROMPT_VARIANT
+        self.token_budget = settings.CREDIT_PROMPT_TOKEN_BUDGET
+        self.breaker = llm_breakers["credit"]
         
         self.system_prompt = """You are an expert credit risk assessment agent for a financial institution.
         
@@ -35,10 +58,149 @@ Always provide:
 4. Top 3 positive factors
 5. Top 3 risk factors
 """
+        
+        self.compact_system_prompt = (
+            "Credit risk agent for a financial institution. Score risk 0-1000 (1000 = lowest risk) from "
+            "traditional and alternative data. Decision: >750 approved, 300-750 manual_review, <300 rejected. "
+            "Reply with one JSON object only."
+        )
+    
+    @property
+    def llm(self):
+        if self._llm is None:
+            self._llm = build_chat_model(self.model, self.temperature, "credit")
+        return self._llm
+    
+    @llm.setter
+    def llm(self, value):
+        self._llm = value
     
-    def assess_application(self, application_data: Dict[str, Any]) -> Dict[str, Any]:
+    def assess_application(self, application_data: Dict[str, Any], bypass_cache: bool = False,
+                           timer: StageTimer = None) -> Dict[str, Any]:
         """Assess credit application and return decision"""
         
+        timer = timer or StageTimer("credit_assessment")
+        deadline = Deadline()
+        with timer.stage("prompt_build"):
+            messages, variant = self._build_messages(application_data)
+        try:
+            with timer.stage("llm_call"):
+                content = self._call_llm(messages, variant, bypass_cache, deadline)
+        except LLMUnavailable as e:
+            return self._degraded_result(application_data, timer, e)
+        with timer.stage("json_parse"):
+            result, error = self.output.parse(content)
+        if result is None:
+            with timer.stage("json_repair"):
+                result = self.output.repair(self.llm, content, error, variant, deadline)
+            self._cache_repaired(messages, result)
+        
+        return self._build_result(result, timer)
+    
+    async def aassess_application(self, application_data: Dict[str, Any], bypass_cache: bool = False,
+                                  timer: StageTimer = None) -> Dict[str, Any]:
+        """Assess credit application without blocking the event loop"""
+        
+        timer = timer or StageTimer("credit_assessment")
+        deadline = Deadline()
+        with timer.stage("prompt_build"):
+            messages, variant = self._build_messages(application_data)
+        try:
+            with timer.stage("llm_call"):
+                content = await self._acall_llm(messages, variant, bypass_cache, deadline)
+        except LLMUnavailable as e:
+            return self._degraded_result(application_data, timer, e)
+        with timer.stage("json_parse"):
+            result, error = self.output.parse(content)
+        if result is None:
+            with timer.stage("json_repair"):
+                result = await self.output.arepair(self.llm, content, error, variant, deadline)
+            await self._acache_repaired(messages, result)
+        
+        return self._build_result(result, timer)
+    
+    def _cache_key(self, messages: List) -> str:
+        return llm_cache.make_key(messages, self.model, self.temperature, "credit", AGENT_VERSION)
+    
+    def _call_llm(self, messages: List, variant: str = "full", bypass_cache: bool = False, deadline: Deadline = None) -> str:
+        """Invoke the LLM within the deadline, serving identical prompts from the response cache"""
+        
+        key = self._cache_key(messages)
+        cached = llm_cache.get(key, bypass=bypass_cache)
+        if cached is not None:
+            token_ledger.record_cache_hit("credit", variant)
+            return cached
+        
+        with self.breaker.guard():
+            response = invoke_within(self.llm, messages, deadline, "credit")
+        token_ledger.record("credit", variant, "score", response, messages)
+        if self.output.validate(response.content)[0] is not None:  # Never cache an answer that would fail to parse
+            llm_cache.set(key, response.content)
+        return response.content
+    
+    async def _acall_llm(self, messages: List, variant: str = "full", bypass_cache: bool = False, deadline: Deadline = None) -> str:
+        """Async variant of _call_llm"""
+        
+        key = self._cache_key(messages)
+        cached = await llm_cache.aget(key, bypass=bypass_cache)
+        if cached is not None:
+            token_ledger.record_cache_hit("credit", variant)
+            return cached
+        
+        with self.breaker.guard():
+            response = await ainvoke_within(self.llm, messages, deadline, "credit")
+        token_ledger.record("credit", variant, "score", response, messages)
+        if self.output.validate(response.content)[0] is not None:
+            await llm_cache.aset(key, response.content)
+        return response.content
+    
+    def _cache_repaired(self, messages: List, result: Optional[Dict[str, Any]]):
+        """Cache a repaired answer in canonical form so the same prompt needs no second repair"""
+        if result is not None:
+            llm_cache.set(self._cache_key(messages), json.dumps(result))
+    
+    async def _acache_repaired(self, messages: List, result: Optional[Dict[str, Any]]):
+        if result is not None:
+            await llm_cache.aset(self._cache_key(messages), json.dumps(result))
+    
+    def _build_messages(self, application_data: Dict[str, Any]) -> Tuple[List, str]:
+        """Build the messages for an application in the configured prompt variant, within the token budget"""
+        
+        variant = self.prompt_variant
+        messages = self._build_variant(variant, application_data)
+        if variant != "compact" and 0 < self.token_budget < estimate_tokens(messages):
+            token_ledger.record_budget_trim("credit", variant)
+            variant = "compact"
+            messages = self._build_variant(variant, application_data)
+        return messages, variant
+    
+    def _build_variant(self, variant: str, application_data: Dict[str, Any]) -> List:
+        if variant == "compact":
+            return self._build_compact_messages(application_data)
+        return self._build_full_messages(application_data)
+    
+    def _build_compact_messages(self, application_data: Dict[str, Any]) -> List:
+        """Key=value prompt carrying the same fields as the full one"""
+        
+        alternative_data = application_data.get('alternative_data') or {}
+        prompt = (
+            f"customer={application_data.get('customer_id')} requested={application_data.get('requested_amount'):.2f} "
+            f"purpose={application_data.get('loan_purpose')} employment={application_data.get('employment_status')} "
+            f"income={application_data.get('annual_income', 0):.2f} bureau_score={application_data.get('credit_bureau_score', 'N/A')} "
+            f"utility_score={alternative_data.get('utility_payment_score', 'N/A')} "
+            f"rent_history={alternative_data.get('rent_payment_history', 'N/A')}\n"
+            "JSON keys: risk_score (0-1000), decision (approved|rejected|manual_review), confidence (0-1), "
+            "positive_factors (top 3), risk_factors (top 3), reasoning (one sentence)"
+        )
+        
+        return [
+            SystemMessage(content=self.compact_system_prompt),
+            HumanMessage(content=prompt)
+        ]
+    
+    def _build_full_messages(self, application_data: Dict[str, Any]) -> List:
+        """Build system and user messages for an application"""
+        
         # Create prompt with application data
         prompt = f"""
 Analyze this credit application:
@@ -51,8 +213,8 @@ Annual Income: ${application_data.get('annual_income', 0):,.2f}
 Credit Bureau Score: {application_data.get('credit_bureau_score', 'N/A')}
 
 Alternative Data:
-- Utility Payment Score: {application_data.get('alternative_data', {}).get('utility_payment_score', 'N/A')}
-- Rent Payment History: {application_data.get('alternative_data', {}).get('rent_payment_history', 'N/A')}
+- Utility Payment Score: {(application_data.get('alternative_data') or {}).get('utility_payment_score', 'N/A')}
+- Rent Payment History: {(application_data.get('alternative_data') or {}).get('rent_payment_history', 'N/A')}
 
 Provide your assessment in JSON format:
 {{
@@ -65,20 +227,47 @@ Provide your assessment in JSON format:
 }}
 """
         
-        # Invoke LLM
-        messages = [
+        return [
             SystemMessage(content=self.system_prompt),
             HumanMessage(content=prompt)
         ]
+    
+    def _degraded_result(self, application_data: Dict[str, Any], timer: StageTimer, unavailable: LLMUnavailable) -> Dict[str, Any]:
+        """Band the bureau score when the LLM is unavailable (circuit open, failing or out of time)"""
+        
+        with timer.stage("degraded"):
+            score = application_data.get("credit_bureau_score")
+            income = float(application_data.get("annual_income") or 0)
+            amount = float(application_data.get("requested_amount") or 0)
+            affordable = income > 0 and amount <= 0.5 * income
+            
+            if score is None:
+                decision, factors = "manual_review", ["No bureau score"]
+            elif score < settings.CREDIT_DEGRADED_REJECT_SCORE:
+                decision, factors = "rejected", [f"Bureau score {score} below {settings.CREDIT_DEGRADED_REJECT_SCORE}"]
+            elif score >= settings.CREDIT_DEGRADED_APPROVE_SCORE and affordable:
+                decision, factors = "approved", []
+            else:
+                decision, factors = "manual_review", [] if affordable else ["Requested amount above half of annual income"]
+            
+            result = {
+                # Bureau range 300-850 stretched onto the agent's 0-1000 scale
+                "risk_score": 500 if score is None else int(round(min(max((score - 300) / 550, 0.0), 1.0) * 1000)),
+                "decision": decision,
+                "confidence": 0.5,
+                "positive_factors": [f"Bureau score {score}"] if decision == "approved" else [],
+                "risk_factors": factors,
+                "reasoning": f"Degraded mode: bureau-score banding - LLM unavailable ({unavailable})",
+                "decided_by": "degraded",
+                "degraded": True
+            }
         
-        response = self.llm.invoke(messages)
+        return self._build_result(result, timer)
+    
+    def _build_result(self, result: Optional[Dict[str, Any]], timer: StageTimer) -> Dict[str, Any]:
+        """Attach metadata to a parsed LLM decision, or send the application to manual review when there is none"""
         
-        # Parse response (simplified - add proper JSON parsing)
-        import json
-        try:
-            result = json.loads(response.content)
-        except:
-            # Fallback if JSON parsing fails
+        if result is None:
             result = {
                 "risk_score": 500,
                 "decision": "manual_review",
@@ -90,7 +279,8 @@ Provide your assessment in JSON format:
         
         # Add metadata
         result["application_id"] = str(uuid.uuid4())
-        result["agent_version"] = "v1.0"
+        result["timings_ms"] = timer.as_dict()
+        result["agent_version"] = AGENT_VERSION
         result["timestamp"] = datetime.utcnow().isoformat()
         
         return result
@@ -1,17 +1,51 @@
-from langchain_openai import ChatOpenAI
 from langchain_core.messages import HumanMessage, SystemMessage
+from pydantic import BaseModel, Field, field_validator
 from ..config.settings import settings
-from typing import Dict, Any
+from ..services.llm_cache import llm_cache
+from ..services.llm_clients import Deadline, LLMUnavailable, ainvoke_within, build_chat_model, invoke_within
+from ..services.circuit_breaker import llm_breakers
+from ..services.fast_path import fast_path_scorer
+from ..services.fraud_model import fraud_model_scorer
+from ..services.feature_store import CustomerProfile
+from ..services.metrics import StageTimer
+from ..services.structured_output import StructuredOutput
+from ..services.token_usage import estimate_tokens, token_ledger
+from typing import Dict, Any, List, Literal, Optional, Tuple
 import uuid
+import json
 from datetime import datetime
 
+AGENT_VERSION = "v1.0"
+
+class FraudAssessment(BaseModel):
+    """The JSON answer the fraud prompt asks the LLM for"""
+    fraud_probability: float = Field(ge=0, le=100)
+    risk_level: Literal["low", "medium", "high", "critical"]
+    action: Literal["approve", "flag", "block", "verify"]
+    anomalies: List[str] = []
+    reasoning: str = ""
+    
+    @field_validator("risk_level", "action", mode="before")
+    @classmethod
+    def _lowercase(cls, value):
+        return value.strip().lower() if isinstance(value, str) else value
+    
+    @field_validator("fraud_probability", mode="before")
+    @classmethod
+    def _strip_percent(cls, value):
+        return value.strip().rstrip("%") if isinstance(value, str) else value
+
 class FraudDetectionAgent:
     def __init__(self):
-        self.llm = ChatOpenAI(
-            model=settings.OPENAI_MODEL,
-            api_key=settings.OPENAI_API_KEY,
-            temperature=0.1  # Low temperature for consistent fraud detection
-        )
+        self.model = settings.OPENAI_MODEL
+        self.temperature = 0.1  # Low temperature for consistent fraud detection
+        self._llm = None  # Built on the first LLM call; fast-path decisions never need it
+        self.fast_path = fast_path_scorer
+        self.ml_model = fraud_model_scorer  # In-process challenger, scored next to the LLM
+        self.breaker = llm_breakers["fraud"]
+        self.output = StructuredOutput("fraud", FraudAssessment)
+        self.prompt_variant = settings.FRAUD_PROMPT_VARIANT
+        self.token_budget = settings.FRAUD_PROMPT_TOKEN_BUDGET
         
         self.system_prompt = """You are an expert fraud detection agent for a financial institution.
 
@@ -36,10 +70,203 @@ Thresholds:
 
 Always provide fraud probability, risk level, recommended action, and detected anomalies.
 """
+        
+        # Same rules in a fraction of the tokens, for high-volume or budget-capped traffic
+        self.compact_system_prompt = (
+            "Fraud detection agent for a financial institution. Score fraud probability 0-100 from amount, "
+            "location, velocity, device/IP, merchant category and dormancy signals against the customer's history. "
+            "Actions: >90 block, 60-90 verify, <60 approve (flag if unsure). Reply with one JSON object only."
+        )
     
-    def check_transaction(self, transaction_data: Dict[str, Any], customer_history: Dict[str, Any] = None) -> Dict[str, Any]:
+    @property
+    def llm(self):
+        if self._llm is None:
+            self._llm = build_chat_model(self.model, self.temperature, "fraud")
+        return self._llm
+    
+    @llm.setter
+    def llm(self, value):
+        self._llm = value
+    
+    def check_transaction(self, transaction_data: Dict[str, Any], customer_history: Dict[str, Any] = None,
+                          customer_profile: CustomerProfile = None, bypass_cache: bool = False,
+                          timer: StageTimer = None) -> Dict[str, Any]:
         """Check transaction for fraud indicators"""
         
+        timer = timer or StageTimer("fraud_detection")
+        
+        # Clear-cut cases are settled by the rule scorer; only the ambiguous band reaches the LLM
+        with timer.stage("fast_path"):
+            decision = self.fast_path.score(transaction_data, customer_profile)
+        if decision:
+            return self._add_metadata(decision, transaction_data, timer)
+        
+        assessment, decision = self._model_decision(transaction_data, customer_profile, timer)
+        if decision:
+            return self._add_metadata(decision, transaction_data, timer)
+        
+        deadline = Deadline()
+        with timer.stage("prompt_build"):
+            messages, variant = self._build_messages(transaction_data, customer_history)
+        try:
+            with timer.stage("llm_call"):
+                content = self._call_llm(messages, variant, bypass_cache, deadline)
+        except LLMUnavailable as e:
+            return self._degraded_result(transaction_data, customer_profile, assessment, timer, e)
+        with timer.stage("json_parse"):
+            result, error = self.output.parse(content)
+        if result is None:
+            with timer.stage("json_repair"):
+                result = self.output.repair(self.llm, content, error, variant, deadline)
+            self._cache_repaired(messages, result)
+        
+        result = self._build_result(result, transaction_data, timer)
+        self.ml_model.compare(assessment, result)
+        return result
+    
+    async def acheck_transaction(self, transaction_data: Dict[str, Any], customer_history: Dict[str, Any] = None,
+                                 customer_profile: CustomerProfile = None, bypass_cache: bool = False,
+                                 timer: StageTimer = None) -> Dict[str, Any]:
+        """Check transaction for fraud indicators without blocking the event loop"""
+        
+        timer = timer or StageTimer("fraud_detection")
+        
+        with timer.stage("fast_path"):
+            decision = self.fast_path.score(transaction_data, customer_profile)
+        if decision:
+            return self._add_metadata(decision, transaction_data, timer)
+        
+        assessment, decision = self._model_decision(transaction_data, customer_profile, timer)
+        if decision:
+            return self._add_metadata(decision, transaction_data, timer)
+        
+        deadline = Deadline()
+        with timer.stage("prompt_build"):
+            messages, variant = self._build_messages(transaction_data, customer_history)
+        try:
+            with timer.stage("llm_call"):
+                content = await self._acall_llm(messages, variant, bypass_cache, deadline)
+        except LLMUnavailable as e:
+            return self._degraded_result(transaction_data, customer_profile, assessment, timer, e)
+        with timer.stage("json_parse"):
+            result, error = self.output.parse(content)
+        if result is None:
+            with timer.stage("json_repair"):
+                result = await self.output.arepair(self.llm, content, error, variant, deadline)
+            await self._acache_repaired(messages, result)
+        
+        result = self._build_result(result, transaction_data, timer)
+        self.ml_model.compare(assessment, result)
+        return result
+    
+    def _model_decision(self, transaction_data: Dict[str, Any], customer_profile: Optional[CustomerProfile],
+                        timer: StageTimer) -> Tuple[Optional[Dict[str, Any]], Optional[Dict[str, Any]]]:
+        """(model assessment, model decision) for a transaction the fast path left undecided"""
+        
+        if not self.ml_model.enabled:
+            return None, None
+        with timer.stage("model"):
+            assessment = self.ml_model.score(transaction_data, customer_profile)
+            return assessment, self.ml_model.decide(assessment)
+    
+    def _cache_key(self, messages: List) -> str:
+        return llm_cache.make_key(messages, self.model, self.temperature, "fraud", AGENT_VERSION)
+    
+    def _call_llm(self, messages: List, variant: str = "full", bypass_cache: bool = False, deadline: Deadline = None) -> str:
+        """Invoke the LLM within the deadline, serving identical prompts from the response cache"""
+        
+        key = self._cache_key(messages)
+        cached = llm_cache.get(key, bypass=bypass_cache)
+        if cached is not None:
+            token_ledger.record_cache_hit("fraud", variant)
+            return cached
+        
+        with self.breaker.guard():
+            response = invoke_within(self.llm, messages, deadline, "fraud")
+        token_ledger.record("fraud", variant, "score", response, messages)
+        if self.output.validate(response.content)[0] is not None:  # Never cache an answer that would fail to parse
+            llm_cache.set(key, response.content)
+        return response.content
+    
+    async def _acall_llm(self, messages: List, variant: str = "full", bypass_cache: bool = False, deadline: Deadline = None) -> str:
+        """Async variant of _call_llm"""
+        
+        key = self._cache_key(messages)
+        cached = await llm_cache.aget(key, bypass=bypass_cache)
+        if cached is not None:
+            token_ledger.record_cache_hit("fraud", variant)
+            return cached
+        
+        with self.breaker.guard():
+            response = await ainvoke_within(self.llm, messages, deadline, "fraud")
+        token_ledger.record("fraud", variant, "score", response, messages)
+        if self.output.validate(response.content)[0] is not None:
+            await llm_cache.aset(key, response.content)
+        return response.content
+    
+    def _cache_repaired(self, messages: List, result: Optional[Dict[str, Any]]):
+        """Cache a repaired answer in canonical form so the same prompt needs no second repair"""
+        if result is not None:
+            llm_cache.set(self._cache_key(messages), json.dumps(result))
+    
+    async def _acache_repaired(self, messages: List, result: Optional[Dict[str, Any]]):
+        if result is not None:
+            await llm_cache.aset(self._cache_key(messages), json.dumps(result))
+    
+    def _build_messages(self, transaction_data: Dict[str, Any], customer_history: Dict[str, Any] = None) -> Tuple[List, str]:
+        """Build the messages for a transaction in the configured prompt variant, within the token budget"""
+        
+        variant = self.prompt_variant
+        messages = self._build_variant(variant, transaction_data, customer_history)
+        if self.token_budget <= 0 or estimate_tokens(messages) <= self.token_budget:
+            return messages, variant
+        
+        # Over budget: switch to the compact prompt, then drop the history block
+        token_ledger.record_budget_trim("fraud", variant)
+        variant = "compact"
+        messages = self._build_variant(variant, transaction_data, customer_history)
+        if customer_history and estimate_tokens(messages) > self.token_budget:
+            messages = self._build_variant(variant, transaction_data, None)
+        return messages, variant
+    
+    def _build_variant(self, variant: str, transaction_data: Dict[str, Any], customer_history: Dict[str, Any] = None) -> List:
+        if variant == "compact":
+            return self._build_compact_messages(transaction_data, customer_history)
+        return self._build_full_messages(transaction_data, customer_history)
+    
+    def _build_compact_messages(self, transaction_data: Dict[str, Any], customer_history: Dict[str, Any] = None) -> List:
+        """Key=value prompt carrying the same fields as the full one"""
+        
+        location = transaction_data.get('location') or {}
+        prompt = (
+            f"txn={transaction_data.get('transaction_id')} customer={transaction_data.get('customer_id')} "
+            f"amount={transaction_data.get('amount'):.2f} merchant={transaction_data.get('merchant_id')} "
+            f"category={transaction_data.get('merchant_category', 'Unknown')} "
+            f"lat={location.get('lat')} long={location.get('long')} "
+            f"device={transaction_data.get('device_fingerprint', 'Unknown')} ip={transaction_data.get('ip_address', 'Unknown')}\n"
+        )
+        if customer_history:
+            prompt += (
+                f"history: avg_amount={customer_history.get('avg_amount', 0):.2f} "
+                f"merchants={','.join(customer_history.get('common_merchants', []))} "
+                f"locations={','.join(customer_history.get('common_locations', []))} "
+                f"frequency={customer_history.get('frequency', 'Unknown')}\n"
+            )
+        else:
+            prompt += "history: none\n"
+        prompt += (
+            "JSON keys: fraud_probability (0-100), risk_level (low|medium|high|critical), "
+            "action (approve|flag|block|verify), anomalies (list), reasoning (one sentence)"
+        )
+        
+        return [
+            SystemMessage(content=self.compact_system_prompt),
+            HumanMessage(content=prompt)
+        ]
+    
+    def _build_full_messages(self, transaction_data: Dict[str, Any], customer_history: Dict[str, Any] = None) -> List:
+        """Build system and user messages for a transaction"""
+        
         # Build context from customer history
         history_context = "No previous transaction history available."
         if customer_history:
@@ -58,7 +285,7 @@ Transaction ID: {transaction_data.get('transaction_id')}
 Customer ID: {transaction_data.get('customer_id')}
 Amount: ${transaction_data.get('amount'):,.2f}
 Merchant: {transaction_data.get('merchant_id')} (Category: {transaction_data.get('merchant_category', 'Unknown')})
-Location: Lat {transaction_data.get('location', {}).get('lat')}, Long {transaction_data.get('location', {}).get('long')}
+Location: Lat {(transaction_data.get('location') or {}).get('lat')}, Long {(transaction_data.get('location') or {}).get('long')}
 Device Fingerprint: {transaction_data.get('device_fingerprint', 'Unknown')}
 IP Address: {transaction_data.get('ip_address', 'Unknown')}
 
@@ -74,31 +301,47 @@ Provide your analysis in JSON format:
 }}
 """
         
-        messages = [
+        return [
             SystemMessage(content=self.system_prompt),
             HumanMessage(content=prompt)
         ]
+    
+    def _degraded_result(self, transaction_data: Dict[str, Any], customer_profile: Optional[CustomerProfile],
+                         assessment: Optional[Dict[str, Any]], timer: StageTimer, unavailable: LLMUnavailable) -> Dict[str, Any]:
+        """Score locally when the LLM is unavailable (circuit open, failing or out of time)"""
         
-        response = self.llm.invoke(messages)
+        with timer.stage("degraded"):
+            result = self.fast_path.degraded(transaction_data, customer_profile, assessment)
+        result["reasoning"] += f" - LLM unavailable ({unavailable})"
+        result["degraded"] = True
+        return self._add_metadata(result, transaction_data, timer)
+    
+    def _build_result(self, result: Optional[Dict[str, Any]], transaction_data: Dict[str, Any], timer: StageTimer) -> Dict[str, Any]:
+        """Attach metadata to a parsed LLM decision, or flag the transaction when there is none"""
         
-        # Parse response
-        import json
-        try:
-            result = json.loads(response.content)
-        except:
+        if result is None:
             result = {
                 "fraud_probability": 50.0,
                 "risk_level": "medium",
                 "action": "flag",
                 "anomalies": ["Unable to parse response"],
-                "reasoning": "System error - flagged for manual review"
+                "reasoning": "System error - flagged for manual review",
+                "decided_by": "fallback"
             }
+        else:
+            result["decided_by"] = "llm"
+        
+        return self._add_metadata(result, transaction_data, timer)
+    
+    def _add_metadata(self, result: Dict[str, Any], transaction_data: Dict[str, Any], timer: StageTimer) -> Dict[str, Any]:
+        """Attach identifiers, timings and versioning to a decision"""
         
         # Add metadata
         result["transaction_id"] = transaction_data.get('transaction_id')
         result["case_id"] = str(uuid.uuid4())
-        result["detection_time_ms"] = 200  # Placeholder
-        result["agent_version"] = "v1.0"
+        result["detection_time_ms"] = int(round(timer.elapsed_ms()))
+        result["timings_ms"] = timer.as_dict()
+        result["agent_version"] = AGENT_VERSION
         result["timestamp"] = datetime.utcnow().isoformat()
         
         return result
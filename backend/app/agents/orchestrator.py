@@ -1,24 +1,54 @@
 from langgraph.graph import StateGraph, END
-from langgraph.prebuilt import ToolNode
-from typing import TypedDict, Annotated, Sequence
+from typing import TypedDict, Annotated, Sequence, Optional
 from langchain_core.messages import BaseMessage, HumanMessage, AIMessage
+from langchain_core.runnables import RunnableLambda
+import asyncio
 import operator
+from ..config.settings import settings
 from .credit_agent import CreditAssessmentAgent
 from .fraud_agent import FraudDetectionAgent
+from ..services.feature_store import feature_store
+from ..services.metrics import StageTimer
+from ..services.shadow import shadow_scorer
 
-# Define state
+# Loan application plus a fraud check of its disbursement, scored by both agents concurrently
+COMBINED_TASK = "credit_with_fraud_check"
+
+def _merge(left: dict, right: dict) -> dict:
+    """Reducer for per-agent results written by parallel branches"""
+    return {**left, **right}
+
+# Define state; nodes return only the keys they change
 class AgentState(TypedDict):
     messages: Annotated[Sequence[BaseMessage], operator.add]
     next_agent: str
     task_type: str
     data: dict
+    options: dict
+    results: Annotated[dict, _merge]  # Agent name -> its decision
     result: dict
 
 class OrchestratorAgent:
     def __init__(self):
-        self.credit_agent = CreditAssessmentAgent()
-        self.fraud_agent = FraudDetectionAgent()
+        self._credit_agent = None  # Agents are built on first use
+        self._fraud_agent = None
+        self.feature_store = feature_store
+        self.shadow = shadow_scorer
         self.graph = self._build_graph()
+        # Caps concurrent LLM-backed requests so a burst cannot exhaust the event loop or rate limits
+        self._semaphore = asyncio.Semaphore(settings.MAX_CONCURRENT_LLM_CALLS)
+    
+    @property
+    def credit_agent(self) -> CreditAssessmentAgent:
+        if self._credit_agent is None:
+            self._credit_agent = CreditAssessmentAgent()
+        return self._credit_agent
+    
+    @property
+    def fraud_agent(self) -> FraudDetectionAgent:
+        if self._fraud_agent is None:
+            self._fraud_agent = FraudDetectionAgent()
+        return self._fraud_agent
     
     def _build_graph(self):
         """Build LangGraph workflow"""
@@ -26,10 +56,10 @@ class OrchestratorAgent:
         # Create graph
         workflow = StateGraph(AgentState)
         
-        # Add nodes
+        # Add nodes (agent nodes carry both sync and async implementations)
         workflow.add_node("router", self._route_request)
-        workflow.add_node("credit_agent", self._credit_node)
-        workflow.add_node("fraud_agent", self._fraud_node)
+        workflow.add_node("credit_agent", RunnableLambda(self._credit_node, afunc=self._acredit_node))
+        workflow.add_node("fraud_agent", RunnableLambda(self._fraud_node, afunc=self._afraud_node))
         workflow.add_node("finalizer", self._finalize_result)
         
         # Add edges
@@ -43,59 +73,175 @@ class OrchestratorAgent:
                 "end": "finalizer"
             }
         )
+        # A combined task fans out to both agents; finalizer runs once both have returned
         workflow.add_edge("credit_agent", "finalizer")
         workflow.add_edge("fraud_agent", "finalizer")
         workflow.add_edge("finalizer", END)
         
         return workflow.compile()
     
-    def _route_request(self, state: AgentState) -> AgentState:
-        """Determine which agent should handle the request"""
-        task_type = state.get("task_type", "")
-        
-        if "credit" in task_type.lower():
-            state["next_agent"] = "credit"
-        elif "fraud" in task_type.lower():
-            state["next_agent"] = "fraud"
-        else:
-            state["next_agent"] = "end"
+    def _timer(self, state: AgentState, pipeline: str = None) -> StageTimer:
+        """Per-request stage timer carried in the options; each branch of a combined task gets its own"""
+        if pipeline and state.get("task_type") == COMBINED_TASK:
+            return state["options"].setdefault(f"{pipeline}_timer", StageTimer(pipeline))
+        return state["options"].setdefault("timer", StageTimer(state.get("task_type", "")))
+    
+    def _agent_data(self, state: AgentState, key: str) -> dict:
+        """The part of the request payload an agent scores ("application" or "transaction" of a combined task)"""
+        return state["data"][key] if state.get("task_type") == COMBINED_TASK else state["data"]
+    
+    def _route_request(self, state: AgentState) -> dict:
+        """Determine which agent(s) should handle the request"""
+        with self._timer(state).stage("routing"):
+            task_type = state.get("task_type", "").lower()
+            
+            if task_type == COMBINED_TASK:
+                next_agent = COMBINED_TASK
+            elif "credit" in task_type:
+                next_agent = "credit"
+            elif "fraud" in task_type:
+                next_agent = "fraud"
+            else:
+                next_agent = "end"
         
-        return state
+        return {"next_agent": next_agent}
     
-    def _determine_next_agent(self, state: AgentState) -> str:
-        """Conditional edge function"""
-        return state.get("next_agent", "end")
+    def _determine_next_agent(self, state: AgentState):
+        """Conditional edge function; a list of agents runs them in parallel"""
+        next_agent = state.get("next_agent", "end")
+        return ["credit", "fraud"] if next_agent == COMBINED_TASK else next_agent
     
-    def _credit_node(self, state: AgentState) -> AgentState:
+    def _credit_node(self, state: AgentState) -> dict:
         """Process credit assessment"""
-        result = self.credit_agent.assess_application(state["data"])
-        state["result"] = result
-        state["messages"].append(AIMessage(content=f"Credit assessment completed: {result['decision']}"))
-        return state
+        result = self.credit_agent.assess_application(
+            self._agent_data(state, "application"),
+            bypass_cache=state["options"].get("bypass_cache", False),
+            timer=self._timer(state, "credit_assessment")
+        )
+        return self._credit_update(result)
     
-    def _fraud_node(self, state: AgentState) -> AgentState:
+    async def _acredit_node(self, state: AgentState) -> dict:
+        """Process credit assessment (async)"""
+        result = await self.credit_agent.aassess_application(
+            self._agent_data(state, "application"),
+            bypass_cache=state["options"].get("bypass_cache", False),
+            timer=self._timer(state, "credit_assessment")
+        )
+        return self._credit_update(result)
+    
+    def _credit_update(self, result: dict) -> dict:
+        return {
+            "results": {"credit": result},
+            "messages": [AIMessage(content=f"Credit assessment completed: {result['decision']}")]
+        }
+    
+    def _fraud_node(self, state: AgentState) -> dict:
         """Process fraud detection"""
-        result = self.fraud_agent.check_transaction(state["data"])
-        state["result"] = result
-        state["messages"].append(AIMessage(content=f"Fraud check completed: {result['action']}"))
-        return state
+        data = self._agent_data(state, "transaction")
+        timer = self._timer(state, "fraud_detection")
+        with timer.stage("history_lookup"):
+            profile = self.feature_store.get(data.get("customer_id"))
+            customer_history = profile.as_history() if profile else None
+        result = self.fraud_agent.check_transaction(
+            data,
+            customer_history=customer_history,
+            customer_profile=profile,
+            bypass_cache=state["options"].get("bypass_cache", False),
+            timer=timer
+        )
+        return self._fraud_update(result)
     
-    def _finalize_result(self, state: AgentState) -> AgentState:
-        """Finalize and return result"""
-        return state
+    async def _afraud_node(self, state: AgentState) -> dict:
+        """Process fraud detection (async)"""
+        data = self._agent_data(state, "transaction")
+        timer = self._timer(state, "fraud_detection")
+        with timer.stage("history_lookup"):
+            profile = self.feature_store.get(data.get("customer_id"))
+            customer_history = profile.as_history() if profile else None
+        result = await self.fraud_agent.acheck_transaction(
+            data,
+            customer_history=customer_history,
+            customer_profile=profile,
+            bypass_cache=state["options"].get("bypass_cache", False),
+            timer=timer
+        )
+        return self._fraud_update(result)
     
-    def process_request(self, task_type: str, data: dict) -> dict:
-        """Main entry point for orchestrator"""
-        
-        initial_state = {
+    def _fraud_update(self, result: dict) -> dict:
+        return {
+            "results": {"fraud": result},
+            "messages": [AIMessage(content=f"Fraud check completed: {result['action']}")]
+        }
+    
+    def _finalize_result(self, state: AgentState) -> dict:
+        """Finalize and return result; a combined task joins both decisions"""
+        results = state.get("results") or {}
+        if state.get("next_agent") == COMBINED_TASK:
+            return {"result": combine_decisions(results["credit"], results["fraud"])}
+        return {"result": results.get(state.get("next_agent"), {})}
+    
+    def _initial_state(self, task_type: str, data: dict, options: dict = None) -> AgentState:
+        """Build the initial graph state for a request"""
+        return {
             "messages": [HumanMessage(content=f"Processing {task_type} request")],
             "task_type": task_type,
             "data": data,
+            "options": options or {},
             "next_agent": "",
+            "results": {},
             "result": {}
         }
+    
+    def process_request(self, task_type: str, data: dict, bypass_cache: bool = False, timer: StageTimer = None) -> dict:
+        """Main entry point for orchestrator"""
+        
+        options = {"bypass_cache": bypass_cache, "timer": timer or StageTimer(task_type)}
         
         # Run graph
-        final_state = self.graph.invoke(initial_state)
+        final_state = self.graph.invoke(self._initial_state(task_type, data, options))
         
         return final_state["result"]
+    
+    async def aprocess_request(self, task_type: str, data: dict, bypass_cache: bool = False, timer: StageTimer = None) -> dict:
+        """Async entry point for orchestrator, used by the API routers; also feeds the shadow challengers"""
+        
+        timer = timer or StageTimer(task_type)
+        options = {"bypass_cache": bypass_cache, "timer": timer}
+        
+        with timer.stage("queue_wait"):
+            await self._semaphore.acquire()
+        try:
+            final_state = await self.graph.ainvoke(self._initial_state(task_type, data, options))
+        finally:
+            self._semaphore.release()
+        
+        if self.shadow.enabled:
+            self._submit_shadow(final_state)
+        return final_state["result"]
+    
+    def _submit_shadow(self, state: AgentState):
+        """Hand the request to the shadow challengers; they run after the champion's decision is returned"""
+        results = state.get("results") or {}
+        if "credit" in results:
+            self.shadow.submit("credit", self._agent_data(state, "application"), results["credit"])
+        if "fraud" in results:
+            data = self._agent_data(state, "transaction")
+            self.shadow.submit("fraud", data, results["fraud"], self.feature_store.get(data.get("customer_id")))
+
+def combine_decisions(credit: dict, fraud: dict) -> dict:
+    """One decision for a loan whose disbursement was fraud-checked: fraud can only make it stricter"""
+    decision = credit["decision"]
+    if fraud["action"] == "block":
+        decision = "rejected"
+    elif fraud["action"] in ("verify", "flag") and decision == "approved":
+        decision = "manual_review"
+    return {"decision": decision, "credit": credit, "fraud": fraud}
+
+_orchestrator: Optional[OrchestratorAgent] = None
+
+def get_orchestrator() -> OrchestratorAgent:
+    """Process-wide orchestrator shared by all routers (FastAPI dependency)"""
+    global _orchestrator
+    if _orchestrator is None:
+        _orchestrator = OrchestratorAgent()
+    return _orchestrator
@@ -1,22 +1,51 @@
 from sqlalchemy import create_engine
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 from .settings import settings
 
+# Async driver for each sync driver a DATABASE_URL override may use
+ASYNC_DRIVERS = {"mysql": "mysql+aiomysql", "sqlite": "sqlite+aiosqlite"}
+
+def async_url(url: str) -> str:
+    """The async-driver equivalent of a sync database URL"""
+    parsed = make_url(url)
+    if parsed.get_backend_name() not in ASYNC_DRIVERS:
+        raise ValueError(f"Unsupported database backend: {parsed.get_backend_name()}")
+    return parsed.set(drivername=ASYNC_DRIVERS[parsed.get_backend_name()]).render_as_string(hide_password=False)
+
 # Database connection URL
-DATABASE_URL = f"mysql+pymysql://{settings.DB_USER}:{settings.DB_PASSWORD}@{settings.DB_HOST}:{settings.DB_PORT}/{settings.DB_NAME}"
+if settings.DATABASE_URL:
+    DATABASE_URL = settings.DATABASE_URL
+    ASYNC_DATABASE_URL = async_url(DATABASE_URL)
+else:
+    DATABASE_URL = f"mysql+pymysql://{settings.DB_USER}:{settings.DB_PASSWORD}@{settings.DB_HOST}:{settings.DB_PORT}/{settings.DB_NAME}"
+    ASYNC_DATABASE_URL = f"mysql+aiomysql://{settings.DB_USER}:{settings.DB_PASSWORD}@{settings.DB_HOST}:{settings.DB_PORT}/{settings.DB_NAME}"
+
+if make_url(DATABASE_URL).get_backend_name() == "sqlite":
+    # SQLite: default pool, wait on the file lock instead of failing concurrent writers
+    engine_options = {"connect_args": {"timeout": 30}}
+else:
+    engine_options = {"pool_size": 10, "max_overflow": 20, "pool_pre_ping": True}  # Verify connections before using
 
 # Create engine with connection pooling
 engine = create_engine(
     DATABASE_URL,
-    pool_size=10,
-    max_overflow=20,
-    pool_pre_ping=True,  # Verify connections before using
-    echo=False  # Set to True for SQL debugging
+    echo=False,  # Set to True for SQL debugging
+    **engine_options
 )
 
-# Session factory
+# Async engine used by the request path so DB I/O does not block the event loop
+async_engine = create_async_engine(
+    ASYNC_DATABASE_URL,
+    echo=False,
+    **engine_options
+)
+
+# Session factories
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+AsyncSessionLocal = async_sessionmaker(async_engine, class_=AsyncSession, autoflush=False, expire_on_commit=False)
 
 # Base class for models
 Base = declarative_base()
@@ -28,3 +57,8 @@ def get_db():
         yield db
     finally:
         db.close()
+
+# Async dependency for FastAPI routes
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
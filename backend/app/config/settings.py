@@ -12,10 +12,119 @@ class Settings(BaseSettings):
     DB_USER: str = "root"
     DB_PASSWORD: str = "Tushar16#"
     DB_NAME: str = "fraud_detection"
+    DATABASE_URL: Optional[str] = None  # Overrides the DB_* settings, e.g. "sqlite:///./fraud_detection.db" for benchmarks
     
     # OpenAI Configuration
-    OPENAI_API_KEY: str
+    OPENAI_API_KEY: Optional[str] = None  # Only needed once a request reaches the LLM
     OPENAI_MODEL: str = "gpt-4.1-mini"  # or gpt-4o-mini
+    OPENAI_BASE_URL: Optional[str] = None  # Another OpenAI-compatible endpoint, e.g. a local stub server
+    MAX_CONCURRENT_LLM_CALLS: int = 32  # Per-worker cap on in-flight orchestrator requests
+    
+    # LLM HTTP client (one pooled client per worker, shared by every agent) and retry budget
+    LLM_HTTP_MAX_CONNECTIONS: int = 64
+    LLM_HTTP_MAX_KEEPALIVE: int = 32  # Idle connections kept open for reuse
+    LLM_HTTP_KEEPALIVE_SECONDS: float = 30.0
+    LLM_HTTP_CONNECT_TIMEOUT_SECONDS: float = 2.0
+    LLM_HTTP_POOL_TIMEOUT_SECONDS: float = 1.0  # Wait for a free pooled connection
+    LLM_CALL_TIMEOUT_SECONDS: float = 15.0  # Per attempt
+    LLM_MAX_RETRIES: int = 2  # On timeouts, connection errors, 429 and 5xx
+    LLM_RETRY_BASE_SECONDS: float = 0.25  # Full-jitter exponential backoff
+    LLM_RETRY_MAX_SECONDS: float = 2.0
+    LLM_REQUEST_DEADLINE_SECONDS: float = 20.0  # Budget per decision, retries and repair included; then the agent degrades
+    
+    # LLM circuit breaker (one per agent); while open, decisions come from the local degraded scorers
+    LLM_BREAKER_ENABLED: bool = True
+    LLM_BREAKER_WINDOW_SECONDS: float = 30.0  # Sliding window of recent calls
+    LLM_BREAKER_MIN_CALLS: int = 10  # Calls in the window before it can trip
+    LLM_BREAKER_ERROR_RATE: float = 0.5  # Trips at this share of failed calls
+    LLM_BREAKER_SLOW_SECONDS: float = 10.0  # A call taking this long counts as slow
+    LLM_BREAKER_SLOW_RATE: float = 0.5  # Trips at this share of slow calls
+    LLM_BREAKER_OPEN_SECONDS: float = 30.0  # Time open before half-open probes are let through
+    LLM_BREAKER_HALF_OPEN_PROBES: int = 3  # Successful probes needed to close again
+    
+    # Degraded credit decisions (LLM unavailable): bureau-score banding
+    CREDIT_DEGRADED_APPROVE_SCORE: int = 740  # At or above, approved if the amount is within half the annual income
+    CREDIT_DEGRADED_REJECT_SCORE: int = 580  # Below, rejected; in between or without a score, manual review
+    
+    # Fraud fast path (rule scorer that settles clear-cut transactions without the LLM)
+    FAST_PATH_ENABLED: bool = True
+    FAST_PATH_APPROVE_BELOW: float = 15.0  # Rule score below this (with enough history) is approved
+    FAST_PATH_BLOCK_ABOVE: float = 90.0  # Rule score at or above this is blocked
+    FAST_PATH_MIN_HISTORY: int = 5  # Minimum past transactions before auto-approving
+    
+    # LLM response cache
+    LLM_CACHE_ENABLED: bool = True
+    LLM_CACHE_MAX_ENTRIES: int = 10000  # In-memory LRU size per worker
+    LLM_CACHE_TTL_SECONDS: float = 86400.0
+    LLM_CACHE_DISK_PATH: Optional[str] = None  # e.g. "cache/llm_cache.sqlite3" to enable the shared disk tier
+    LLM_CACHE_DISK_MAX_MB: int = 512
+    
+    # LLM answer parsing
+    LLM_JSON_MODE: bool = True  # Ask the API for a JSON object (response_format=json_object)
+    LLM_OUTPUT_REPAIR: bool = True  # One short repair call when an answer does not parse or validate
+    
+    # LLM backend: "openai", or a stand-in for load tests without the API ("replay" recorded answers, "synthetic")
+    LLM_BACKEND: str = "openai"
+    LLM_RECORD_PATH: Optional[str] = None  # With the openai backend, append every answer here for later replay
+    LLM_REPLAY_PATH: str = "llm_recordings.jsonl"  # Recorded answers keyed by prompt hash
+    LLM_REPLAY_ON_MISS: str = "synthetic"  # Unrecorded prompt: "synthetic" answer or "error"
+    LLM_REPLAY_LATENCY_SCALE: float = 1.0  # Multiplier on recorded latencies (0 = answer immediately)
+    LLM_SYNTHETIC_LATENCY: str = "lognormal"  # "fixed", "uniform" or "lognormal"
+    LLM_SYNTHETIC_LATENCY_MS: float = 800.0  # Median
+    LLM_SYNTHETIC_LATENCY_P99_MS: float = 3000.0
+    LLM_SYNTHETIC_ERROR_RATE: float = 0.0  # Fraction of stand-in calls that raise, to exercise error handling
+    LLM_SYNTHETIC_SEED: Optional[int] = None
+    
+    # In-process fraud model (logistic regression trained by train_fraud_model.py)
+    FRAUD_MODEL_MODE: str = "off"  # "off", "shadow" (scored next to the LLM, never decides) or "challenger"
+    FRAUD_MODEL_DIR: str = "model_artifacts"  # Versioned artifacts; the promoted one is also saved as fraud_model.json
+    FRAUD_MODEL_PATH: Optional[str] = None  # Artifact to load instead of the promoted one, e.g. to shadow a candidate
+    FRAUD_MODEL_APPROVE_BELOW: float = 5.0  # Challenger mode: a promoted model approves below this probability
+    FRAUD_MODEL_BLOCK_ABOVE: float = 95.0  # and blocks at or above this one; the rest go to the LLM
+    
+    # Shadow challengers: candidate agent configurations re-scoring sampled production decisions off the request path
+    # e.g. [{"name": "mini-compact", "agent": "fraud", "model": "gpt-4o-mini", "prompt_variant": "compact", "sample_rate": 0.1}]
+    SHADOW_CHALLENGERS: list = []
+    SHADOW_SAMPLE_RATE: float = 0.1  # Share of decisions a challenger re-scores unless its entry sets sample_rate
+    SHADOW_MAX_CONCURRENCY: int = 4  # Challenger calls in flight per worker
+    SHADOW_MAX_PENDING: int = 200  # Scheduled challenger calls per worker; further samples are dropped
+    
+    # Prompt variants and token budgets ("full" or "compact"; a budget of 0 means no cap)
+    FRAUD_PROMPT_VARIANT: str = "full"
+    CREDIT_PROMPT_VARIANT: str = "full"
+    FRAUD_PROMPT_TOKEN_BUDGET: int = 0  # Estimated prompt tokens; over it the compact prompt is used, then history dropped
+    CREDIT_PROMPT_TOKEN_BUDGET: int = 0
+    
+    # Customer feature store (in-process aggregates over the transactions table)
+    FEATURE_STORE_TOP_K: int = 5  # Tracked merchants/locations/devices/IPs per customer
+    FEATURE_STORE_RECENT_WINDOW: int = 20  # Recent timestamps kept for velocity checks
+    FEATURE_STORE_SYNC_SECONDS: float = 5.0  # How often to tail rows written by other workers
+    FEATURE_STORE_SYNC_OVERLAP_SECONDS: float = 30.0  # Re-read window for late commits
+    FEATURE_STORE_DEDUP_WINDOW: int = 100000  # Recently applied txn_ids remembered
+    FEATURE_STORE_REBUILD_BATCH: int = 5000  # Rows fetched per round trip when rebuilding
+    
+    # Listing endpoints
+    LIST_PAGE_MAX_SIZE: int = 500  # Max rows per page for /fraud/cases and /credit/applications
+    
+    # Batch scoring
+    FRAUD_BATCH_MAX_SIZE: int = 5000  # Max transactions per /fraud/check/batch call
+    
+    # Write-behind persistence: respond once a decision is queued and journaled, insert it in the background
+    WRITE_BEHIND_ENABLED: bool = False
+    WRITE_BEHIND_MAX_PENDING_ROWS: int = 20000  # Queue bound; callers wait for room beyond it
+    WRITE_BEHIND_ENQUEUE_TIMEOUT_SECONDS: float = 0.25  # Wait for room, then write synchronously
+    WRITE_BEHIND_BATCH_ROWS: int = 1000  # Rows per flush (multi-row INSERTs, one commit)
+    WRITE_BEHIND_LINGER_SECONDS: float = 0.02  # Let concurrent decisions join a flush
+    WRITE_BEHIND_RETRY_SECONDS: float = 1.0  # Back-off while the database is unavailable
+    WRITE_BEHIND_SPILL_DIR: str = "write_behind"  # Journal of queued decisions, replayed on restart
+    WRITE_BEHIND_SEGMENT_DECISIONS: int = 1000  # Decisions per spill file
+    WRITE_BEHIND_FSYNC: bool = False  # fsync every journal append (survive host crashes, not only process crashes)
+    
+    # Bulk credit re-scoring
+    BULK_INPUT_DIR: str = "bulk_inputs"  # Portfolio files the API is allowed to read
+    BULK_CHECKPOINT_DIR: str = "bulk_jobs"  # Checkpoints and per-row error logs
+    BULK_CHUNK_SIZE: int = 500  # Rows per bulk INSERT / checkpoint
+    BULK_WORKERS: int = 16  # Concurrent assessments per chunk
     
     # Security
     SECRET_KEY: str = "7F9K2-PQ5R8-XY3W6-LM1N4-BV7C9-D2Z4A"
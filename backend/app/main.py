@@ -1,13 +1,57 @@
-from fastapi import FastAPI
+from contextlib import asynccontextmanager
+import asyncio
+import logging
+import time
+from fastapi import FastAPI, Request
+from fastapi.responses import PlainTextResponse
 from fastapi.middleware.cors import CORSMiddleware
 from .config.settings import settings
 from .routers import credit, fraud, feedback  # Add feedback
+from .services.feature_store import feature_store
+from .services.llm_cache import llm_cache
+from .services.fast_path import fast_path_scorer
+from .services.fraud_model import fraud_model_scorer
+from .services.coalescing import fraud_check_coalescer
+from .config.database import engine, async_engine
+from .services.metrics import metrics, process_stats, track_db_time, REQUEST_SECONDS
+from .services.llm_clients import llm_http_clients
+from .services.write_behind import write_behind
+from .services.structured_output import parse_stats
+from .services.token_usage import token_ledger
+from .services.shadow import shadow_scorer
+from .services.circuit_breaker import breaker_stats, llm_breakers, OPEN
+from .agents.orchestrator import get_orchestrator
+
+logger = logging.getLogger(__name__)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # One orchestrator (and compiled graph) per worker; agents and LLM clients are built on first use
+    app.state.orchestrator = get_orchestrator()
+    
+    # Warm the customer feature store so the fraud hot path never queries history
+    try:
+        stats = await feature_store.rebuild()
+        logger.info("Feature store built: %s", stats)
+    except Exception as e:
+        logger.warning("Feature store rebuild failed, starting empty: %s", e)
+    sync_task = asyncio.create_task(feature_store.run_sync_loop())
+    # Replays decisions a crashed worker left queued; no-op unless WRITE_BEHIND_ENABLED
+    await write_behind.start()
+    
+    yield
+    
+    sync_task.cancel()
+    await shadow_scorer.stop()  # Let in-flight challengers finish and store their decisions
+    await write_behind.stop()  # Flush queued decisions before the process exits
+    await llm_http_clients.aclose()
 
 app = FastAPI(
     title=settings.PROJECT_NAME,
     version="1.0.0",
     description="AI-Powered Fraud Detection with Self-Learning",
-    docs_url="/docs"
+    docs_url="/docs",
+    lifespan=lifespan
 )
 
 # CORS
@@ -19,6 +63,35 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Scrape-time gauges from the services' own stats
+metrics.register_collector("llm_cache", "LLM response cache statistic", llm_cache.stats)
+metrics.register_collector("fast_path", "Fast-path fraud scorer statistic", fast_path_scorer.stats)
+metrics.register_collector("fraud_model", "In-process fraud model statistic", fraud_model_scorer.stats)
+metrics.register_collector("feature_store", "Customer feature store statistic", feature_store.stats)
+metrics.register_collector("fraud_check_coalescer", "In-flight duplicate coalescing statistic", fraud_check_coalescer.stats)
+metrics.register_collector("write_behind", "Write-behind persistence queue statistic", write_behind.stats)
+metrics.register_collector("llm_output", "LLM answer parsing statistic", parse_stats)
+metrics.register_collector("shadow", "Shadow challenger statistic", shadow_scorer.stats)
+for agent, breaker in llm_breakers.items():
+    metrics.register_collector(f"llm_breaker_{agent}", f"{agent} LLM circuit breaker statistic", breaker.stats)
+metrics.register_collector("process", "Worker process statistic", process_stats)
+track_db_time(engine)
+track_db_time(async_engine.sync_engine)
+
+@app.middleware("http")
+async def record_request_latency(request: Request, call_next):
+    started = time.perf_counter()
+    response = await call_next(request)
+    # Label by route template, not raw path, to keep cardinality bounded
+    route = request.scope.get("route")
+    REQUEST_SECONDS.observe(
+        time.perf_counter() - started,
+        method=request.method,
+        route=route.path if route else "unmatched",
+        status=response.status_code
+    )
+    return response
+
 # Include routers
 app.include_router(credit.router)
 app.include_router(fraud.router)
@@ -26,12 +99,38 @@ app.include_router(feedback.router)  # Add this
 
 @app.get("/health")
 async def health_check():
+    # Still serving while a breaker is open, only from the local degraded scorers
+    degraded = any(breaker.state == OPEN for breaker in llm_breakers.values())
     return {
-        "status": "healthy",
+        "status": "degraded" if degraded else "healthy",
         "service": settings.PROJECT_NAME,
         "version": "1.0.0"
     }
 
+@app.get("/llm-cache/stats")
+async def llm_cache_stats():
+    return llm_cache.stats()
+
+@app.get("/llm-usage/stats")
+async def llm_usage_stats():
+    """Prompt and completion tokens per agent and prompt variant, with the most recent calls"""
+    return token_ledger.stats()
+
+@app.get("/shadow/stats")
+async def shadow_stats():
+    """Challengers scoring in shadow, with their agreement with production so far"""
+    return shadow_scorer.stats()
+
+@app.get("/llm-breakers/stats")
+async def llm_breaker_stats():
+    """State of each agent's LLM circuit breaker; open means decisions are being made in degraded mode"""
+    return breaker_stats()
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def prometheus_metrics():
+    """Latency histograms and service counters in Prometheus text format"""
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
 @app.get("/")
 async def root():
     return {
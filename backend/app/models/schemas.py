@@ -1,4 +1,4 @@
-from sqlalchemy import Column, String, Integer, Float, DateTime, Boolean, Enum, Text, JSON, DECIMAL, ForeignKey
+from sqlalchemy import Column, String, Integer, Float, DateTime, Boolean, Enum, Text, JSON, DECIMAL, ForeignKey, Index
 from sqlalchemy.sql import func
 from ..config.database import Base
 import enum
@@ -51,6 +51,12 @@ class Transaction(Base):
     ip_address = Column(String(45))
     timestamp = Column(DateTime, server_default=func.now(), index=True)
     status = Column(Enum(TransactionStatus), default=TransactionStatus.PENDING)
+    fraud_decision = Column(JSON)  # Full agent decision, replayed for duplicate transaction_ids
+    
+    __table_args__ = (
+        # Recent transactions of one customer, and /fraud/cases filtered by customer
+        Index("ix_transactions_customer_ts", "customer_id", "timestamp"),
+    )
 
 class FraudCase(Base):
     __tablename__ = "fraud_cases"
@@ -66,6 +72,13 @@ class FraudCase(Base):
     investigator_id = Column(String(36))
     resolution_notes = Column(Text)
     resolved_at = Column(DateTime)
+    
+    __table_args__ = (
+        # Status filter plus keyset order; case_id breaks timestamp ties without a sort
+        Index("ix_fraud_cases_status_detected_case", "investigation_status", "detection_timestamp", "case_id"),
+        # Unfiltered keyset pagination of /fraud/cases: (timestamp, case_id) in index order
+        Index("ix_fraud_cases_detected_case", "detection_timestamp", "case_id"),
+    )
 
 class CreditApplication(Base):
     __tablename__ = "credit_applications"
@@ -85,6 +98,16 @@ class CreditApplication(Base):
     explainability_json = Column(JSON)
     human_override = Column(Boolean, default=False)
     override_reason = Column(Text)
+    # Feedback mirrored out of explainability_json so stats can be aggregated on an index
+    feedback_outcome = Column(String(20))
+    prediction_correct = Column(Boolean)
+    
+    __table_args__ = (
+        Index("ix_credit_applications_feedback", "feedback_outcome", "prediction_correct"),
+        # Keyset pagination of /credit/applications, optionally filtered by decision or customer
+        Index("ix_credit_applications_decision_ts", "decision", "decision_timestamp", "app_id"),
+        Index("ix_credit_applications_customer_ts", "customer_id", "decision_timestamp", "app_id"),
+    )
 
 class AgentLearningLog(Base):
     __tablename__ = "agent_learning_logs"
@@ -98,6 +121,46 @@ class AgentLearningLog(Base):
     f1_score = Column(Float)
     auc_roc = Column(Float)
     false_positive_rate = Column(Float)
+    pr_auc = Column(Float)
+    brier_score = Column(Float)
+    decision_threshold = Column(Float)  # Cost-optimal threshold from the evaluation sweep
+    evaluation_json = Column(JSON)  # Calibration bins, downsampled ROC/PR curves, threshold costs
     training_samples = Column(Integer)
     evaluation_date = Column(DateTime, server_default=func.now(), index=True)
     promoted_to_production = Column(Boolean, default=False)
+
+# Confusion-matrix totals per agent and version, maintained as feedback arrives
+class AgentOutcomeCounter(Base):
+    __tablename__ = "agent_outcome_counters"
+    
+    agent_type = Column(String(20), primary_key=True)
+    model_version = Column(String(20), primary_key=True)
+    samples = Column(Integer, nullable=False, default=0)  # Labeled decisions, including ones outside the matrix
+    true_positives = Column(Integer, nullable=False, default=0)
+    false_positives = Column(Integer, nullable=False, default=0)
+    false_negatives = Column(Integer, nullable=False, default=0)
+    true_negatives = Column(Integer, nullable=False, default=0)
+    updated_at = Column(DateTime, server_default=func.now(), onupdate=func.now())
+
+# Challenger decisions scored in shadow next to production, for offline comparison
+class ShadowDecision(Base):
+    __tablename__ = "shadow_decisions"
+    
+    shadow_id = Column(Integer, primary_key=True, autoincrement=True)
+    challenger = Column(String(50), nullable=False)
+    agent_type = Column(String(20), nullable=False)
+    subject_id = Column(String(62), nullable=False)  # txn_id or app_id of the production decision
+    champion_version = Column(String(20))
+    champion_decision = Column(String(20))
+    champion_score = Column(Float)
+    challenger_decision = Column(String(20))
+    challenger_score = Column(Float)
+    agreed = Column(Boolean)
+    latency_ms = Column(Float)
+    challenger_json = Column(JSON)  # Full challenger decision
+    created_at = Column(DateTime, server_default=func.now())
+    
+    __table_args__ = (
+        Index("ix_shadow_decisions_challenger_ts", "challenger", "created_at"),
+        Index("ix_shadow_decisions_subject", "agent_type", "subject_id"),
+    )
@@ -1,10 +1,23 @@
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy import select, insert
+from sqlalchemy.ext.asyncio import AsyncSession
 from pydantic import BaseModel, Field
 from typing import Optional, Dict, Any
-from ..config.database import get_db
-from ..models.schemas import CreditApplication, Customer, DecisionType
-from ..agents.orchestrator import OrchestratorAgent
+from ..config.database import get_async_db
+from ..models.schemas import CreditApplication, Customer, DecisionType, FraudCase, Transaction
+from ..config.settings import settings
+from ..agents.orchestrator import COMBINED_TASK, OrchestratorAgent, get_orchestrator
+from ..services.bulk_credit import BulkCreditJob, application_row, bulk_jobs, job_id_for
+from ..services.metrics import StageTimer
+from ..services.pagination import keyset_page, split_page
+from ..services.feature_store import feature_store
+from ..services.write_behind import write_behind
+from .fraud import (
+    FraudCheckRequest, FraudCheckResponse, fraud_decisions,
+    _fraud_case_row, _stored_transactions, _to_response, _transaction_row
+)
+import asyncio
+import os
 import uuid
 from datetime import datetime
 
@@ -27,52 +40,62 @@ class CreditApplicationResponse(BaseModel):
     confidence: float
     explainability: Dict[str, Any]
     processing_time_ms: int
+    timings_ms: Dict[str, float] = Field(default_factory=dict)
     timestamp: str
+    degraded: bool = False  # Decided by bureau-score banding while the LLM was unavailable
 
-# Initialize orchestrator
-orchestrator = OrchestratorAgent()
+class CombinedAssessmentRequest(BaseModel):
+    application: CreditApplicationRequest
+    disbursement: FraudCheckRequest  # Transaction paying out the loan, fraud-checked alongside the assessment
+
+class CombinedAssessmentResponse(BaseModel):
+    decision: str  # Credit decision, made stricter when the disbursement looks fraudulent
+    overridden_by_fraud_check: bool
+    credit: CreditApplicationResponse
+    fraud: FraudCheckResponse
+    processing_time_ms: int
+    timings_ms: Dict[str, float] = Field(default_factory=dict)
+
+class BulkAssessmentRequest(BaseModel):
+    source_path: str  # CSV or JSONL file, relative to BULK_INPUT_DIR
+    chunk_size: Optional[int] = Field(None, gt=0)
+    workers: Optional[int] = Field(None, gt=0)
 
 @router.post("/assess", response_model=CreditApplicationResponse)
 async def assess_credit_application(
     request: CreditApplicationRequest,
-    db: Session = Depends(get_db)
+    bypass_cache: bool = False,  # Force a fresh LLM call, e.g. for audit replays
+    db: AsyncSession = Depends(get_async_db),
+    orchestrator: OrchestratorAgent = Depends(get_orchestrator)
 ):
     """Assess credit application using AI agent"""
     
+    timer = StageTimer("credit_assessment")
     try:
         # Check if customer exists
-        customer = db.query(Customer).filter(Customer.customer_id == request.customer_id).first()
+        with timer.stage("customer_lookup"):
+            customer = (await db.execute(
+                select(Customer.customer_id).where(Customer.customer_id == request.customer_id)
+            )).scalar_one_or_none()
         if not customer:
             raise HTTPException(status_code=404, detail="Customer not found")
         
         # Process through orchestrator
-        result = orchestrator.process_request(
+        result = await orchestrator.aprocess_request(
             task_type="credit_assessment",
-            data=request.dict()
+            data=request.dict(),
+            bypass_cache=bypass_cache,
+            timer=timer
         )
         
         # Save to database
-        application = CreditApplication(
-            app_id=result["application_id"],
-            customer_id=request.customer_id,
-            requested_amount=request.requested_amount,
-            loan_purpose=request.loan_purpose,
-            employment_status=request.employment_status,
-            annual_income=request.annual_income,
-            credit_bureau_score=request.credit_bureau_score,
-            final_risk_score=result["risk_score"],
-            decision=DecisionType(result["decision"]),
-            agent_version=result["agent_version"],
-            explainability_json={
-                "positive_factors": result["positive_factors"],
-                "risk_factors": result["risk_factors"],
-                "reasoning": result["reasoning"]
-            }
-        )
-        
-        db.add(application)
-        db.commit()
-        db.refresh(application)
+        row = application_row(request.dict(), result)
+        with timer.stage("write_behind_enqueue"):
+            queued = await write_behind.offer({"credit_applications": [row]})
+        if not queued:
+            with timer.stage("db_commit_application"):
+                db.add(CreditApplication(**row))
+                await db.commit()
         
         return CreditApplicationResponse(
             application_id=result["application_id"],
@@ -84,28 +107,137 @@ async def assess_credit_application(
                 "risk_factors": result["risk_factors"],
                 "reasoning": result["reasoning"]
             },
-            processing_time_ms=3200,  # Placeholder
-            timestamp=result["timestamp"]
+            processing_time_ms=int(round(timer.elapsed_ms())),
+            timings_ms=timer.as_dict(),
+            timestamp=result["timestamp"],
+            degraded=result.get("degraded", False)
         )
         
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@router.post("/assess-with-fraud-check", response_model=CombinedAssessmentResponse)
+async def assess_with_fraud_check(
+    request: CombinedAssessmentRequest,
+    bypass_cache: bool = False,
+    db: AsyncSession = Depends(get_async_db),
+    orchestrator: OrchestratorAgent = Depends(get_orchestrator)
+):
+    """Assess a loan application and fraud-check its disbursement in one call; both agents run concurrently"""
+    
+    application, disbursement = request.application, request.disbursement
+    if disbursement.customer_id != application.customer_id:
+        raise HTTPException(status_code=400, detail="Disbursement must belong to the applicant")
+    
+    timer = StageTimer(COMBINED_TASK)
+    with timer.stage("customer_lookup"):
+        customer = (await db.execute(
+            select(Customer.customer_id).where(Customer.customer_id == application.customer_id)
+        )).scalar_one_or_none()
+    if not customer:
+        raise HTTPException(status_code=404, detail="Customer not found")
+    if disbursement.transaction_id in await _stored_transactions(db, [disbursement.transaction_id]):
+        raise HTTPException(status_code=409, detail="transaction_id already recorded")
+    
+    try:
+        result = await orchestrator.aprocess_request(
+            task_type=COMBINED_TASK,
+            data={"application": application.dict(), "transaction": disbursement.dict()},
+            bypass_cache=bypass_cache,
+            timer=timer
+        )
+        credit, fraud = result["credit"], result["fraud"]
+        
+        # Application (with the combined decision), transaction and fraud case in one commit
+        transaction_row = _transaction_row(disbursement, fraud)
+        rows = {
+            "transactions": [transaction_row],
+            "fraud_cases": [_fraud_case_row(disbursement, fraud)] if fraud["fraud_probability"] > 60 else [],
+            "credit_applications": [application_row(application.dict(), {**credit, "decision": result["decision"]})]
+        }
+        with timer.stage("write_behind_enqueue"):
+            queued = await write_behind.offer(rows)
+        if not queued:
+            with timer.stage("db_commit"):
+                await db.execute(insert(Transaction), rows["transactions"])
+                if rows["fraud_cases"]:
+                    await db.execute(insert(FraudCase), rows["fraud_cases"])
+                await db.execute(insert(CreditApplication), rows["credit_applications"])
+                await db.commit()
+        
+        feature_store.observe(transaction_row)
+        fraud_decisions.inc(decided_by=fraud.get("decided_by", "llm"), action=fraud["action"])
+        
+        return CombinedAssessmentResponse(
+            decision=result["decision"],
+            overridden_by_fraud_check=result["decision"] != credit["decision"],
+            credit=CreditApplicationResponse(
+                application_id=credit["application_id"],
+                decision=credit["decision"],
+                risk_score=credit["risk_score"],
+                confidence=credit["confidence"],
+                explainability={
+                    "positive_factors": credit["positive_factors"],
+                    "risk_factors": credit["risk_factors"],
+                    "reasoning": credit["reasoning"]
+                },
+                processing_time_ms=int(round(sum(credit["timings_ms"].values()))),
+                timings_ms=credit["timings_ms"],
+                timestamp=credit["timestamp"],
+                degraded=credit.get("degraded", False)
+            ),
+            fraud=_to_response(fraud),
+            processing_time_ms=int(round(timer.elapsed_ms())),
+            timings_ms=timer.as_dict()
+        )
+        
+    except Exception as e:
+        await db.rollback()
+        raise HTTPException(status_code=500, detail=str(e))
+
 @router.get("/applications")
 async def get_applications(
     status: Optional[str] = None,
-    db: Session = Depends(get_db)
+    customer_id: Optional[str] = None,
+    min_risk_score: Optional[int] = Query(None, ge=0, le=1000),
+    max_risk_score: Optional[int] = Query(None, ge=0, le=1000),
+    date_from: Optional[datetime] = None,
+    date_to: Optional[datetime] = None,
+    cursor: Optional[str] = None,  # next_cursor from the previous page
+    limit: int = Query(100, ge=1, le=settings.LIST_PAGE_MAX_SIZE),
+    db: AsyncSession = Depends(get_async_db)
 ):
-    """Get all credit applications with optional status filter"""
+    """List credit applications newest first with optional filters, one keyset page at a time"""
     
-    query = db.query(CreditApplication)
+    query = select(CreditApplication)
     
     if status:
-        query = query.filter(CreditApplication.decision == status)
+        try:
+            query = query.where(CreditApplication.decision == DecisionType(status))
+        except ValueError:
+            raise HTTPException(status_code=400, detail=f"Unknown status: {status}")
+    if customer_id:
+        query = query.where(CreditApplication.customer_id == customer_id)
+    if min_risk_score is not None:
+        query = query.where(CreditApplication.final_risk_score >= min_risk_score)
+    if max_risk_score is not None:
+        query = query.where(CreditApplication.final_risk_score <= max_risk_score)
+    if date_from:
+        query = query.where(CreditApplication.decision_timestamp >= date_from)
+    if date_to:
+        query = query.where(CreditApplication.decision_timestamp < date_to)
     
-    applications = query.order_by(CreditApplication.decision_timestamp.desc()).limit(100).all()
+    try:
+        query = keyset_page(query, CreditApplication.decision_timestamp, CreditApplication.app_id, cursor, limit)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    applications = (await db.execute(query)).scalars().all()
+    applications, next_cursor = split_page(
+        applications, limit, lambda app: app.decision_timestamp, lambda app: app.app_id
+    )
     
-    return {"applications": [
+    return {"next_cursor": next_cursor, "applications": [
         {
             "app_id": app.app_id,
             "customer_id": app.customer_id,
@@ -115,3 +247,52 @@ async def get_applications(
             "timestamp": app.decision_timestamp.isoformat()
         } for app in applications
     ]}
+
+@router.post("/bulk")
+async def start_bulk_assessment(
+    request: BulkAssessmentRequest,
+    orchestrator: OrchestratorAgent = Depends(get_orchestrator)
+):
+    """Start (or resume) re-scoring a portfolio file in the background"""
+    
+    input_dir = os.path.abspath(settings.BULK_INPUT_DIR)
+    source_path = os.path.abspath(os.path.join(input_dir, request.source_path))
+    if os.path.commonpath([input_dir, source_path]) != input_dir:
+        raise HTTPException(status_code=400, detail="source_path must be inside BULK_INPUT_DIR")
+    if not os.path.isfile(source_path):
+        raise HTTPException(status_code=404, detail="Portfolio file not found")
+    
+    job = bulk_jobs.get(job_id_for(source_path))
+    if job and job.progress["status"] in ("pending", "running"):
+        return job.progress
+    
+    job = BulkCreditJob(
+        source_path,
+        orchestrator,
+        chunk_size=request.chunk_size,
+        workers=request.workers
+    )
+    bulk_jobs[job.job_id] = job
+    
+    async def run_job():
+        try:
+            await job.run()
+        except Exception as e:
+            # run() records failures in job.progress; make sure a dead job never reads as running
+            if job.progress["status"] != "failed":
+                job.progress["status"] = "failed"
+                job.progress["error"] = str(e)
+            # Resubmitting resumes from the checkpoint
+    
+    job.task = asyncio.create_task(run_job())
+    return job.progress
+
+@router.get("/bulk/{job_id}")
+async def get_bulk_assessment(job_id: str):
+    """Progress, throughput and ETA of a bulk assessment job"""
+    
+    job = bulk_jobs.get(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Bulk job not found")
+    
+    return job.progress
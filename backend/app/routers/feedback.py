@@ -1,10 +1,12 @@
 from fastapi import APIRouter, Depends, HTTPException
 from sqlalchemy.orm import Session
+from sqlalchemy import func
 from pydantic import BaseModel
 from typing import Optional
 from datetime import datetime
 from ..config.database import get_db
 from ..models.schemas import CreditApplication, FraudCase, AgentLearningLog
+from ..services.outcome_counters import record_label, credit_cell, fraud_cell, RESOLVED_STATUSES
 import uuid
 
 router = APIRouter(prefix="/api/v1/feedback", tags=["Self-Learning"])
@@ -32,29 +34,44 @@ async def submit_feedback(
         feedback_id = str(uuid.uuid4())
         
         if request.entity_type == "credit_application":
-            # Update credit application with actual outcome
+            # Update credit application with actual outcome; the row lock serializes concurrent
+            # relabels, so each one subtracts the outcome the previous one actually stored
             app = db.query(CreditApplication).filter(
                 CreditApplication.app_id == request.entity_id
-            ).first()
+            ).with_for_update().first()
             
             if not app:
                 raise HTTPException(status_code=404, detail="Application not found")
             
-            # Store outcome in explainability JSON
-            if app.explainability_json is None:
-                app.explainability_json = {}
-            
-            app.explainability_json["actual_outcome"] = request.actual_outcome
-            app.explainability_json["feedback_date"] = datetime.utcnow().isoformat()
-            app.explainability_json["feedback_notes"] = request.notes
-            
             # Calculate accuracy
             was_correct = (
                 (app.decision.value == "approved" and request.actual_outcome == "paid_on_time") or
                 (app.decision.value == "rejected" and request.actual_outcome == "default")
             )
             
-            app.explainability_json["prediction_correct"] = was_correct
+            # Store outcome in explainability JSON (reassigned so the JSON column change is flushed)
+            app.explainability_json = {
+                **(app.explainability_json or {}),
+                "actual_outcome": request.actual_outcome,
+                "feedback_date": datetime.utcnow().isoformat(),
+                "feedback_notes": request.notes,
+                "prediction_correct": was_correct
+            }
+            
+            # Keep the per-version confusion counters in step, replacing any earlier label
+            previous_outcome = app.feedback_outcome
+            record_label(
+                db,
+                "credit",
+                app.agent_version,
+                credit_cell(app.decision.value, request.actual_outcome),
+                previous_cell=credit_cell(app.decision.value, previous_outcome),
+                relabel=previous_outcome is not None
+            )
+            
+            # Indexed copies used by the stats aggregates
+            app.feedback_outcome = request.actual_outcome
+            app.prediction_correct = was_correct
             
             db.commit()
             
@@ -66,16 +83,26 @@ async def submit_feedback(
             )
         
         elif request.entity_type == "fraud_case":
-            # Update fraud case with actual outcome
+            # Update fraud case with actual outcome (row locked, as above)
             case = db.query(FraudCase).filter(
                 FraudCase.case_id == request.entity_id
-            ).first()
+            ).with_for_update().first()
             
             if not case:
                 raise HTTPException(status_code=404, detail="Fraud case not found")
             
             # Update investigation status
+            previous_status = case.investigation_status
             case.investigation_status = "confirmed" if "confirmed" in request.actual_outcome else "false_positive"
+            
+            record_label(
+                db,
+                "fraud",
+                case.agent_version,
+                fraud_cell(case.fraud_probability, case.investigation_status),
+                previous_cell=fraud_cell(case.fraud_probability, previous_status),
+                relabel=previous_status in RESOLVED_STATUSES
+            )
             case.resolution_notes = request.notes
             case.resolved_at = datetime.utcnow()
             
@@ -106,40 +133,32 @@ async def get_learning_stats(db: Session = Depends(get_db)):
     """Get agent learning statistics"""
     
     try:
-        # Credit agent stats
-        credit_apps = db.query(CreditApplication).filter(
-            CreditApplication.explainability_json.isnot(None)
-        ).all()
+        # Credit agent stats, counted in the database (ix_credit_applications_feedback covers the grouping)
+        credit_total = db.query(func.count(CreditApplication.app_id)).filter(
+            CreditApplication.explainability_json.isnot(None)  # Same population the endpoint has always reported
+        ).scalar()
+        feedback_counts = dict(db.query(
+            CreditApplication.prediction_correct,
+            func.count()
+        ).filter(
+            CreditApplication.feedback_outcome.isnot(None)
+        ).group_by(CreditApplication.prediction_correct).all())
         
-        credit_total = len(credit_apps)
-        credit_with_feedback = len([
-            app for app in credit_apps 
-            if app.explainability_json and "actual_outcome" in app.explainability_json
-        ])
-        credit_correct = len([
-            app for app in credit_apps 
-            if app.explainability_json 
-            and app.explainability_json.get("prediction_correct") == True
-        ])
+        credit_with_feedback = sum(feedback_counts.values())
+        credit_correct = feedback_counts.get(True, 0)
         
         credit_accuracy = (credit_correct / credit_with_feedback * 100) if credit_with_feedback > 0 else 0
         
-        # Fraud agent stats
-        fraud_cases = db.query(FraudCase).all()
-        fraud_total = len(fraud_cases)
-        fraud_resolved = len([
-            case for case in fraud_cases 
-            if case.investigation_status in ["confirmed", "false_positive"]
-        ])
+        # Fraud agent stats: one grouped count per investigation status
+        status_counts = dict(db.query(
+            FraudCase.investigation_status,
+            func.count()
+        ).group_by(FraudCase.investigation_status).all())
         
-        fraud_confirmed = len([
-            case for case in fraud_cases 
-            if case.investigation_status == "confirmed"
-        ])
-        fraud_false_positives = len([
-            case for case in fraud_cases 
-            if case.investigation_status == "false_positive"
-        ])
+        fraud_total = sum(status_counts.values())
+        fraud_confirmed = status_counts.get("confirmed", 0)
+        fraud_false_positives = status_counts.get("false_positive", 0)
+        fraud_resolved = fraud_confirmed + fraud_false_positives
         
         fraud_accuracy = (fraud_confirmed / fraud_resolved * 100) if fraud_resolved > 0 else 0
         
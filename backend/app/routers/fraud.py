@@ -1,10 +1,23 @@
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy import select, insert
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
 from pydantic import BaseModel, Field
 from typing import Optional, Dict, List
-from ..config.database import get_db
-from ..models.schemas import Transaction, FraudCase, TransactionStatus
-from ..agents.orchestrator import OrchestratorAgent
+from ..config.database import get_async_db
+from ..config.settings import settings
+from ..models.schemas import Transaction, FraudCase, TransactionStatus, Customer
+from ..agents.orchestrator import OrchestratorAgent, get_orchestrator
+from ..services.fast_path import fast_path_scorer
+from ..services.fraud_model import fraud_model_scorer
+from ..services.feature_store import feature_store
+from ..services.coalescing import fraud_check_coalescer
+from ..services.metrics import metrics, StageTimer
+from ..services.pagination import keyset_page, split_page
+from ..services.write_behind import write_behind
+import asyncio
+from datetime import datetime
+from types import SimpleNamespace
 
 router = APIRouter(prefix="/api/v1/fraud", tags=["Fraud Detection"])
 
@@ -26,77 +39,368 @@ class FraudCheckResponse(BaseModel):
     detection_time_ms: int
     anomalies: List[str]
     reasoning: str
+    decided_by: str = "llm"
+    replayed: bool = False  # True when an earlier decision for this transaction_id was returned
+    timings_ms: Dict[str, float] = Field(default_factory=dict)
 
-orchestrator = OrchestratorAgent()
+class FraudBatchRequest(BaseModel):
+    transactions: List[FraudCheckRequest] = Field(..., min_length=1, max_length=settings.FRAUD_BATCH_MAX_SIZE)
 
-@router.post("/check", response_model=FraudCheckResponse)
-async def check_fraud(
+class FraudBatchItem(BaseModel):
+    index: int
+    transaction_id: str
+    status: str  # "ok" or "error"
+    result: Optional[FraudCheckResponse] = None
+    error: Optional[str] = None
+
+class FraudBatchResponse(BaseModel):
+    total: int
+    succeeded: int
+    failed: int
+    results: List[FraudBatchItem]
+
+fraud_decisions = metrics.counter(
+    "fraud_decisions_total",
+    "Fraud decisions recorded, by deciding component and action",
+    ("decided_by", "action")
+)
+
+def _to_response(result: dict) -> FraudCheckResponse:
+    return FraudCheckResponse(
+        transaction_id=result["transaction_id"],
+        fraud_probability=result["fraud_probability"],
+        risk_level=result["risk_level"],
+        action=result["action"],
+        detection_time_ms=result["detection_time_ms"],
+        anomalies=result["anomalies"],
+        reasoning=result["reasoning"],
+        decided_by=result.get("decided_by", "llm"),
+        timings_ms=result.get("timings_ms", {})
+    )
+
+def _transaction_row(request: FraudCheckRequest, result: dict) -> dict:
+    """Column values for the Transaction row of a scored request"""
+    return {
+        "txn_id": request.transaction_id,
+        "customer_id": request.customer_id,
+        "amount": request.amount,
+        "transaction_type": "debit",
+        "merchant_id": request.merchant_id,
+        "merchant_category": request.merchant_category,
+        "location_lat": request.location.get('lat') if request.location else None,
+        "location_long": request.location.get('long') if request.location else None,
+        "device_fingerprint": request.device_fingerprint,
+        "ip_address": request.ip_address,
+        "status": TransactionStatus.APPROVED if result['action'] == 'approve' else TransactionStatus.FLAGGED,
+        "fraud_decision": _to_response(result).dict(exclude={"replayed"})
+    }
+
+def _fraud_case_row(request: FraudCheckRequest, result: dict) -> dict:
+    """Column values for the FraudCase row of a high-probability request"""
+    return {
+        "case_id": result["case_id"],
+        "txn_id": request.transaction_id,
+        "fraud_probability": result["fraud_probability"],
+        "fraud_type": "suspicious_activity",
+        "agent_version": result["agent_version"],
+        "confidence_score": result["fraud_probability"] / 100.0
+    }
+
+async def _stored_transactions(db: AsyncSession, txn_ids: List[str]) -> dict:
+    """Already-recorded transactions among txn_ids, keyed by txn_id"""
+    # Decisions still waiting in this worker's write-behind queue count as recorded
+    stored = {
+        txn_id: SimpleNamespace(**row)
+        for txn_id, row in write_behind.pending_transactions(txn_ids).items()
+    }
+    txn_ids = [txn_id for txn_id in txn_ids if txn_id not in stored]
+    if not txn_ids:
+        return stored
+    rows = (await db.execute(
+        select(
+            Transaction.txn_id,
+            Transaction.customer_id,
+            Transaction.amount,
+            Transaction.status,
+            Transaction.fraud_decision,
+            FraudCase.fraud_probability
+        )
+        .outerjoin(FraudCase, FraudCase.txn_id == Transaction.txn_id)
+        .where(Transaction.txn_id.in_(txn_ids))
+    )).all()
+    stored.update({row.txn_id: row for row in rows})
+    return stored
+
+def _same_transaction(request: FraudCheckRequest, customer_id: str, amount) -> bool:
+    """A reused transaction_id must describe the same customer and amount to be replayed"""
+    return request.customer_id == customer_id and round(request.amount, 2) == round(float(amount), 2)
+
+def _replay(row) -> FraudCheckResponse:
+    """Rebuild the response for a transaction that was already scored"""
+    if row.fraud_decision:
+        return FraudCheckResponse(**row.fraud_decision, replayed=True)
+    
+    # Rows written before decisions were stored only keep the status and fraud case
+    approved = row.status == TransactionStatus.APPROVED
+    probability = row.fraud_probability if row.fraud_probability is not None else 0.0
+    return FraudCheckResponse(
+        transaction_id=row.txn_id,
+        fraud_probability=probability,
+        risk_level="low" if approved else ("high" if probability > 60 else "medium"),
+        action="approve" if approved else "flag",
+        detection_time_ms=0,
+        anomalies=[],
+        reasoning=f"Previously recorded as {row.status.value}",
+        decided_by="stored",
+        replayed=True
+    )
+
+def _replay_or_conflict(request: FraudCheckRequest, row) -> FraudCheckResponse:
+    if not _same_transaction(request, row.customer_id, row.amount):
+        raise HTTPException(status_code=409, detail="transaction_id already used for a different transaction")
+    return _replay(row)
+
+async def _score_and_persist(
     request: FraudCheckRequest,
-    db: Session = Depends(get_db)
-):
-    """Check transaction for fraud"""
+    bypass_cache: bool,
+    db: AsyncSession,
+    orchestrator: OrchestratorAgent
+) -> FraudCheckResponse:
+    """Score a new transaction and record the decision"""
     
+    timer = StageTimer("fraud_detection")
     try:
         # Process through orchestrator
-        result = orchestrator.process_request(
+        result = await orchestrator.aprocess_request(
             task_type="fraud_detection",
-            data=request.dict()
+            data=request.dict(),
+            bypass_cache=bypass_cache,
+            timer=timer
         )
         
-        # Save transaction FIRST
-        transaction = Transaction(
-            txn_id=request.transaction_id,
-            customer_id=request.customer_id,
-            amount=request.amount,
-            transaction_type="debit",
-            merchant_id=request.merchant_id,
-            merchant_category=request.merchant_category,
-            location_lat=request.location.get('lat') if request.location else None,
-            location_long=request.location.get('long') if request.location else None,
-            device_fingerprint=request.device_fingerprint,
-            ip_address=request.ip_address,
-            status=TransactionStatus.APPROVED if result['action'] == 'approve' else TransactionStatus.FLAGGED
-        )
+        # Transaction and fraud case in one commit; the transaction row is inserted first for the foreign key
+        transaction_row = _transaction_row(request, result)
+        rows = {
+            "transactions": [transaction_row],
+            "fraud_cases": [_fraud_case_row(request, result)] if result['fraud_probability'] > 60 else []
+        }
+        with timer.stage("write_behind_enqueue"):
+            queued = await write_behind.offer(rows)
+        if not queued:
+            with timer.stage("db_commit"):
+                await db.execute(insert(Transaction), rows["transactions"])
+                if rows["fraud_cases"]:
+                    await db.execute(insert(FraudCase), rows["fraud_cases"])
+                await db.commit()
         
-        db.add(transaction)
-        db.commit()  # Commit transaction FIRST
-        db.refresh(transaction)
+        feature_store.observe(transaction_row)
+        fraud_decisions.inc(decided_by=result.get("decided_by", "llm"), action=result["action"])
         
-        # Create fraud case AFTER transaction is committed
-        if result['fraud_probability'] > 60:
-            fraud_case = FraudCase(
-                case_id=result["case_id"],
-                txn_id=request.transaction_id,  # Now this exists in transactions table
-                fraud_probability=result["fraud_probability"],
-                fraud_type="suspicious_activity",
-                agent_version=result["agent_version"],
-                confidence_score=result["fraud_probability"] / 100.0
-            )
-            db.add(fraud_case)
-            db.commit()  # Commit fraud case
-            db.refresh(fraud_case)
+        result["timings_ms"] = timer.as_dict()
+        return _to_response(result)
         
-        return FraudCheckResponse(
-            transaction_id=result["transaction_id"],
-            fraud_probability=result["fraud_probability"],
-            risk_level=result["risk_level"],
-            action=result["action"],
-            detection_time_ms=result["detection_time_ms"],
-            anomalies=result["anomalies"],
-            reasoning=result["reasoning"]
+    except IntegrityError as e:
+        await db.rollback()
+        # Lost the race to another worker that stored this transaction_id first
+        stored = await _stored_transactions(db, [request.transaction_id])
+        if request.transaction_id in stored:
+            return _replay_or_conflict(request, stored[request.transaction_id])
+        raise HTTPException(status_code=500, detail=str(e))
+    except Exception as e:
+        await db.rollback()  # Rollback on error
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.post("/check", response_model=FraudCheckResponse)
+async def check_fraud(
+    request: FraudCheckRequest,
+    bypass_cache: bool = False,  # Force a fresh LLM call, e.g. for audit replays
+    db: AsyncSession = Depends(get_async_db),
+    orchestrator: OrchestratorAgent = Depends(get_orchestrator)
+):
+    """Check transaction for fraud"""
+    
+    # A transaction_id that was already scored returns its stored decision
+    stored = await _stored_transactions(db, [request.transaction_id])
+    if request.transaction_id in stored:
+        return _replay_or_conflict(request, stored[request.transaction_id])
+    
+    # Concurrent duplicates share one agent call; a conflicting payload gets its own key and ends in a 409
+    key = f"{request.transaction_id}:{request.customer_id}:{round(request.amount, 2)}"
+    response, scored_here = await fraud_check_coalescer.run(key, lambda: _score_and_persist(request, bypass_cache, db, orchestrator))
+    return response if scored_here else response.copy(update={"replayed": True})
+
+@router.post("/check/batch", response_model=FraudBatchResponse)
+async def check_fraud_batch(
+    batch: FraudBatchRequest,
+    bypass_cache: bool = False,
+    db: AsyncSession = Depends(get_async_db),
+    orchestrator: OrchestratorAgent = Depends(get_orchestrator)
+):
+    """Score a burst of transactions; results are returned in input order"""
+    
+    requests = batch.transactions
+    errors: Dict[int, str] = {}
+    replays: Dict[int, FraudCheckResponse] = {}
+    
+    # A transaction_id repeated within the batch reuses the decision of its first occurrence
+    first_seen: Dict[str, int] = {}
+    repeats: Dict[int, int] = {}
+    for index, request in enumerate(requests):
+        first = first_seen.setdefault(request.transaction_id, index)
+        if first == index:
+            continue
+        if _same_transaction(request, requests[first].customer_id, requests[first].amount):
+            repeats[index] = first
+        else:
+            errors[index] = "transaction_id reused with different details"
+    
+    # Replay stored decisions and reject unknown customers up front so one bad row cannot fail the bulk insert
+    customer_ids = list({request.customer_id for request in requests})
+    known_customers = set((await db.execute(
+        select(Customer.customer_id).where(Customer.customer_id.in_(customer_ids))
+    )).scalars().all())
+    stored = await _stored_transactions(db, list(first_seen))
+    
+    def replay_stored(index: int, row):
+        if _same_transaction(requests[index], row.customer_id, row.amount):
+            replays[index] = _replay(row)
+        else:
+            errors[index] = "transaction_id already used for a different transaction"
+    
+    for index, request in enumerate(requests):
+        if index in errors or index in repeats:
+            continue
+        if request.transaction_id in stored:
+            replay_stored(index, stored[request.transaction_id])
+        elif request.customer_id not in known_customers:
+            errors[index] = "Customer not found"
+    
+    async def score(request: FraudCheckRequest) -> dict:
+        return await orchestrator.aprocess_request(
+            task_type="fraud_detection",
+            data=request.dict(),
+            bypass_cache=bypass_cache,
+            timer=StageTimer("fraud_detection")
         )
-        
+    
+    # Concurrency is bounded by the orchestrator's LLM semaphore
+    pending = [index for index in range(len(requests)) if index not in errors and index not in repeats and index not in replays]
+    outcomes = await asyncio.gather(*(score(requests[index]) for index in pending), return_exceptions=True)
+    
+    results: Dict[int, dict] = {}
+    for index, outcome in zip(pending, outcomes):
+        if isinstance(outcome, Exception):
+            errors[index] = str(outcome)
+        else:
+            results[index] = outcome
+    
+    async def persist() -> List[dict]:
+        transaction_rows = [_transaction_row(requests[index], result) for index, result in results.items()]
+        fraud_case_rows = [
+            _fraud_case_row(requests[index], result)
+            for index, result in results.items()
+            if result['fraud_probability'] > 60
+        ]
+        if await write_behind.offer({"transactions": transaction_rows, "fraud_cases": fraud_case_rows}):
+            return transaction_rows
+        if transaction_rows:
+            await db.execute(insert(Transaction), transaction_rows)
+        if fraud_case_rows:
+            await db.execute(insert(FraudCase), fraud_case_rows)
+        await db.commit()
+        return transaction_rows
+    
+    # Persist every scored transaction, then its fraud case, in one unit of work
+    batch_timer = StageTimer("fraud_batch")
+    try:
+        with batch_timer.stage("db_commit_batch"):
+            try:
+                transaction_rows = await persist()
+            except IntegrityError:
+                await db.rollback()
+                # Another request stored some of these transaction_ids meanwhile: replay those, retry the rest once
+                stored = await _stored_transactions(db, [requests[index].transaction_id for index in results])
+                for index in [index for index in results if requests[index].transaction_id in stored]:
+                    del results[index]
+                    replay_stored(index, stored[requests[index].transaction_id])
+                transaction_rows = await persist()
     except Exception as e:
-        db.rollback()  # Rollback on error
+        await db.rollback()
         raise HTTPException(status_code=500, detail=str(e))
+    
+    feature_store.observe_many(transaction_rows)
+    for result in results.values():
+        fraud_decisions.inc(decided_by=result.get("decided_by", "llm"), action=result["action"])
+    
+    responses = {index: _to_response(result) for index, result in results.items()}
+    responses.update(replays)
+    for index, first in repeats.items():
+        if first in responses:
+            responses[index] = responses[first].copy(update={"replayed": True})
+        else:
+            errors[index] = errors[first]
+    
+    items = []
+    for index, request in enumerate(requests):
+        if index in responses:
+            items.append(FraudBatchItem(
+                index=index,
+                transaction_id=request.transaction_id,
+                status="ok",
+                result=responses[index]
+            ))
+        else:
+            items.append(FraudBatchItem(
+                index=index,
+                transaction_id=request.transaction_id,
+                status="error",
+                error=errors[index]
+            ))
+    
+    return FraudBatchResponse(
+        total=len(requests),
+        succeeded=len(responses),
+        failed=len(requests) - len(responses),
+        results=items
+    )
 
 @router.get("/cases")
-async def get_fraud_cases(db: Session = Depends(get_db)):
-    """Get all fraud cases"""
+async def get_fraud_cases(
+    status: Optional[List[str]] = Query(None),  # Investigation status; repeat to match several
+    min_probability: Optional[float] = Query(None, ge=0, le=100),
+    max_probability: Optional[float] = Query(None, ge=0, le=100),
+    customer_id: Optional[str] = None,
+    date_from: Optional[datetime] = None,
+    date_to: Optional[datetime] = None,
+    cursor: Optional[str] = None,  # next_cursor from the previous page
+    limit: int = Query(100, ge=1, le=settings.LIST_PAGE_MAX_SIZE),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """List fraud cases newest first, one keyset page at a time"""
+    
+    query = select(FraudCase)
+    if status:
+        query = query.where(FraudCase.investigation_status.in_(status))
+    if min_probability is not None:
+        query = query.where(FraudCase.fraud_probability >= min_probability)
+    if max_probability is not None:
+        query = query.where(FraudCase.fraud_probability <= max_probability)
+    if customer_id:
+        query = query.join(Transaction, Transaction.txn_id == FraudCase.txn_id).where(Transaction.customer_id == customer_id)
+    if date_from:
+        query = query.where(FraudCase.detection_timestamp >= date_from)
+    if date_to:
+        query = query.where(FraudCase.detection_timestamp < date_to)
+    
+    try:
+        query = keyset_page(query, FraudCase.detection_timestamp, FraudCase.case_id, cursor, limit)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     
-    cases = db.query(FraudCase).order_by(FraudCase.detection_timestamp.desc()).limit(100).all()
+    cases = (await db.execute(query)).scalars().all()
+    cases, next_cursor = split_page(cases, limit, lambda case: case.detection_timestamp, lambda case: case.case_id)
     
-    return {"cases": [
+    return {"next_cursor": next_cursor, "cases": [
         {
             "case_id": case.case_id,
             "txn_id": case.txn_id,
@@ -105,3 +409,33 @@ async def get_fraud_cases(db: Session = Depends(get_db)):
             "timestamp": case.detection_timestamp.isoformat()
         } for case in cases
     ]}
+
+@router.get("/fast-path/stats")
+async def get_fast_path_stats():
+    """Share of fraud checks settled by the rule scorer without an LLM call"""
+    
+    return fast_path_scorer.stats()
+
+@router.get("/model/stats")
+async def get_fraud_model_stats():
+    """Mode, loaded version and agreement with the LLM of the in-process fraud model"""
+    
+    return fraud_model_scorer.stats()
+
+@router.post("/model/reload")
+async def reload_fraud_model():
+    """Load this worker's fraud model artifact again, e.g. after train_fraud_model.py promoted a new one"""
+    
+    return fraud_model_scorer.reload()
+
+@router.get("/features/stats")
+async def get_feature_store_stats():
+    """Size and freshness of the in-process customer feature store"""
+    
+    return feature_store.stats()
+
+@router.post("/features/rebuild")
+async def rebuild_feature_store():
+    """Rebuild this worker's customer aggregates from the transactions table"""
+    
+    return await feature_store.rebuild()
@@ -0,0 +1,265 @@
+import asyncio
+import csv
+import hashlib
+import json
+import os
+import time
+import uuid
+from datetime import datetime
+from typing import Dict, Any, Iterator, Tuple, Optional, Callable
+from sqlalchemy import select, insert
+from ..config.database import AsyncSessionLocal
+from ..config.settings import settings
+from ..models.schemas import CreditApplication, Customer, DecisionType
+
+# CSV columns that are folded into the nested alternative_data object
+ALTERNATIVE_DATA_COLUMNS = ("utility_payment_score", "rent_payment_history")
+
+
+def application_row(data: Dict[str, Any], result: Dict[str, Any]) -> Dict[str, Any]:
+    """Column values for the CreditApplication row of an assessed application"""
+    return {
+        "app_id": result["application_id"],
+        "customer_id": data["customer_id"],
+        "requested_amount": data["requested_amount"],
+        "loan_purpose": data.get("loan_purpose"),
+        "employment_status": data.get("employment_status"),
+        "annual_income": data.get("annual_income"),
+        "credit_bureau_score": data.get("credit_bureau_score"),
+        "final_risk_score": result["risk_score"],
+        "decision": DecisionType(result["decision"]),
+        "agent_version": result["agent_version"],
+        "explainability_json": {
+            "positive_factors": result["positive_factors"],
+            "risk_factors": result["risk_factors"],
+            "reasoning": result["reasoning"],
+            "degraded": result.get("degraded", False)
+        }
+    }
+
+
+def parse_application(raw: Dict[str, Any]) -> Dict[str, Any]:
+    """Normalize a CSV/JSONL record into the CreditApplicationRequest shape"""
+    def number(value, cast):
+        return cast(value) if value not in (None, "") else None
+
+    alternative_data = dict(raw.get("alternative_data") or {})
+    for column in ALTERNATIVE_DATA_COLUMNS:
+        if raw.get(column) not in (None, ""):
+            alternative_data[column] = raw[column]
+
+    data = {
+        "customer_id": (raw.get("customer_id") or "").strip(),
+        "requested_amount": number(raw.get("requested_amount"), float),
+        "loan_purpose": raw.get("loan_purpose"),
+        "employment_status": raw.get("employment_status"),
+        "annual_income": number(raw.get("annual_income"), float) or 0.0,
+        "credit_bureau_score": number(raw.get("credit_bureau_score"), lambda v: int(float(v))),
+        "alternative_data": alternative_data or None
+    }
+    if not data["customer_id"]:
+        raise ValueError("customer_id is required")
+    if not data["requested_amount"] or data["requested_amount"] <= 0:
+        raise ValueError("requested_amount must be positive")
+    return data
+
+
+def count_rows(path: str) -> int:
+    """Count data rows with a constant-memory byte scan"""
+    lines = 0
+    last = b"\n"
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            lines += block.count(b"\n")
+            last = block[-1:]
+    if last != b"\n":
+        lines += 1
+    return lines - 1 if path.lower().endswith(".csv") else lines
+
+
+def job_id_for(source_path: str) -> str:
+    """Stable job id so re-submitting the same file resumes its checkpoint"""
+    return hashlib.sha1(os.path.abspath(source_path).encode()).hexdigest()[:16]
+
+
+def iter_portfolio(path: str, skip: int = 0) -> Iterator[Tuple[int, Dict[str, Any]]]:
+    """Stream (row_number, raw record) pairs from a CSV or JSONL file, skipping `skip` rows"""
+    with open(path, newline="", encoding="utf-8") as f:
+        if path.lower().endswith(".csv"):
+            records = csv.DictReader(f)
+        else:
+            records = (json.loads(line) if line.strip() else {} for line in f)
+        for row_number, record in enumerate(records):
+            if row_number < skip:
+                continue
+            yield row_number, record
+
+
+class BulkCreditJob:
+    """Re-scores a loan book file through the orchestrator with a resumable checkpoint.
+
+    Rows are processed in chunks: each chunk is scored by a bounded worker pool,
+    written with one multi-row INSERT, and only then recorded in the checkpoint,
+    so a crashed run resumes from the last committed chunk.
+    """
+
+    def __init__(
+        self,
+        source_path: str,
+        orchestrator,
+        checkpoint_path: str = None,
+        chunk_size: int = None,
+        workers: int = None,
+        on_progress: Optional[Callable[[Dict[str, Any]], None]] = None
+    ):
+        self.source_path = source_path
+        self.orchestrator = orchestrator
+        self.job_id = job_id_for(source_path)
+        self.checkpoint_path = checkpoint_path or os.path.join(settings.BULK_CHECKPOINT_DIR, f"{self.job_id}.checkpoint.json")
+        self.errors_path = self.checkpoint_path.replace(".checkpoint.json", "") + ".errors.jsonl"
+        self.chunk_size = chunk_size or settings.BULK_CHUNK_SIZE
+        self.workers = workers or settings.BULK_WORKERS
+        self.on_progress = on_progress
+        self.task: Optional[asyncio.Task] = None  # Set when started from the API
+        self.progress = {
+            "job_id": self.job_id,
+            "source_path": source_path,
+            "status": "pending",
+            "rows_total": None,
+            "rows_done": 0,
+            "succeeded": 0,
+            "failed": 0,
+            "rows_per_sec": 0.0,
+            "eta_seconds": None,
+            "error": None
+        }
+
+    def _load_checkpoint(self) -> Dict[str, Any]:
+        if os.path.exists(self.checkpoint_path):
+            with open(self.checkpoint_path) as f:
+                return json.load(f)
+        return {}
+
+    def _save_checkpoint(self):
+        tmp_path = self.checkpoint_path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump({
+                "source_path": self.source_path,
+                "rows_done": self.progress["rows_done"],
+                "succeeded": self.progress["succeeded"],
+                "failed": self.progress["failed"],
+                "updated_at": datetime.utcnow().isoformat()
+            }, f)
+        os.replace(tmp_path, self.checkpoint_path)  # Atomic so a crash never leaves a torn checkpoint
+
+    async def _score(self, semaphore: asyncio.Semaphore, row_number: int, raw: Dict[str, Any]) -> Tuple[Dict[str, Any], Dict[str, Any]]:
+        async with semaphore:
+            data = parse_application(raw)
+            result = await self.orchestrator.aprocess_request(task_type="credit_assessment", data=data)
+            # Deterministic id per (job, row) makes a chunk replayed after a crash idempotent
+            result["application_id"] = str(uuid.uuid5(uuid.NAMESPACE_URL, f"{self.job_id}:{row_number}"))
+            return data, result
+
+    async def _process_chunk(self, chunk, errors_file) -> Tuple[int, int]:
+        """Score and persist one chunk; returns (succeeded, failed)"""
+        semaphore = asyncio.Semaphore(self.workers)
+        outcomes = await asyncio.gather(
+            *(self._score(semaphore, row_number, raw) for row_number, raw in chunk),
+            return_exceptions=True
+        )
+
+        async with AsyncSessionLocal() as db:
+            customer_ids = {outcome[0]["customer_id"] for outcome in outcomes if not isinstance(outcome, Exception)}
+            known_customers = set((await db.execute(
+                select(Customer.customer_id).where(Customer.customer_id.in_(customer_ids))
+            )).scalars().all()) if customer_ids else set()
+
+            rows, failed = [], 0
+            for (row_number, raw), outcome in zip(chunk, outcomes):
+                error = None
+                if isinstance(outcome, Exception):
+                    error = str(outcome)
+                elif outcome[0]["customer_id"] not in known_customers:
+                    error = "Customer not found"
+                else:
+                    try:
+                        rows.append(application_row(*outcome))
+                    except (KeyError, ValueError) as e:
+                        error = f"Invalid agent result: {e}"
+                if error:
+                    failed += 1
+                    errors_file.write(json.dumps({"row": row_number, "error": error, "record": raw}, default=str) + "\n")
+
+            succeeded = len(rows)
+            # Rows committed before a crash but after the last checkpoint are already stored
+            if rows:
+                stored = set((await db.execute(
+                    select(CreditApplication.app_id).where(CreditApplication.app_id.in_([row["app_id"] for row in rows]))
+                )).scalars().all())
+                rows = [row for row in rows if row["app_id"] not in stored]
+            if rows:
+                await db.execute(insert(CreditApplication), rows)
+                await db.commit()
+
+        errors_file.flush()
+        return succeeded, failed
+
+    def _report(self, started: float, rows_at_start: int):
+        elapsed = time.perf_counter() - started
+        processed = self.progress["rows_done"] - rows_at_start
+        rate = processed / elapsed if elapsed > 0 else 0.0
+        self.progress["rows_per_sec"] = round(rate, 2)
+        if self.progress["rows_total"] is not None and rate > 0:
+            self.progress["eta_seconds"] = round((self.progress["rows_total"] - self.progress["rows_done"]) / rate, 1)
+        if self.on_progress:
+            self.on_progress(dict(self.progress))
+
+    async def run(self) -> Dict[str, Any]:
+        """Run (or resume) the job to completion"""
+        self.progress["status"] = "running"
+        self.progress["error"] = None
+        try:
+            os.makedirs(os.path.dirname(self.checkpoint_path) or ".", exist_ok=True)
+            checkpoint = self._load_checkpoint()
+            for key in ("rows_done", "succeeded", "failed"):
+                self.progress[key] = checkpoint.get(key, 0)
+            self.progress["rows_total"] = count_rows(self.source_path)
+            started, rows_at_start = time.perf_counter(), self.progress["rows_done"]
+
+            with open(self.errors_path, "a") as errors_file:
+                chunk = []
+                for row_number, raw in iter_portfolio(self.source_path, skip=self.progress["rows_done"]):
+                    chunk.append((row_number, raw))
+                    if len(chunk) >= self.chunk_size:
+                        await self._commit_chunk(chunk, errors_file)
+                        chunk = []
+                        self._report(started, rows_at_start)
+                if chunk:
+                    await self._commit_chunk(chunk, errors_file)
+                    self._report(started, rows_at_start)
+            self.progress["status"] = "completed"
+            self.progress["eta_seconds"] = 0.0
+        except asyncio.CancelledError:
+            self.progress["status"] = "failed"
+            self.progress["error"] = "Cancelled; resubmit to resume from the checkpoint"
+            raise
+        except Exception as e:
+            self.progress["status"] = "failed"
+            self.progress["error"] = str(e)
+            raise
+        finally:
+            if self.on_progress:
+                self.on_progress(dict(self.progress))
+
+        return dict(self.progress)
+
+    async def _commit_chunk(self, chunk, errors_file):
+        succeeded, failed = await self._process_chunk(chunk, errors_file)
+        self.progress["rows_done"] = chunk[-1][0] + 1
+        self.progress["succeeded"] += succeeded
+        self.progress["failed"] += failed
+        self._save_checkpoint()
+
+
+# Jobs started through the API, keyed by job id
+bulk_jobs: Dict[str, BulkCreditJob] = {}
@@ -0,0 +1,173 @@
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Any, Dict
+from ..config.settings import settings
+from .llm_clients import LLMUnavailable
+from .metrics import metrics
+
+CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+STATE_CODES = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+breaker_transitions = metrics.counter(
+    "llm_breaker_transitions_total",
+    "LLM circuit breaker state changes, by breaker and new state",
+    ("breaker", "state")
+)
+
+
+class CircuitOpen(LLMUnavailable):
+    """The breaker rejected the call without reaching the LLM"""
+
+
+class CircuitBreaker:
+    """Circuit breaker around one agent's LLM calls.
+
+    Closed, it records the outcome and latency of every call over a sliding
+    window and opens once at least `min_calls` were made and the share of
+    failed or slow calls reaches its threshold. Open, it rejects calls for
+    `open_seconds`, then turns half-open and lets up to `half_open_probes`
+    calls through: that many successes close it again, any failure or slow
+    probe re-opens it.
+    """
+
+    def __init__(self, name: str, enabled: bool = None, window_seconds: float = None, min_calls: int = None,
+                 error_rate: float = None, slow_seconds: float = None, slow_rate: float = None,
+                 open_seconds: float = None, half_open_probes: int = None):
+        self.name = name
+        self.enabled = settings.LLM_BREAKER_ENABLED if enabled is None else enabled
+        self.window_seconds = window_seconds or settings.LLM_BREAKER_WINDOW_SECONDS
+        self.min_calls = min_calls or settings.LLM_BREAKER_MIN_CALLS
+        self.error_rate = error_rate or settings.LLM_BREAKER_ERROR_RATE
+        self.slow_seconds = slow_seconds or settings.LLM_BREAKER_SLOW_SECONDS
+        self.slow_rate = slow_rate or settings.LLM_BREAKER_SLOW_RATE
+        self.open_seconds = open_seconds or settings.LLM_BREAKER_OPEN_SECONDS
+        self.half_open_probes = half_open_probes or settings.LLM_BREAKER_HALF_OPEN_PROBES
+        self.state = CLOSED
+        self.opened_at = 0.0
+        self.last_trip_reason = None
+        self._calls = deque()  # (finished_at, failed, slow) within the window
+        self._probes_in_flight = 0
+        self._probe_successes = 0
+        self._lock = threading.Lock()
+        self.counters = {"calls": 0, "failures": 0, "slow_calls": 0, "rejected": 0, "trips": 0}
+
+    def allow(self) -> bool:
+        """Whether a call may go to the LLM now; every allowed call must be followed by `record`"""
+        if not self.enabled:
+            return True
+        with self._lock:
+            if self.state == OPEN:
+                if time.monotonic() - self.opened_at < self.open_seconds:
+                    self.counters["rejected"] += 1
+                    return False
+                self._transition(HALF_OPEN)
+            if self.state == HALF_OPEN:
+                if self._probes_in_flight >= self.half_open_probes:
+                    self.counters["rejected"] += 1
+                    return False
+                self._probes_in_flight += 1
+            return True
+
+    def record(self, succeeded: bool, seconds: float):
+        """Outcome of an allowed call"""
+        if not self.enabled:
+            return
+        slow = seconds >= self.slow_seconds
+        now = time.monotonic()
+        with self._lock:
+            self.counters["calls"] += 1
+            self.counters["failures"] += not succeeded
+            self.counters["slow_calls"] += slow
+            if self.state == HALF_OPEN:
+                self._probes_in_flight = max(0, self._probes_in_flight - 1)
+                if not succeeded or slow:
+                    self._trip("probe failed" if not succeeded else "probe slow")
+                    return
+                self._probe_successes += 1
+                if self._probe_successes >= self.half_open_probes:
+                    self._transition(CLOSED)
+                return
+            if self.state == OPEN:
+                return  # A call allowed before the breaker opened
+
+            self._calls.append((now, not succeeded, slow))
+            while self._calls and self._calls[0][0] < now - self.window_seconds:
+                self._calls.popleft()
+            total = len(self._calls)
+            if total < self.min_calls:
+                return
+            failures = sum(failed for _, failed, _ in self._calls)
+            slow_calls = sum(was_slow for _, _, was_slow in self._calls)
+            if failures / total >= self.error_rate:
+                self._trip(f"error rate {failures / total:.0%} over {total} calls")
+            elif slow_calls / total >= self.slow_rate:
+                self._trip(f"{slow_calls / total:.0%} of {total} calls slower than {self.slow_seconds:g}s")
+
+    @contextmanager
+    def guard(self):
+        """Wrap one LLM call: raises CircuitOpen when rejected, records the outcome and latency otherwise.
+
+        Any failure of the call surfaces as LLMUnavailable, so a non-retryable
+        error (bad request, auth, missing API key) degrades like an outage
+        instead of escaping to the router.
+        """
+        if not self.allow():
+            raise CircuitOpen(f"{self.name} LLM circuit open")
+        started = time.perf_counter()
+        try:
+            yield
+        except LLMUnavailable:
+            self.record(False, time.perf_counter() - started)
+            raise
+        except Exception as e:
+            self.record(False, time.perf_counter() - started)
+            raise LLMUnavailable(f"LLM call failed: {type(e).__name__}: {e}") from e
+        except BaseException:
+            self._release()  # Cancelled, says nothing about the LLM
+            raise
+        self.record(True, time.perf_counter() - started)
+
+    def _release(self):
+        with self._lock:
+            if self.state == HALF_OPEN:
+                self._probes_in_flight = max(0, self._probes_in_flight - 1)
+
+    def _trip(self, reason: str):
+        self.opened_at = time.monotonic()
+        self.last_trip_reason = reason
+        self.counters["trips"] += 1
+        self._transition(OPEN)
+
+    def _transition(self, state: str):
+        self.state = state
+        self._calls.clear()
+        self._probes_in_flight = 0
+        self._probe_successes = 0
+        breaker_transitions.inc(breaker=self.name, state=state)
+
+    def reset(self):
+        """Close the breaker by hand, e.g. once an outage is known to be over"""
+        with self._lock:
+            self._transition(CLOSED)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            open_for = time.monotonic() - self.opened_at if self.state != CLOSED else 0.0
+            return {
+                "enabled": self.enabled,
+                "state": self.state,
+                "state_code": STATE_CODES[self.state],  # 0 closed, 1 half-open, 2 open
+                "open_seconds_elapsed": round(open_for, 1),
+                "window_calls": len(self._calls),
+                "last_trip_reason": self.last_trip_reason,
+                **self.counters
+            }
+
+
+llm_breakers = {agent: CircuitBreaker(agent) for agent in ("fraud", "credit")}
+
+
+def breaker_stats() -> Dict[str, Any]:
+    return {agent: breaker.stats() for agent, breaker in llm_breakers.items()}
@@ -0,0 +1,48 @@
+import asyncio
+from typing import Dict, Any, Awaitable, Callable, Tuple
+
+
+class InFlightCoalescer:
+    """Merges concurrent calls that share a key into a single execution.
+
+    The first caller for a key runs the work; callers arriving while it is in
+    flight await the same future and receive its result (or exception). Keys
+    are forgotten as soon as the work settles, so this is not a cache.
+    """
+
+    def __init__(self):
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self.counters = {"leaders": 0, "coalesced": 0}
+
+    async def run(self, key: str, work: Callable[[], Awaitable[Any]]) -> Tuple[Any, bool]:
+        """Run `work` once per in-flight key; returns (result, ran_here)"""
+        future = self._inflight.get(key)
+        if future is not None:
+            self.counters["coalesced"] += 1
+            # Shield so a waiter that disconnects does not cancel the leader's work
+            return await asyncio.shield(future), False
+
+        future = asyncio.get_running_loop().create_future()
+        # Mark the exception retrieved even when nobody else was waiting
+        future.add_done_callback(lambda f: f.cancelled() or f.exception())
+        self._inflight[key] = future
+        self.counters["leaders"] += 1
+        try:
+            result = await work()
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        else:
+            future.set_result(result)
+            return result, True
+        finally:
+            del self._inflight[key]
+
+    def stats(self) -> Dict[str, Any]:
+        return {"in_flight": len(self._inflight), **self.counters}
+
+
+fraud_check_coalescer = InFlightCoalescer()
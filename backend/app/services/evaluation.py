@@ -0,0 +1,212 @@
+from typing import Any, Dict, Optional, Tuple
+import numpy as np
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+from ..models.schemas import CreditApplication, FraudCase
+from .outcome_counters import CELLS, RESOLVED_STATUSES
+
+CURVE_POINTS = 101  # Points kept per stored ROC/PR curve
+CALIBRATION_BINS = 10
+
+
+def _columns(rows, dtypes) -> Tuple[np.ndarray, ...]:
+    """Column arrays from a list of result tuples"""
+    if not rows:
+        return tuple(np.empty(0, dtype=dtype) for dtype in dtypes)
+    return tuple(np.fromiter(column, dtype=dtype, count=len(rows)) for column, dtype in zip(zip(*rows), dtypes))
+
+
+def load_fraud_labels(db: Session) -> Tuple[np.ndarray, np.ndarray]:
+    """(fraud_probability, confirmed) of every resolved fraud case, in one query"""
+    rows = db.execute(
+        select(FraudCase.fraud_probability, FraudCase.investigation_status == "confirmed")
+        .where(FraudCase.investigation_status.in_(RESOLVED_STATUSES))
+    ).all()
+    return _columns(rows, (np.float64, np.bool_))
+
+
+def load_credit_labels(db: Session) -> Tuple[np.ndarray, np.ndarray]:
+    """(final_risk_score, paid_on_time) of every application with a known outcome, in one query"""
+    rows = db.execute(
+        select(CreditApplication.final_risk_score, CreditApplication.feedback_outcome == "paid_on_time")
+        .where(
+            CreditApplication.feedback_outcome.in_(("paid_on_time", "default")),
+            CreditApplication.final_risk_score.isnot(None)
+        )
+    ).all()
+    return _columns(rows, (np.float64, np.bool_))
+
+
+def threshold_sweep(scores: np.ndarray, labels: np.ndarray) -> Dict[str, np.ndarray]:
+    """Confusion counts for "positive when score >= t" at every distinct score, highest first.
+
+    The first point (t = inf) predicts nothing positive; the last predicts
+    everything positive. One sort and two cumulative sums.
+    """
+    order = np.argsort(-scores, kind="mergesort")
+    ordered, hits = scores[order], labels[order]
+    true_positives = np.cumsum(hits, dtype=np.int64)
+    false_positives = np.cumsum(~hits, dtype=np.int64)
+    last = np.r_[np.flatnonzero(np.diff(ordered)), len(ordered) - 1]  # Last row of each run of equal scores
+    return {
+        "thresholds": np.r_[np.inf, ordered[last]],
+        "true_positives": np.r_[0, true_positives[last]],
+        "false_positives": np.r_[0, false_positives[last]]
+    }
+
+
+def _ratio(numerator: np.ndarray, denominator, empty: float = 0.0) -> np.ndarray:
+    numerator = np.asarray(numerator, dtype=np.float64)
+    denominator = np.broadcast_to(np.asarray(denominator, dtype=np.float64), numerator.shape)
+    return np.divide(numerator, denominator, out=np.full(numerator.shape, empty), where=denominator > 0)
+
+
+def confusion_metrics(predicted: np.ndarray, labels: np.ndarray) -> Dict[str, float]:
+    """Accuracy, precision, recall, F1 and false-positive rate of boolean predictions"""
+    return operating_metrics({
+        "true_positives": int(np.count_nonzero(predicted & labels)),
+        "false_positives": int(np.count_nonzero(predicted & ~labels)),
+        "false_negatives": int(np.count_nonzero(~predicted & labels)),
+        "true_negatives": int(np.count_nonzero(~predicted & ~labels))
+    })
+
+
+def operating_metrics(cells: Dict[str, int]) -> Dict[str, float]:
+    """Accuracy, precision, recall, F1 and false-positive rate from confusion counts (CELLS)"""
+    true_positives, false_positives, false_negatives, true_negatives = (int(cells[name]) for name in CELLS)
+    total = true_positives + false_positives + false_negatives + true_negatives
+    precision = true_positives / (true_positives + false_positives) if true_positives + false_positives else 0.0
+    recall = true_positives / (true_positives + false_negatives) if true_positives + false_negatives else 0.0
+    return {
+        "true_positives": true_positives,
+        "false_positives": false_positives,
+        "false_negatives": false_negatives,
+        "true_negatives": true_negatives,
+        "accuracy": (true_positives + true_negatives) / total if total else 0.0,
+        "precision": precision,
+        "recall": recall,
+        "f1_score": 2 * precision * recall / (precision + recall) if precision + recall else 0.0,
+        "false_positive_rate": false_positives / (false_positives + true_negatives) if false_positives + true_negatives else 0.0
+    }
+
+
+def calibration(probabilities: np.ndarray, labels: np.ndarray, bins: int = CALIBRATION_BINS) -> Dict[str, Any]:
+    """Reliability bins, Brier score and expected calibration error of probabilities in [0, 1]"""
+    outcomes = labels.astype(np.float64)
+    index = np.minimum((probabilities * bins).astype(np.int64), bins - 1)
+    counts = np.bincount(index, minlength=bins)
+    predicted = np.bincount(index, weights=probabilities, minlength=bins)
+    observed = np.bincount(index, weights=outcomes, minlength=bins)
+    return {
+        "brier_score": float(np.mean((probabilities - outcomes) ** 2)),
+        "expected_calibration_error": float(np.abs(predicted - observed).sum() / len(probabilities)),
+        "bins": [
+            {
+                "lower": i / bins,
+                "upper": (i + 1) / bins,
+                "count": int(counts[i]),
+                "mean_predicted": round(float(predicted[i] / counts[i]), 4),
+                "observed_rate": round(float(observed[i] / counts[i]), 4)
+            }
+            for i in range(bins) if counts[i]
+        ]
+    }
+
+
+def _downsample(*curves: np.ndarray, points: int = CURVE_POINTS):
+    index = np.unique(np.linspace(0, len(curves[0]) - 1, min(points, len(curves[0]))).round().astype(np.int64))
+    return [np.round(curve[index], 4).tolist() for curve in curves]
+
+
+def evaluate(
+    scores: np.ndarray,
+    labels: np.ndarray,
+    operating: Dict[str, float],
+    scale: float,
+    false_positive_cost: float,
+    false_negative_cost: float
+) -> Optional[Dict[str, Any]]:
+    """Full evaluation of one agent's scores against outcomes.
+
+    `scores` are in the agent's own units (fraud probability 0-100, credit
+    risk score 0-1000) and `scale` maps them to [0, 1] for calibration.
+    `operating` holds the production decisions' confusion counts and metrics
+    (`operating_metrics`); ROC/PR curves and the cost-optimal threshold come
+    from a sweep over every distinct score. Returns None without labels.
+    """
+    total = len(labels)
+    if not total:
+        return None
+    positives = int(np.count_nonzero(labels))
+    negatives = total - positives
+
+    sweep = threshold_sweep(scores, labels)
+    true_positives, false_positives = sweep["true_positives"], sweep["false_positives"]
+    tpr = _ratio(true_positives, positives)
+    fpr = _ratio(false_positives, negatives)
+    precision = _ratio(true_positives, true_positives + false_positives, empty=1.0)
+
+    both_classes = positives and negatives
+    auc_roc = float(np.sum(np.diff(fpr) * (tpr[1:] + tpr[:-1]) / 2)) if both_classes else None
+    pr_auc = float(np.sum(np.diff(tpr) * precision[1:])) if positives else None  # Average precision
+
+    cost = false_positive_cost * false_positives + false_negative_cost * (positives - true_positives)
+    best = int(np.argmin(cost))
+    operating_cost = false_positive_cost * operating["false_positives"] + false_negative_cost * operating["false_negatives"]
+    decided = sum(operating[name] for name in CELLS)
+
+    roc_fpr, roc_tpr, pr_precision, thresholds = _downsample(fpr, tpr, precision, np.where(np.isinf(sweep["thresholds"]), -1, sweep["thresholds"]))
+    return {
+        **operating,
+        "samples": total,
+        "positives": positives,
+        "auc_roc": auc_roc,
+        "pr_auc": pr_auc,
+        **calibration(np.clip(scores / scale, 0.0, 1.0), labels),
+        "optimal_threshold": {
+            # None: the cheapest choice is to predict no positives at all
+            "threshold": None if np.isinf(sweep["thresholds"][best]) else float(sweep["thresholds"][best]),
+            "false_positive_cost": false_positive_cost,
+            "false_negative_cost": false_negative_cost,
+            "cost_per_sample": float(cost[best] / total),
+            # Per counted decision: for credit the counters leave manual reviews out
+            "operating_cost_per_sample": operating_cost / decided if decided else 0.0,
+            "true_positive_rate": float(tpr[best]),
+            "false_positive_rate": float(fpr[best]),
+            "precision": float(precision[best])
+        },
+        "curves": {
+            "thresholds": thresholds,  # -1 marks the predict-nothing point
+            "fpr": roc_fpr,
+            "tpr": roc_tpr,
+            "precision": pr_precision
+        }
+    }
+
+
+def evaluate_fraud(db: Session, counts: Dict[str, int], false_positive_cost: float,
+                   false_negative_cost: float) -> Optional[Dict[str, Any]]:
+    """Fraud agent against resolved cases; confirmed fraud is the positive class.
+
+    The operating point comes from the outcome counters (`counts`, as read
+    by `outcome_counters.totals`). Cases are only opened above the flagging
+    threshold, so the curves cover the scores the agent escalated rather
+    than every transaction.
+    """
+    scores, labels = load_fraud_labels(db)
+    return evaluate(scores, labels, operating_metrics(counts), 100.0, false_positive_cost, false_negative_cost)
+
+
+def evaluate_credit(db: Session, counts: Dict[str, int], false_positive_cost: float,
+                    false_negative_cost: float) -> Optional[Dict[str, Any]]:
+    """Credit agent against repayment outcomes; approval (repaid) is the positive class.
+
+    The operating point comes from the outcome counters (`counts`), which
+    count approved and rejected decisions only; the sweep also covers manual
+    reviews by risk score.
+    """
+    scores, labels = load_credit_labels(db)
+    report = evaluate(scores, labels, operating_metrics(counts), 1000.0, false_positive_cost, false_negative_cost)
+    if report is not None:
+        report["decided_samples"] = sum(counts[name] for name in CELLS)
+    return report
@@ -0,0 +1,204 @@
+from datetime import datetime
+from typing import Dict, Any, List, Optional
+import numpy as np
+from ..config.settings import settings
+from .feature_store import CustomerProfile
+
+EARTH_RADIUS_KM = 6371.0
+
+# Points added to the fast-path fraud score for each triggered rule
+RULE_WEIGHTS = {
+    "amount_outlier": 35.0,
+    "amount_extreme": 60.0,
+    "impossible_travel": 55.0,
+    "location_jump": 20.0,
+    "velocity_burst": 40.0,
+    "new_device": 15.0,
+    "new_ip": 10.0,
+    "dormant_reactivation": 25.0,
+}
+
+
+def haversine_km(lat1, long1, lat2, long2):
+    """Great-circle distance in km; works elementwise on arrays"""
+    lat1, long1, lat2, long2 = map(np.radians, (lat1, long1, lat2, long2))
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((long2 - long1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(a))
+
+
+class FastPathScorer:
+    """Deterministic rule scorer that settles clear-cut transactions without an LLM call.
+
+    Transactions scoring below `approve_below` (with enough history to judge) are
+    approved, those at or above `block_above` are blocked, and everything in
+    between returns None so the caller escalates to the LLM.
+    """
+
+    def __init__(
+        self,
+        enabled: bool = None,
+        approve_below: float = None,
+        block_above: float = None,
+        min_history: int = None
+    ):
+        self.enabled = settings.FAST_PATH_ENABLED if enabled is None else enabled
+        self.approve_below = settings.FAST_PATH_APPROVE_BELOW if approve_below is None else approve_below
+        self.block_above = settings.FAST_PATH_BLOCK_ABOVE if block_above is None else block_above
+        self.min_history = settings.FAST_PATH_MIN_HISTORY if min_history is None else min_history
+        self.counters = {"total": 0, "approved": 0, "blocked": 0, "escalated": 0, "degraded": 0}
+
+    def extract_features(self, transaction_data: Dict[str, Any], profile: Optional[CustomerProfile], now: float = None) -> Dict[str, Any]:
+        """Compute rule features for one transaction against the customer's aggregates"""
+        now = now if now is not None else datetime.utcnow().timestamp()
+        amount = float(transaction_data.get("amount") or 0.0)
+        location = transaction_data.get("location") or {}
+        lat, long = location.get("lat"), location.get("long")
+
+        features = {
+            "history_size": profile.count if profile else 0,
+            "amount_z": 0.0,
+            "amount_ratio": 1.0,
+            "distance_km": 0.0,
+            "speed_kmh": 0.0,
+            "txns_last_hour": 0,
+            "new_device": False,
+            "new_ip": False,
+            "days_since_last": 0.0,
+        }
+        if not profile or profile.count == 0:
+            return features
+
+        mean, std = profile.mean_amount, profile.std_amount
+        features["amount_z"] = (amount - mean) / std if std > 0 else (0.0 if amount <= mean else 3.0)
+        features["amount_ratio"] = amount / profile.max_amount if profile.max_amount > 0 else 1.0
+
+        features["days_since_last"] = max(now - profile.last_seen, 0.0) / 86400.0
+        recent = np.fromiter(profile.recent_timestamps, dtype=np.float64)
+        features["txns_last_hour"] = int(np.count_nonzero(recent >= now - 3600))
+
+        if lat is not None and long is not None and profile.last_located_at is not None:
+            features["distance_km"] = float(haversine_km(lat, long, profile.last_lat, profile.last_long))
+            hours = max(now - profile.last_located_at, 60.0) / 3600.0
+            features["speed_kmh"] = features["distance_km"] / hours
+
+        device = transaction_data.get("device_fingerprint")
+        if device and len(profile.devices):
+            features["new_device"] = device not in profile.devices
+        ip = transaction_data.get("ip_address")
+        if ip and len(profile.ips):
+            features["new_ip"] = ip not in profile.ips
+
+        return features
+
+    def evaluate_rules(self, features: Dict[str, Any]) -> List[str]:
+        """Return the names of the rules triggered by a feature set"""
+        triggered = []
+        if features["history_size"] >= 3:
+            if features["amount_z"] >= 6 or features["amount_ratio"] >= 10:
+                triggered.append("amount_extreme")
+            elif features["amount_z"] >= 3:
+                triggered.append("amount_outlier")
+        if features["speed_kmh"] >= 900:
+            triggered.append("impossible_travel")
+        elif features["distance_km"] >= 500:
+            triggered.append("location_jump")
+        if features["txns_last_hour"] >= 5:
+            triggered.append("velocity_burst")
+        if features["new_device"]:
+            triggered.append("new_device")
+        if features["new_ip"]:
+            triggered.append("new_ip")
+        if features["days_since_last"] >= 90 and features["amount_z"] >= 1:
+            triggered.append("dormant_reactivation")
+        return triggered
+
+    def rule_score(self, transaction_data: Dict[str, Any], profile: Optional[CustomerProfile]):
+        """(features, triggered rules, fraud score 0-100) of a transaction"""
+        features = self.extract_features(transaction_data, profile)
+        triggered = self.evaluate_rules(features)
+        return features, triggered, min(100.0, sum(RULE_WEIGHTS[rule] for rule in triggered))
+
+    def score(self, transaction_data: Dict[str, Any], profile: Optional[CustomerProfile]) -> Optional[Dict[str, Any]]:
+        """Score a transaction; returns a decision for clear cases, None to escalate"""
+        if not self.enabled:
+            return None
+
+        self.counters["total"] += 1
+        features, triggered, probability = self.rule_score(transaction_data, profile)
+
+        if probability >= self.block_above:
+            self.counters["blocked"] += 1
+            return {
+                "fraud_probability": probability,
+                "risk_level": "critical",
+                "action": "block",
+                "anomalies": triggered,
+                "reasoning": "Blocked by fast-path rules: " + ", ".join(triggered),
+                "decided_by": "fast_path"
+            }
+
+        if probability < self.approve_below and features["history_size"] >= self.min_history:
+            self.counters["approved"] += 1
+            return {
+                "fraud_probability": probability,
+                "risk_level": "low",
+                "action": "approve",
+                "anomalies": triggered,
+                "reasoning": "Consistent with customer history; approved by fast-path rules",
+                "decided_by": "fast_path"
+            }
+
+        self.counters["escalated"] += 1
+        return None
+
+    def degraded(self, transaction_data: Dict[str, Any], profile: Optional[CustomerProfile],
+                 assessment: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """Decision for a transaction the LLM cannot score, from the rules and the fraud model's assessment if any.
+
+        Used whether or not the fast path is enabled. Applies the prompt's
+        thresholds to the higher of the two scores, and flags rather than
+        approves a customer with too little history to judge.
+        """
+        self.counters["degraded"] += 1
+        features, triggered, probability = self.rule_score(transaction_data, profile)
+        anomalies = list(triggered)
+        if assessment is not None and assessment["fraud_probability"] > probability:
+            probability = assessment["fraud_probability"]
+            anomalies += [a for a in assessment["anomalies"] if a not in anomalies]
+
+        if probability >= self.block_above:
+            action, risk_level = "block", "critical"
+        elif probability >= 60:
+            action, risk_level = "verify", "high"
+        elif features["history_size"] < self.min_history:
+            action, risk_level = "flag", "medium"
+        else:
+            action, risk_level = "approve", "low" if probability < self.approve_below else "medium"
+        return {
+            "fraud_probability": probability,
+            "risk_level": risk_level,
+            "action": action,
+            "anomalies": anomalies,
+            "reasoning": f"Degraded mode: scored {probability:.0f} by local rules" + (
+                f" and fraud model {assessment['model_version']}" if assessment is not None else ""
+            ),
+            "decided_by": "degraded"
+        }
+
+    def stats(self) -> Dict[str, Any]:
+        """Share of traffic settled locally vs escalated to the LLM"""
+        total = self.counters["total"]
+        handled = self.counters["approved"] + self.counters["blocked"]
+        return {
+            "enabled": self.enabled,
+            "thresholds": {
+                "approve_below": self.approve_below,
+                "block_above": self.block_above,
+                "min_history": self.min_history
+            },
+            **self.counters,
+            "handled_share": round(handled / total, 4) if total else 0.0
+        }
+
+
+fast_path_scorer = FastPathScorer()
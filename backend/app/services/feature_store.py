@@ -0,0 +1,264 @@
+import asyncio
+import logging
+import math
+import time
+from collections import OrderedDict, deque
+from datetime import datetime, timedelta
+from typing import Dict, Any, Iterable, List, Optional
+from sqlalchemy import select
+from ..config.database import AsyncSessionLocal
+from ..config.settings import settings
+from ..models.schemas import Transaction
+
+logger = logging.getLogger(__name__)
+
+
+def _epoch(value) -> float:
+    if isinstance(value, datetime):
+        return value.timestamp()
+    return float(value) if value is not None else datetime.utcnow().timestamp()
+
+
+def _location_cell(lat: float, long: float) -> str:
+    """Round coordinates to a ~10km grid cell so nearby points share a key"""
+    return f"{round(lat, 1)},{round(long, 1)}"
+
+
+class TopK:
+    """Space-Saving heavy-hitters counter with a fixed number of slots"""
+
+    __slots__ = ("capacity", "counts")
+
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self.counts: Dict[str, int] = {}
+
+    def add(self, key: Optional[str]):
+        if not key:
+            return
+        if key in self.counts:
+            self.counts[key] += 1
+        elif len(self.counts) < self.capacity:
+            self.counts[key] = 1
+        else:
+            # Evict the smallest counter and inherit its count (over-estimates, never under-estimates)
+            victim = min(self.counts, key=self.counts.get)
+            floor = self.counts.pop(victim)
+            self.counts[key] = floor + 1
+
+    def top(self, k: int = None) -> List[str]:
+        ordered = sorted(self.counts, key=self.counts.get, reverse=True)
+        return ordered[:k] if k else ordered
+
+    def __contains__(self, key) -> bool:
+        return key in self.counts
+
+    def __len__(self) -> int:
+        return len(self.counts)
+
+    def copy(self) -> "TopK":
+        clone = TopK(self.capacity)
+        clone.counts = dict(self.counts)
+        return clone
+
+
+class CustomerProfile:
+    """Running aggregates over one customer's transactions"""
+
+    __slots__ = (
+        "count", "mean_amount", "m2_amount", "max_amount",
+        "merchants", "locations", "devices", "ips",
+        "first_seen", "last_seen", "last_lat", "last_long", "last_located_at",
+        "recent_timestamps"
+    )
+
+    def __init__(self, top_k: int = None, recent_window: int = None):
+        top_k = top_k or settings.FEATURE_STORE_TOP_K
+        self.count = 0
+        self.mean_amount = 0.0
+        self.m2_amount = 0.0  # Welford sum of squared deviations
+        self.max_amount = 0.0
+        self.merchants = TopK(top_k)
+        self.locations = TopK(top_k)
+        self.devices = TopK(top_k)
+        self.ips = TopK(top_k)
+        self.first_seen: Optional[float] = None
+        self.last_seen: Optional[float] = None
+        self.last_lat: Optional[float] = None
+        self.last_long: Optional[float] = None
+        self.last_located_at: Optional[float] = None
+        self.recent_timestamps = deque(maxlen=recent_window or settings.FEATURE_STORE_RECENT_WINDOW)
+
+    def update(self, txn: Dict[str, Any]):
+        """Fold one transaction into the aggregates in O(1)"""
+        amount = float(txn.get("amount") or 0.0)
+        ts = _epoch(txn.get("timestamp"))
+
+        self.count += 1
+        delta = amount - self.mean_amount
+        self.mean_amount += delta / self.count
+        self.m2_amount += delta * (amount - self.mean_amount)
+        self.max_amount = max(self.max_amount, amount)
+
+        self.merchants.add(txn.get("merchant_id"))
+        self.devices.add(txn.get("device_fingerprint"))
+        self.ips.add(txn.get("ip_address"))
+
+        lat, long = txn.get("location_lat"), txn.get("location_long")
+        if lat is not None and long is not None:
+            self.locations.add(_location_cell(lat, long))
+            if self.last_located_at is None or ts >= self.last_located_at:
+                self.last_lat, self.last_long, self.last_located_at = lat, long, ts
+
+        self.first_seen = ts if self.first_seen is None else min(self.first_seen, ts)
+        self.last_seen = ts if self.last_seen is None else max(self.last_seen, ts)
+        self.recent_timestamps.append(ts)
+
+    def snapshot(self) -> "CustomerProfile":
+        """Independent copy, for scoring later against the aggregates as they are now"""
+        clone = CustomerProfile.__new__(CustomerProfile)
+        for name in self.__slots__:
+            setattr(clone, name, getattr(self, name))
+        for name in ("merchants", "locations", "devices", "ips"):
+            setattr(clone, name, getattr(self, name).copy())
+        clone.recent_timestamps = deque(self.recent_timestamps, maxlen=self.recent_timestamps.maxlen)
+        return clone
+
+    @property
+    def std_amount(self) -> float:
+        return math.sqrt(self.m2_amount / self.count) if self.count > 1 else 0.0
+
+    def frequency_per_week(self) -> float:
+        if self.count < 2 or self.first_seen is None:
+            return 0.0
+        span_days = max((self.last_seen - self.first_seen) / 86400.0, 1.0)
+        return self.count / span_days * 7
+
+    def as_history(self) -> Dict[str, Any]:
+        """Summary in the shape FraudDetectionAgent expects for customer_history"""
+        return {
+            "avg_amount": self.mean_amount,
+            "common_merchants": self.merchants.top(3),
+            "common_locations": self.locations.top(3),
+            "frequency": f"{self.frequency_per_week():.1f} transactions/week over {self.count} transactions"
+        }
+
+
+class CustomerFeatureStore:
+    """In-process per-customer aggregates for the fraud hot path.
+
+    Each worker builds the store from the `transactions` table at startup,
+    folds in its own inserts as they commit, and periodically tails rows
+    written by other workers, so lookups never touch the database.
+    """
+
+    def __init__(self):
+        self.profiles: Dict[str, CustomerProfile] = {}
+        self.watermark: Optional[datetime] = None  # Newest transaction timestamp seen
+        self._applied = OrderedDict()  # Recently applied txn_ids, so own writes are not double counted
+        self._lock = asyncio.Lock()
+        self.last_rebuild: Dict[str, Any] = {}
+
+    def get(self, customer_id: str) -> Optional[CustomerProfile]:
+        """O(1) lookup used on the request path"""
+        return self.profiles.get(customer_id)
+
+    def observe(self, txn: Dict[str, Any]) -> bool:
+        """Apply one committed transaction row (dict of Transaction columns); the row is not modified"""
+        txn_id = txn.get("txn_id")
+        if txn_id is not None:
+            if txn_id in self._applied:
+                return False
+            self._applied[txn_id] = None
+            if len(self._applied) > settings.FEATURE_STORE_DEDUP_WINDOW:
+                self._applied.popitem(last=False)
+
+        if "timestamp" not in txn:
+            # A copy: the caller's dict may be queued for the write-behind, where an app-clock timestamp would be inserted
+            txn = {**txn, "timestamp": datetime.utcnow()}
+        profile = self.profiles.get(txn["customer_id"])
+        if profile is None:
+            profile = self.profiles[txn["customer_id"]] = CustomerProfile()
+        profile.update(txn)
+        return True
+
+    def observe_many(self, txns: Iterable[Dict[str, Any]]):
+        for txn in txns:
+            self.observe(txn)
+
+    async def _apply_query(self, db, query) -> int:
+        applied = 0
+        result = await db.stream(query.execution_options(yield_per=settings.FEATURE_STORE_REBUILD_BATCH))
+        async for row in result.mappings():
+            applied += self.observe(dict(row))
+            # Only database timestamps advance the watermark; own writes use the app clock
+            if row["timestamp"] is not None and (self.watermark is None or row["timestamp"] > self.watermark):
+                self.watermark = row["timestamp"]
+        return applied
+
+    def _columns(self):
+        return select(
+            Transaction.txn_id,
+            Transaction.customer_id,
+            Transaction.amount,
+            Transaction.merchant_id,
+            Transaction.location_lat,
+            Transaction.location_long,
+            Transaction.device_fingerprint,
+            Transaction.ip_address,
+            Transaction.timestamp
+        )
+
+    async def rebuild(self) -> Dict[str, Any]:
+        """Replay the transactions table in time order into fresh aggregates, then swap them in.
+
+        Lookups keep using the current profiles until the replay is complete;
+        rows committed while it ran are folded in by one catch-up after the swap.
+        """
+        async with self._lock:
+            started = time.perf_counter()
+            fresh = CustomerFeatureStore()
+            async with AsyncSessionLocal() as db:
+                applied = await fresh._apply_query(db, self._columns().order_by(Transaction.timestamp))
+            self.profiles, self.watermark, self._applied = fresh.profiles, fresh.watermark, fresh._applied
+            applied += await self._catch_up()
+            self.last_rebuild = {
+                "transactions": applied,
+                "customers": len(self.profiles),
+                "seconds": round(time.perf_counter() - started, 3),
+                "completed_at": datetime.utcnow().isoformat()
+            }
+            return self.last_rebuild
+
+    async def catch_up(self) -> int:
+        """Fold in rows committed by other workers since the watermark"""
+        async with self._lock:
+            return await self._catch_up()
+
+    async def _catch_up(self) -> int:
+        query = self._columns()
+        if self.watermark is not None:
+            # Re-read an overlap window for rows that committed late; already-applied ids are skipped
+            overlap = timedelta(seconds=settings.FEATURE_STORE_SYNC_OVERLAP_SECONDS)
+            query = query.where(Transaction.timestamp >= self.watermark - overlap)
+        async with AsyncSessionLocal() as db:
+            return await self._apply_query(db, query.order_by(Transaction.timestamp))
+
+    async def run_sync_loop(self):
+        """Background task: periodically tail the transactions table"""
+        while True:
+            await asyncio.sleep(settings.FEATURE_STORE_SYNC_SECONDS)
+            try:
+                await self.catch_up()
+            except Exception as e:
+                logger.warning("Feature store catch-up failed: %s", e)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "customers": len(self.profiles),
+            "watermark": self.watermark.isoformat() if self.watermark else None,
+            "last_rebuild": self.last_rebuild
+        }
+
+
+feature_store = CustomerFeatureStore()
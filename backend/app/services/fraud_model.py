@@ -0,0 +1,279 @@
+import json
+import math
+import os
+import time
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+import numpy as np
+from ..config.settings import settings
+from .fast_path import fast_path_scorer
+from .feature_store import CustomerProfile
+
+# Model inputs, derived from the fast-path rule features
+MODEL_FEATURES = (
+    "log_amount",
+    "amount_z",
+    "log_amount_ratio",
+    "log_distance_km",
+    "log_speed_kmh",
+    "txns_last_hour",
+    "new_device",
+    "new_ip",
+    "log_days_since_last",
+    "log_history_size",
+)
+PROMOTED_ARTIFACT = "fraud_model.json"  # Name of the promoted artifact in FRAUD_MODEL_DIR
+
+
+def model_features(transaction_data: Dict[str, Any], profile: Optional[CustomerProfile], now: float = None) -> np.ndarray:
+    """Feature vector (MODEL_FEATURES order) of one transaction against the customer's aggregates"""
+    features = fast_path_scorer.extract_features(transaction_data, profile, now)
+    amount = float(transaction_data.get("amount") or 0.0)
+    return np.array([
+        math.log1p(max(amount, 0.0)),
+        min(max(features["amount_z"], -10.0), 50.0),
+        math.log1p(max(features["amount_ratio"], 0.0)),
+        math.log1p(features["distance_km"]),
+        math.log1p(features["speed_kmh"]),
+        features["txns_last_hour"],
+        float(features["new_device"]),
+        float(features["new_ip"]),
+        math.log1p(features["days_since_last"]),
+        math.log1p(features["history_size"]),
+    ], dtype=np.float64)
+
+
+def _sigmoid(z):
+    return 1.0 / (1.0 + np.exp(-np.clip(z, -35.0, 35.0)))
+
+
+def fit_logistic(X: np.ndarray, y: np.ndarray, l2: float = 1.0, max_iter: int = 50, tol: float = 1e-6):
+    """L2-regularized logistic regression by Newton's method on standardized features.
+
+    Returns (weights, bias, mean, scale) with weights on the standardized scale.
+    """
+    mean = X.mean(axis=0)
+    scale = X.std(axis=0)
+    scale[scale == 0] = 1.0
+    Z = np.c_[(X - mean) / scale, np.ones(len(X))]
+    labels = y.astype(np.float64)
+    penalty = np.full(Z.shape[1], float(l2))
+    penalty[-1] = 1e-9  # Bias is (almost) unpenalized
+    w = np.zeros(Z.shape[1])
+    for _ in range(max_iter):
+        p = _sigmoid(Z @ w)
+        gradient = Z.T @ (p - labels) + penalty * w
+        hessian = (Z * (p * (1.0 - p))[:, None]).T @ Z + np.diag(penalty)
+        step = np.linalg.solve(hessian, gradient)
+        w -= step
+        if np.max(np.abs(step)) < tol:
+            break
+    return w[:-1], float(w[-1]), mean, scale
+
+
+def action_for(probability: float) -> str:
+    """The fraud prompt's thresholds: >90 block, 60-90 verify, otherwise approve"""
+    if probability > 90:
+        return "block"
+    if probability >= 60:
+        return "verify"
+    return "approve"
+
+
+class FraudModel:
+    """Logistic regression over MODEL_FEATURES, with its version and training report"""
+
+    def __init__(self, weights, bias: float, mean, scale, version: str, trained_at: str = None,
+                 report: Dict[str, Any] = None, promoted: bool = False):
+        self.weights = np.asarray(weights, dtype=np.float64)
+        self.bias = float(bias)
+        self.mean = np.asarray(mean, dtype=np.float64)
+        self.scale = np.asarray(scale, dtype=np.float64)
+        self.version = version
+        self.trained_at = trained_at or datetime.utcnow().isoformat()
+        self.report = report or {}
+        self.promoted = promoted
+        # Standardization folded into the weights, so scoring is one dot product
+        self._coef = self.weights / self.scale
+        self._intercept = self.bias - float(self._coef @ self.mean)
+
+    @property
+    def can_approve(self) -> bool:
+        """Trained on never-flagged transactions too; a model that only saw fraud cases never approves on its own"""
+        return self.report.get("can_approve", False)
+
+    def predict_proba(self, X: np.ndarray) -> np.ndarray:
+        """Fraud probabilities in [0, 1] for a feature matrix"""
+        return _sigmoid(X @ self._coef + self._intercept)
+
+    def probability(self, x: np.ndarray) -> float:
+        """Fraud probability (0-100) of one feature vector"""
+        return 100.0 / (1.0 + math.exp(-min(max(float(x @ self._coef) + self._intercept, -35.0), 35.0)))
+
+    def top_contributions(self, x: np.ndarray, k: int = 3) -> List[str]:
+        """Features pushing this transaction's score up the most"""
+        contributions = self.weights * (x - self.mean) / self.scale
+        order = np.argsort(-contributions)[:k]
+        return [MODEL_FEATURES[i] for i in order if contributions[i] > 0]
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            "version": self.version,
+            "kind": "logistic_regression",
+            "features": list(MODEL_FEATURES),
+            "weights": self.weights.tolist(),
+            "bias": self.bias,
+            "mean": self.mean.tolist(),
+            "scale": self.scale.tolist(),
+            "trained_at": self.trained_at,
+            "promoted": self.promoted,
+            "report": self.report
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "FraudModel":
+        if tuple(data.get("features", ())) != MODEL_FEATURES:
+            raise ValueError(f"Model {data.get('version')} was trained on different features")
+        return cls(
+            data["weights"], data["bias"], data["mean"], data["scale"], data["version"],
+            trained_at=data.get("trained_at"), report=data.get("report"), promoted=data.get("promoted", False)
+        )
+
+    def save(self, path: str):
+        """Write the artifact atomically, so a worker reloading it never reads half a file"""
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        tmp = f"{path}.tmp"
+        with open(tmp, "w") as f:
+            json.dump(self.as_dict(), f)
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path: str) -> "FraudModel":
+        with open(path) as f:
+            return cls.from_dict(json.load(f))
+
+
+class FraudModelScorer:
+    """In-process fraud model scored next to the LLM.
+
+    In "shadow" mode the model scores every transaction the fast path leaves
+    to the LLM and is only compared with the final decision. In "challenger"
+    mode a promoted model also settles the transactions it is confident about
+    (below `approve_below`, at or above `block_above`); the rest still reach
+    the LLM. Only a model trained on never-flagged transactions as well
+    (`FraudModel.can_approve`) approves. "off" skips it entirely.
+    `require_promoted=False` lets a candidate decide too, for shadow
+    challengers that never reach production.
+    """
+
+    def __init__(self, mode: str = None, path: str = None, approve_below: float = None, block_above: float = None,
+                 require_promoted: bool = True):
+        self.mode = mode or settings.FRAUD_MODEL_MODE
+        if self.mode not in ("off", "shadow", "challenger"):
+            raise ValueError(f"Unknown FRAUD_MODEL_MODE: {self.mode}")
+        self.path = path or settings.FRAUD_MODEL_PATH or os.path.join(settings.FRAUD_MODEL_DIR, PROMOTED_ARTIFACT)
+        self.approve_below = settings.FRAUD_MODEL_APPROVE_BELOW if approve_below is None else approve_below
+        self.block_above = settings.FRAUD_MODEL_BLOCK_ABOVE if block_above is None else block_above
+        self.require_promoted = require_promoted
+        self.model: Optional[FraudModel] = None
+        self.load_error: Optional[str] = None
+        self.counters = {"scored": 0, "approved": 0, "blocked": 0, "escalated": 0, "agreed": 0, "disagreed": 0}
+        self.score_seconds = 0.0
+        if self.mode != "off":
+            self.reload()
+
+    @property
+    def enabled(self) -> bool:
+        return self.mode != "off" and self.model is not None
+
+    def reload(self) -> Dict[str, Any]:
+        """Load the artifact at `path`; a missing or broken file keeps the current model"""
+        try:
+            self.model = FraudModel.load(self.path)
+            self.load_error = None
+        except FileNotFoundError:
+            self.load_error = f"No model artifact at {self.path}"
+        except (ValueError, KeyError) as e:
+            self.load_error = f"Unreadable model artifact {self.path}: {e}"
+        return self.stats()
+
+    def score(self, transaction_data: Dict[str, Any], profile: Optional[CustomerProfile]) -> Optional[Dict[str, Any]]:
+        """The model's assessment of a transaction, or None when no model is active"""
+        model = self.model
+        if self.mode == "off" or model is None:
+            return None
+
+        started = time.perf_counter()
+        x = model_features(transaction_data, profile)
+        probability = model.probability(x)
+        self.score_seconds += time.perf_counter() - started
+        self.counters["scored"] += 1
+        return {
+            "model_version": model.version,
+            "promoted": model.promoted,
+            "can_approve": model.can_approve,
+            "fraud_probability": round(probability, 2),
+            "action": action_for(probability),
+            "anomalies": model.top_contributions(x)
+        }
+
+    def decide(self, assessment: Optional[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+        """A decision for confident scores in challenger mode; None to escalate to the LLM"""
+        if assessment is None or self.mode != "challenger" or (self.require_promoted and not assessment["promoted"]):
+            return None
+
+        probability = assessment["fraud_probability"]
+        reasoning = f"Scored {probability:.1f} by fraud model {assessment['model_version']}"
+        if probability >= self.block_above:
+            self.counters["blocked"] += 1
+            return {
+                "fraud_probability": probability,
+                "risk_level": "critical",
+                "action": "block",
+                "anomalies": assessment["anomalies"],
+                "reasoning": reasoning,
+                "decided_by": "model"
+            }
+        if probability < self.approve_below and assessment["can_approve"]:
+            self.counters["approved"] += 1
+            return {
+                "fraud_probability": probability,
+                "risk_level": "low",
+                "action": "approve",
+                "anomalies": [],
+                "reasoning": reasoning,
+                "decided_by": "model"
+            }
+
+        self.counters["escalated"] += 1
+        return None
+
+    def compare(self, assessment: Optional[Dict[str, Any]], result: Dict[str, Any]):
+        """Record whether the model would have flagged the transaction like the final decision did"""
+        if assessment is None:
+            return
+        flagged = assessment["action"] != "approve"
+        if flagged == (result["action"] != "approve"):
+            self.counters["agreed"] += 1
+        else:
+            self.counters["disagreed"] += 1
+        result["shadow_model"] = assessment
+
+    def stats(self) -> Dict[str, Any]:
+        scored = self.counters["scored"]
+        compared = self.counters["agreed"] + self.counters["disagreed"]
+        return {
+            "mode": self.mode,
+            "path": self.path,
+            "model_version": self.model.version if self.model else None,
+            "promoted": self.model.promoted if self.model else False,
+            "can_approve": self.model.can_approve if self.model else False,
+            "load_error": self.load_error,
+            "thresholds": {"approve_below": self.approve_below, "block_above": self.block_above},
+            **self.counters,
+            "agreement_rate": round(self.counters["agreed"] / compared, 4) if compared else 0.0,
+            "avg_score_us": round(self.score_seconds / scored * 1e6, 1) if scored else 0.0
+        }
+
+
+fraud_model_scorer = FraudModelScorer()
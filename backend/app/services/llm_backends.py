@@ -0,0 +1,253 @@
+import asyncio
+import hashlib
+import json
+import math
+import os
+import random
+import threading
+import time
+from typing import Any, Dict, List, Optional
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+from pydantic import ConfigDict
+from ..config.settings import settings
+from .token_usage import estimate_tokens
+
+Z_99 = 2.3263  # Standard normal 99th percentile
+
+
+class SyntheticLLMError(RuntimeError):
+    """Injected failure (LLM_SYNTHETIC_ERROR_RATE) standing in for an API error"""
+
+
+def prompt_hash(messages: List) -> str:
+    """Hash of the whitespace-normalized messages; the key recordings are stored under"""
+    normalized = [
+        {"role": message.type, "content": " ".join(str(message.content).split())}
+        for message in messages
+    ]
+    return hashlib.sha256(json.dumps(normalized, sort_keys=True).encode()).hexdigest()
+
+
+class LatencyModel:
+    """Latency samples in seconds: fixed, uniform or lognormal around a median.
+
+    `p99_ms` sets the tail: the 99th percentile of the lognormal, and the
+    upper bound of the uniform, whose lower bound mirrors it around the
+    median (clamped at zero).
+    """
+
+    def __init__(self, distribution: str = None, median_ms: float = None, p99_ms: float = None, seed: Optional[int] = None):
+        self.distribution = distribution or settings.LLM_SYNTHETIC_LATENCY
+        self.median_ms = settings.LLM_SYNTHETIC_LATENCY_MS if median_ms is None else median_ms
+        self.p99_ms = max(self.median_ms, settings.LLM_SYNTHETIC_LATENCY_P99_MS if p99_ms is None else p99_ms)
+        if self.distribution not in ("fixed", "uniform", "lognormal"):
+            raise ValueError(f"Unknown latency distribution: {self.distribution}")
+        self._random = random.Random(settings.LLM_SYNTHETIC_SEED if seed is None else seed)
+        self._lock = threading.Lock()
+
+    def sample(self) -> float:
+        with self._lock:
+            if self.distribution == "fixed" or self.median_ms <= 0:
+                ms = self.median_ms
+            elif self.distribution == "uniform":
+                spread = self.p99_ms - self.median_ms
+                ms = self._random.uniform(max(0.0, self.median_ms - spread), self.p99_ms)
+            else:
+                sigma = math.log(self.p99_ms / self.median_ms) / Z_99
+                ms = self._random.lognormvariate(math.log(self.median_ms), sigma)
+        return ms / 1000
+
+
+def synthetic_answer(agent: Optional[str], key: str) -> str:
+    """A schema-valid decision derived from the prompt hash, so the same prompt always gets the same answer"""
+    unit = int(key[:8], 16) / 0xFFFFFFFF
+    if agent == "credit":
+        risk_score = int(unit * 1000)
+        decision = "approved" if risk_score > 750 else "rejected" if risk_score < 300 else "manual_review"
+        return json.dumps({
+            "risk_score": risk_score,
+            "decision": decision,
+            "confidence": round(0.5 + abs(unit - 0.5), 2),
+            "positive_factors": ["Synthetic positive factor"],
+            "risk_factors": ["Synthetic risk factor"],
+            "reasoning": "Synthetic response for load testing"
+        })
+    probability = round(unit * 100, 1)
+    action, risk_level = (
+        ("block", "critical") if probability > 90 else
+        ("verify", "high") if probability >= 60 else
+        ("approve", "low") if probability < 30 else
+        ("approve", "medium")
+    )
+    return json.dumps({
+        "fraud_probability": probability,
+        "risk_level": risk_level,
+        "action": action,
+        "anomalies": ["Synthetic anomaly"] if probability >= 60 else [],
+        "reasoning": "Synthetic response for load testing"
+    })
+
+
+class ReplayStore:
+    """Recorded answers by prompt hash, read from (and appended to) a JSON-lines file"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.answers: Dict[str, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+        if os.path.exists(path):
+            with open(path) as f:
+                for line in f:
+                    if line.strip():
+                        record = json.loads(line)
+                        self.answers[record["hash"]] = record  # Later recordings win
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        return self.answers.get(key)
+
+    def append(self, key: str, content: str, latency_ms: float, agent: Optional[str]):
+        record = {"hash": key, "agent": agent, "content": content, "latency_ms": round(latency_ms, 1)}
+        with self._lock:
+            self.answers[key] = record
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            with open(self.path, "a") as f:
+                f.write(json.dumps(record) + "\n")
+
+
+_stores: Dict[str, ReplayStore] = {}
+_stores_lock = threading.Lock()
+
+
+def replay_store(path: str) -> ReplayStore:
+    """One store per file, shared by every model of the process"""
+    with _stores_lock:
+        if path not in _stores:
+            _stores[path] = ReplayStore(path)
+        return _stores[path]
+
+
+class _StandInChatModel(BaseChatModel):
+    """Shared plumbing: latency, injected errors and usage metadata"""
+    model_config = ConfigDict(arbitrary_types_allowed=True)
+
+    agent: Optional[str] = None
+    latency: Any = None
+    error_rate: float = 0.0
+
+    def _answer(self, messages: List) -> tuple:
+        """(content, latency in seconds) for the prompt"""
+        raise NotImplementedError
+
+    def _result(self, messages: List, content: str) -> ChatResult:
+        message = AIMessage(content=content, usage_metadata={
+            "input_tokens": estimate_tokens(messages),
+            "output_tokens": estimate_tokens(content),
+            "total_tokens": estimate_tokens(messages) + estimate_tokens(content)
+        })
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    def _maybe_fail(self):
+        if self.error_rate and random.random() < self.error_rate:
+            raise SyntheticLLMError("Injected LLM failure")
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+        content, delay = self._answer(messages)
+        time.sleep(delay)
+        self._maybe_fail()
+        return self._result(messages, content)
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+        content, delay = self._answer(messages)
+        await asyncio.sleep(delay)
+        self._maybe_fail()
+        return self._result(messages, content)
+
+
+class SyntheticChatModel(_StandInChatModel):
+    """Answers every prompt with a deterministic, schema-valid decision after a sampled latency"""
+
+    @property
+    def _llm_type(self) -> str:
+        return "synthetic"
+
+    def _answer(self, messages: List) -> tuple:
+        return synthetic_answer(self.agent, prompt_hash(messages)), self.latency.sample()
+
+
+class ReplayChatModel(_StandInChatModel):
+    """Answers prompts with recorded responses, waiting the recorded latency (scaled).
+
+    Prompts that were never recorded get a synthetic answer, or raise
+    LookupError when LLM_REPLAY_ON_MISS is "error".
+    """
+    store: Any = None
+    latency_scale: float = 1.0
+    on_miss: str = "synthetic"
+
+    @property
+    def _llm_type(self) -> str:
+        return "replay"
+
+    def _answer(self, messages: List) -> tuple:
+        key = prompt_hash(messages)
+        record = self.store.get(key)
+        if record is None:
+            if self.on_miss == "error":
+                raise LookupError(f"No recorded LLM response for prompt {key[:12]}")
+            return synthetic_answer(self.agent, key), self.latency.sample()
+        return record["content"], record.get("latency_ms", 0) / 1000 * self.latency_scale
+
+
+class RecordingChatModel(BaseChatModel):
+    """Wraps the real model and appends every answer, with its latency, to a replay file"""
+    model_config = ConfigDict(arbitrary_types_allowed=True)
+
+    inner: Any
+    store: Any
+    agent: Optional[str] = None
+
+    @property
+    def _llm_type(self) -> str:
+        return "recording"
+
+    def _record(self, messages, result: ChatResult, started: float) -> ChatResult:
+        content = result.generations[0].message.content
+        self.store.append(prompt_hash(messages), content, (time.perf_counter() - started) * 1000, self.agent)
+        return result
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+        started = time.perf_counter()
+        return self._record(messages, self.inner._generate(messages, stop=stop, **kwargs), started)
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+        started = time.perf_counter()
+        return self._record(messages, await self.inner._agenerate(messages, stop=stop, **kwargs), started)
+
+
+def build_stand_in(agent: Optional[str]) -> BaseChatModel:
+    """Chat model standing in for ChatOpenAI under LLM_BACKEND=replay or synthetic.
+
+    Lets the whole stack be load-tested with realistic LLM latency and no
+    network: replay serves answers recorded with LLM_RECORD_PATH, synthetic
+    makes them up from the prompt hash.
+    """
+    latency = LatencyModel()
+    if settings.LLM_BACKEND == "synthetic":
+        return SyntheticChatModel(agent=agent, latency=latency, error_rate=settings.LLM_SYNTHETIC_ERROR_RATE)
+    if settings.LLM_BACKEND == "replay":
+        return ReplayChatModel(
+            agent=agent,
+            latency=latency,
+            error_rate=settings.LLM_SYNTHETIC_ERROR_RATE,
+            store=replay_store(settings.LLM_REPLAY_PATH),
+            latency_scale=settings.LLM_REPLAY_LATENCY_SCALE,
+            on_miss=settings.LLM_REPLAY_ON_MISS
+        )
+    raise ValueError(f"Unknown LLM_BACKEND: {settings.LLM_BACKEND}")
+
+
+def with_recording(model: BaseChatModel, agent: Optional[str]) -> BaseChatModel:
+    """Record the model's answers to LLM_RECORD_PATH"""
+    return RecordingChatModel(inner=model, store=replay_store(settings.LLM_RECORD_PATH), agent=agent)
@@ -0,0 +1,202 @@
+import asyncio
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Any, List, Optional
+from ..config.settings import settings
+
+
+class LLMResponseCache:
+    """Content-addressed cache for LLM responses.
+
+    Keys hash the normalized prompt together with the model, temperature and
+    agent version, so a prompt or model change never serves a stale answer.
+    An in-memory LRU sits in front of an optional SQLite file with TTL and
+    size-based eviction that survives restarts and is shared by workers.
+    Async callers use `aget`/`aset`, which keep the SQLite I/O off the
+    event loop.
+    """
+
+    def __init__(
+        self,
+        enabled: bool = None,
+        max_entries: int = None,
+        ttl_seconds: float = None,
+        disk_path: Optional[str] = None,
+        disk_max_bytes: int = None
+    ):
+        self.enabled = settings.LLM_CACHE_ENABLED if enabled is None else enabled
+        self.max_entries = max_entries or settings.LLM_CACHE_MAX_ENTRIES
+        self.ttl_seconds = ttl_seconds or settings.LLM_CACHE_TTL_SECONDS
+        self.disk_path = disk_path if disk_path is not None else settings.LLM_CACHE_DISK_PATH
+        self.disk_max_bytes = disk_max_bytes or settings.LLM_CACHE_DISK_MAX_MB * 1024 * 1024
+        self._memory: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()  # Memory tier
+        self._disk_lock = threading.Lock()  # SQLite connection
+        self._disk: Optional[sqlite3.Connection] = None
+        self._disk_bytes = 0  # Running estimate; recomputed whenever eviction runs
+        self.counters = {"memory_hits": 0, "disk_hits": 0, "misses": 0, "bypassed": 0, "writes": 0, "evictions": 0}
+
+        if self.enabled and self.disk_path:
+            os.makedirs(os.path.dirname(os.path.abspath(self.disk_path)), exist_ok=True)
+            self._disk = sqlite3.connect(self.disk_path, check_same_thread=False, isolation_level=None)
+            self._disk.execute("PRAGMA journal_mode=WAL")
+            self._disk.execute(
+                "CREATE TABLE IF NOT EXISTS llm_cache ("
+                "key TEXT PRIMARY KEY, content TEXT NOT NULL, size INTEGER NOT NULL, "
+                "created_at REAL NOT NULL, accessed_at REAL NOT NULL)"
+            )
+            self._disk.execute("CREATE INDEX IF NOT EXISTS ix_llm_cache_accessed ON llm_cache (accessed_at)")
+            self._disk_bytes = self._disk.execute("SELECT COALESCE(SUM(size), 0) FROM llm_cache").fetchone()[0]
+
+    @staticmethod
+    def make_key(messages: List, model: str, temperature: float, agent: str, agent_version: str) -> str:
+        """Hash of the whitespace-normalized prompt plus everything that changes the answer"""
+        normalized = [
+            {"role": message.type, "content": " ".join(str(message.content).split())}
+            for message in messages
+        ]
+        payload = json.dumps({
+            "messages": normalized,
+            "model": model,
+            "temperature": temperature,
+            "agent": agent,
+            "agent_version": agent_version
+        }, sort_keys=True)
+        return hashlib.sha256(payload.encode()).hexdigest()
+
+    def _readable(self, bypass: bool) -> bool:
+        if not self.enabled:
+            return False
+        if bypass:
+            self.counters["bypassed"] += 1
+            return False
+        return True
+
+    def get(self, key: str, bypass: bool = False) -> Optional[str]:
+        if not self._readable(bypass):
+            return None
+        content = self._memory_get(key)
+        if content is None and self._disk is not None:
+            content = self._disk_get(key)
+        if content is None:
+            self.counters["misses"] += 1
+        return content
+
+    async def aget(self, key: str, bypass: bool = False) -> Optional[str]:
+        """get() for the event loop: memory hits return inline, the disk tier is read in a thread"""
+        if not self._readable(bypass):
+            return None
+        content = self._memory_get(key)
+        if content is None and self._disk is not None:
+            content = await asyncio.to_thread(self._disk_get, key)
+        if content is None:
+            self.counters["misses"] += 1
+        return content
+
+    def set(self, key: str, content: str):
+        if self._memory_set(key, content) and self._disk is not None:
+            self._disk_set(key, content)
+
+    async def aset(self, key: str, content: str):
+        """set() for the event loop: the disk write runs in a thread"""
+        if self._memory_set(key, content) and self._disk is not None:
+            await asyncio.to_thread(self._disk_set, key, content)
+
+    def _memory_get(self, key: str) -> Optional[str]:
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is None:
+                return None
+            content, expires_at = entry
+            if expires_at > now:
+                self._memory.move_to_end(key)
+                self.counters["memory_hits"] += 1
+                return content
+            del self._memory[key]
+            return None
+
+    def _memory_set(self, key: str, content: str) -> bool:
+        if not self.enabled or content is None:
+            return False
+        with self._lock:
+            self._remember(key, content, time.time() + self.ttl_seconds)
+            self.counters["writes"] += 1
+        return True
+
+    def _disk_get(self, key: str) -> Optional[str]:
+        # Separate lock: a slow disk never holds up memory lookups on the event loop
+        now = time.time()
+        with self._disk_lock:
+            row = self._disk.execute("SELECT content, created_at FROM llm_cache WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            content, created_at = row
+            if created_at + self.ttl_seconds <= now:
+                self._disk.execute("DELETE FROM llm_cache WHERE key = ?", (key,))
+                return None
+            self._disk.execute("UPDATE llm_cache SET accessed_at = ? WHERE key = ?", (now, key))
+        with self._lock:
+            self._remember(key, content, created_at + self.ttl_seconds)
+            self.counters["disk_hits"] += 1
+        return content
+
+    def _disk_set(self, key: str, content: str):
+        now = time.time()
+        size = len(content.encode())
+        with self._disk_lock:
+            self._disk.execute(
+                "INSERT OR REPLACE INTO llm_cache (key, content, size, created_at, accessed_at) VALUES (?, ?, ?, ?, ?)",
+                (key, content, size, now, now)
+            )
+            self._disk_bytes += size
+            if self._disk_bytes > self.disk_max_bytes:
+                self._evict_disk(now)
+
+    def _remember(self, key: str, content: str, expires_at: float):
+        self._memory[key] = (content, expires_at)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+            self.counters["evictions"] += 1
+
+    def _evict_disk(self, now: float):
+        """Drop expired rows, then least recently used rows until under the size cap"""
+        self._disk.execute("DELETE FROM llm_cache WHERE created_at < ?", (now - self.ttl_seconds,))
+        total = self._disk.execute("SELECT COALESCE(SUM(size), 0) FROM llm_cache").fetchone()[0]
+        if total > self.disk_max_bytes:
+            for key, size in self._disk.execute("SELECT key, size FROM llm_cache ORDER BY accessed_at").fetchall():
+                self._disk.execute("DELETE FROM llm_cache WHERE key = ?", (key,))
+                self.counters["evictions"] += 1
+                total -= size
+                if total <= self.disk_max_bytes * 0.9:  # Headroom so the next write does not evict again
+                    break
+        self._disk_bytes = total
+
+    def clear(self):
+        with self._lock:
+            self._memory.clear()
+        if self._disk is not None:
+            with self._disk_lock:
+                self._disk.execute("DELETE FROM llm_cache")
+                self._disk_bytes = 0
+
+    def stats(self) -> Dict[str, Any]:
+        hits = self.counters["memory_hits"] + self.counters["disk_hits"]
+        lookups = hits + self.counters["misses"]
+        return {
+            "enabled": self.enabled,
+            "disk_enabled": self._disk is not None,
+            "memory_entries": len(self._memory),
+            "disk_bytes": self._disk_bytes,
+            **self.counters,
+            "hit_rate": round(hits / lookups, 4) if lookups else 0.0
+        }
+
+
+llm_cache = LLMResponseCache()
@@ -0,0 +1,209 @@
+import asyncio
+import random
+import threading
+import time
+from typing import List, Optional
+import httpx
+from ..config.settings import settings
+from .metrics import metrics
+
+RETRYABLE_STATUS = (408, 409, 429, 500, 502, 503, 504)
+
+llm_attempts = metrics.counter(
+    "llm_call_attempts_total",
+    "LLM call attempts, by agent and outcome (ok, retried, error, unavailable, deadline)",
+    ("agent", "outcome")
+)
+
+
+class LLMUnavailable(RuntimeError):
+    """The LLM gave no answer within the retry budget"""
+
+
+class LLMDeadlineExceeded(LLMUnavailable):
+    """The decision's latency budget ran out before the LLM answered"""
+
+
+class Deadline:
+    """Latency budget of one decision, shared by its LLM call, retries and repair"""
+
+    def __init__(self, seconds: float = None):
+        self.seconds = settings.LLM_REQUEST_DEADLINE_SECONDS if seconds is None else seconds
+        self.expires = time.monotonic() + self.seconds
+
+    def remaining(self) -> float:
+        return self.expires - time.monotonic()
+
+
+def http_timeout(budget: float = None) -> httpx.Timeout:
+    """Per-attempt timeouts, capped by what is left of the budget"""
+    read = settings.LLM_CALL_TIMEOUT_SECONDS if budget is None else min(settings.LLM_CALL_TIMEOUT_SECONDS, budget)
+    return httpx.Timeout(
+        read,
+        connect=min(settings.LLM_HTTP_CONNECT_TIMEOUT_SECONDS, read),
+        pool=min(settings.LLM_HTTP_POOL_TIMEOUT_SECONDS, read)
+    )
+
+
+class SharedHTTPClients:
+    """Process-wide httpx clients for LLM calls.
+
+    Every ChatOpenAI instance is handed the same sync and async client, so all
+    agents share one connection pool (and its keep-alive connections) instead
+    of each opening its own. Clients are created on first use, sized and
+    timed out by the LLM_HTTP_* settings.
+    """
+
+    def __init__(self):
+        self._client: Optional[httpx.Client] = None
+        self._async_client: Optional[httpx.AsyncClient] = None
+        self._lock = threading.Lock()
+
+    def _options(self) -> dict:
+        return {
+            "limits": httpx.Limits(
+                max_connections=settings.LLM_HTTP_MAX_CONNECTIONS,
+                max_keepalive_connections=settings.LLM_HTTP_MAX_KEEPALIVE,
+                keepalive_expiry=settings.LLM_HTTP_KEEPALIVE_SECONDS
+            ),
+            "timeout": http_timeout()
+        }
+
+    @property
+    def client(self) -> httpx.Client:
+        with self._lock:
+            if self._client is None or self._client.is_closed:
+                self._client = httpx.Client(**self._options())
+            return self._client
+
+    @property
+    def async_client(self) -> httpx.AsyncClient:
+        with self._lock:
+            if self._async_client is None or self._async_client.is_closed:
+                self._async_client = httpx.AsyncClient(**self._options())
+            return self._async_client
+
+    async def aclose(self):
+        """Close both clients; called from the FastAPI lifespan on shutdown"""
+        with self._lock:
+            client, async_client = self._client, self._async_client
+            self._client = self._async_client = None
+        if client is not None:
+            client.close()
+        if async_client is not None:
+            await async_client.aclose()
+
+
+llm_http_clients = SharedHTTPClients()
+
+
+def build_chat_model(model: str, temperature: float, agent: str = None):
+    """ChatOpenAI bound to the shared HTTP clients, or the stand-in LLM_BACKEND selects.
+
+    langchain_openai is imported here rather than at module level: it is the
+    slowest import in the app and is not needed until the first LLM call.
+    """
+    if settings.LLM_BACKEND != "openai":
+        from .llm_backends import build_stand_in
+        return build_stand_in(agent)
+
+    from langchain_openai import ChatOpenAI
+
+    if not settings.OPENAI_API_KEY:
+        raise RuntimeError("OPENAI_API_KEY is not configured")
+    chat_model = ChatOpenAI(
+        model=model,
+        api_key=settings.OPENAI_API_KEY,
+        base_url=settings.OPENAI_BASE_URL,
+        temperature=temperature,
+        max_retries=0,  # Retries are invoke_within's, bounded by the decision's deadline
+        timeout=http_timeout(),
+        model_kwargs={"response_format": {"type": "json_object"}} if settings.LLM_JSON_MODE else {},
+        http_client=llm_http_clients.client,
+        http_async_client=llm_http_clients.async_client
+    )
+    if settings.LLM_RECORD_PATH:
+        from .llm_backends import with_recording
+        return with_recording(chat_model, agent)
+    return chat_model
+
+
+def _retryable(error: Exception) -> bool:
+    """Transient failures worth another attempt: timeouts, connection errors, 429 and 5xx"""
+    if isinstance(error, (asyncio.TimeoutError, httpx.TransportError)):
+        return True
+    from .llm_backends import SyntheticLLMError
+    if isinstance(error, SyntheticLLMError):
+        return True
+    try:
+        import openai
+    except ImportError:
+        return False
+    if isinstance(error, openai.APIConnectionError):  # Includes APITimeoutError
+        return True
+    return isinstance(error, openai.APIStatusError) and error.status_code in RETRYABLE_STATUS
+
+
+def _backoff(attempt: int) -> float:
+    """Full-jitter exponential backoff before retry number `attempt + 1`"""
+    return random.uniform(0, min(settings.LLM_RETRY_MAX_SECONDS, settings.LLM_RETRY_BASE_SECONDS * 2 ** attempt))
+
+
+def _next_delay(error: Exception, attempt: int, deadline: Deadline, agent: str) -> float:
+    """Back-off before the next attempt, or raise when the error or the budget rules one out"""
+    if not _retryable(error):
+        llm_attempts.inc(agent=agent, outcome="error")
+        raise error
+    if attempt >= settings.LLM_MAX_RETRIES:
+        llm_attempts.inc(agent=agent, outcome="unavailable")
+        raise LLMUnavailable(f"LLM failed {attempt + 1} times: {error!r}") from error
+    delay = _backoff(attempt)
+    if delay >= deadline.remaining():
+        llm_attempts.inc(agent=agent, outcome="deadline")
+        raise LLMDeadlineExceeded(f"No LLM answer within {deadline.seconds:g}s: {error!r}") from error
+    llm_attempts.inc(agent=agent, outcome="retried")
+    return delay
+
+
+def _check_deadline(deadline: Deadline, agent: str) -> float:
+    remaining = deadline.remaining()
+    if remaining <= 0:
+        llm_attempts.inc(agent=agent, outcome="deadline")
+        raise LLMDeadlineExceeded(f"No LLM answer within {deadline.seconds:g}s")
+    return remaining
+
+
+def invoke_within(llm, messages: List, deadline: Deadline = None, agent: str = None):
+    """llm.invoke with per-attempt timeouts and jittered retries inside the decision's deadline.
+
+    Raises LLMUnavailable (LLMDeadlineExceeded once the budget is spent) for
+    transient failures; other errors propagate on the first attempt.
+    """
+    deadline = deadline or Deadline()
+    attempt = 0
+    while True:
+        remaining = _check_deadline(deadline, agent)
+        try:
+            response = llm.invoke(messages, timeout=http_timeout(remaining))
+        except Exception as e:
+            time.sleep(_next_delay(e, attempt, deadline, agent))
+            attempt += 1
+            continue
+        llm_attempts.inc(agent=agent, outcome="ok")
+        return response
+
+
+async def ainvoke_within(llm, messages: List, deadline: Deadline = None, agent: str = None):
+    """Async variant of invoke_within; the attempt is also cancelled when its time is up"""
+    deadline = deadline or Deadline()
+    attempt = 0
+    while True:
+        remaining = _check_deadline(deadline, agent)
+        try:
+            response = await asyncio.wait_for(llm.ainvoke(messages, timeout=http_timeout(remaining)), remaining)
+        except Exception as e:
+            await asyncio.sleep(_next_delay(e, attempt, deadline, agent))
+            attempt += 1
+            continue
+        llm_attempts.inc(agent=agent, outcome="ok")
+        return response
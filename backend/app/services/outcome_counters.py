@@ -0,0 +1,147 @@
+from typing import Dict, Any, Optional, Tuple
+from sqlalchemy import select, update, delete, func
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+from ..models.schemas import AgentOutcomeCounter, CreditApplication, FraudCase
+
+CELLS = ("true_positives", "false_positives", "false_negatives", "true_negatives")
+FRAUD_THRESHOLD = 60  # Fraud cases above this probability count as predicted fraud
+RESOLVED_STATUSES = ("confirmed", "false_positive")
+
+CounterKey = Tuple[str, str]  # (agent_type, model_version)
+
+
+def credit_cell(decision: str, actual_outcome: Optional[str]) -> Optional[str]:
+    """Confusion cell of a credit decision; approval is the positive class"""
+    if decision == "approved":
+        return {"paid_on_time": "true_positives", "default": "false_positives"}.get(actual_outcome)
+    if decision == "rejected":
+        return {"paid_on_time": "false_negatives", "default": "true_negatives"}.get(actual_outcome)
+    return None  # manual_review or an unknown outcome: counted as a sample only
+
+
+def fraud_cell(fraud_probability: float, investigation_status: Optional[str]) -> Optional[str]:
+    """Confusion cell of a fraud case; confirmed fraud is the positive class"""
+    if investigation_status not in RESOLVED_STATUSES:
+        return None
+    flagged = fraud_probability > FRAUD_THRESHOLD
+    confirmed = investigation_status == "confirmed"
+    if flagged:
+        return "true_positives" if confirmed else "false_positives"
+    return "false_negatives" if confirmed else "true_negatives"
+
+
+def _bump(db: Session, agent_type: str, model_version: str, cell: Optional[str], delta: int):
+    values = {"samples": AgentOutcomeCounter.samples + delta}
+    if cell:
+        values[cell] = getattr(AgentOutcomeCounter, cell) + delta
+    statement = update(AgentOutcomeCounter).where(
+        AgentOutcomeCounter.agent_type == agent_type,
+        AgentOutcomeCounter.model_version == model_version
+    ).values(**values)
+
+    if db.execute(statement).rowcount:
+        return
+    try:
+        with db.begin_nested():
+            db.add(AgentOutcomeCounter(
+                agent_type=agent_type,
+                model_version=model_version,
+                samples=delta,
+                **{name: (delta if name == cell else 0) for name in CELLS}
+            ))
+    except IntegrityError:
+        db.execute(statement)  # Another request created the row first
+
+
+def record_label(
+    db: Session,
+    agent_type: str,
+    model_version: Optional[str],
+    cell: Optional[str],
+    previous_cell: Optional[str] = None,
+    relabel: bool = False
+):
+    """Count one labeled decision in the caller's transaction.
+
+    When feedback replaces an earlier label (`relabel`), the earlier cell is
+    subtracted first so each decision is counted once.
+    """
+    model_version = model_version or "unknown"
+    if relabel:
+        _bump(db, agent_type, model_version, previous_cell, -1)
+    _bump(db, agent_type, model_version, cell, 1)
+
+
+def read_counters(db: Session) -> Dict[CounterKey, Dict[str, int]]:
+    """Current counters for every agent and version"""
+    rows = db.execute(select(AgentOutcomeCounter)).scalars().all()
+    return {
+        (row.agent_type, row.model_version): {"samples": row.samples, **{name: getattr(row, name) for name in CELLS}}
+        for row in rows
+    }
+
+
+def totals(db: Session, agent_type: str, model_version: str = None) -> Dict[str, int]:
+    """Counters summed over versions (or for one version); reads one row per version"""
+    query = select(
+        func.coalesce(func.sum(AgentOutcomeCounter.samples), 0),
+        *(func.coalesce(func.sum(getattr(AgentOutcomeCounter, name)), 0) for name in CELLS)
+    ).where(AgentOutcomeCounter.agent_type == agent_type)
+    if model_version:
+        query = query.where(AgentOutcomeCounter.model_version == model_version)
+    row = db.execute(query).one()
+    return dict(zip(("samples",) + CELLS, (int(value) for value in row)))
+
+
+def recompute(db: Session) -> Dict[CounterKey, Dict[str, int]]:
+    """Rebuild the counters from the labeled rows themselves (full scan, grouped in SQL)"""
+    counters: Dict[CounterKey, Dict[str, int]] = {}
+
+    def add(key: CounterKey, cell: Optional[str], count: int):
+        entry = counters.setdefault(key, {"samples": 0, **{name: 0 for name in CELLS}})
+        entry["samples"] += count
+        if cell:
+            entry[cell] += count
+
+    credit_rows = db.execute(
+        select(CreditApplication.agent_version, CreditApplication.decision, CreditApplication.feedback_outcome, func.count())
+        .where(CreditApplication.feedback_outcome.isnot(None))
+        .group_by(CreditApplication.agent_version, CreditApplication.decision, CreditApplication.feedback_outcome)
+    ).all()
+    for version, decision, outcome, count in credit_rows:
+        add(("credit", version or "unknown"), credit_cell(decision.value if decision else None, outcome), count)
+
+    flagged = FraudCase.fraud_probability > FRAUD_THRESHOLD
+    fraud_rows = db.execute(
+        select(FraudCase.agent_version, flagged, FraudCase.investigation_status, func.count())
+        .where(FraudCase.investigation_status.in_(RESOLVED_STATUSES))
+        .group_by(FraudCase.agent_version, flagged, FraudCase.investigation_status)
+    ).all()
+    for version, is_flagged, status, count in fraud_rows:
+        # Any probability on the right side of the threshold yields the same cell
+        add(("fraud", version or "unknown"), fraud_cell(FRAUD_THRESHOLD + 1 if is_flagged else 0, status), count)
+
+    return counters
+
+
+def verify(db: Session) -> Dict[CounterKey, Dict[str, Any]]:
+    """Differences between the stored counters and a from-scratch recount; empty when they agree"""
+    stored, expected = read_counters(db), recompute(db)
+    mismatches = {}
+    for key in set(stored) | set(expected):
+        have = stored.get(key, {})
+        want = expected.get(key, {})
+        if any(have.get(name, 0) != want.get(name, 0) for name in ("samples",) + CELLS):
+            mismatches[key] = {"stored": have, "expected": want}
+    return mismatches
+
+
+def rebuild(db: Session) -> Dict[CounterKey, Dict[str, int]]:
+    """Replace the stored counters with a from-scratch recount (caller commits)"""
+    counters = recompute(db)
+    db.execute(delete(AgentOutcomeCounter))
+    for (agent_type, model_version), values in counters.items():
+        db.add(AgentOutcomeCounter(agent_type=agent_type, model_version=model_version, **values))
+    db.flush()
+    return counters
@@ -0,0 +1,48 @@
+import base64
+import json
+from datetime import datetime
+from typing import Any, List, Optional, Tuple
+from sqlalchemy import and_, or_
+
+
+def encode_cursor(timestamp: datetime, key: str) -> str:
+    """Opaque cursor for the position just after (timestamp, key)"""
+    payload = json.dumps([timestamp.isoformat(), key], separators=(",", ":"))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, str]:
+    """Inverse of encode_cursor; raises ValueError for a malformed cursor"""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        timestamp, key = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        return datetime.fromisoformat(timestamp), str(key)
+    except Exception as e:
+        raise ValueError("Invalid cursor") from e
+
+
+def keyset_page(query, timestamp_column, key_column, cursor: Optional[str], limit: int):
+    """Newest-first page of `query` that starts after `cursor`.
+
+    Rows are ordered by (timestamp, primary key) descending and the cursor is
+    applied as a range predicate on that pair, so with a matching index every
+    page is an index range scan of `limit` rows, however deep it is. One extra
+    row is fetched to tell whether another page exists.
+    """
+    if cursor:
+        after_timestamp, after_key = decode_cursor(cursor)
+        # Spelled with a leading `timestamp <= cursor` bound rather than as a plain OR
+        # so planners turn it into one index range instead of a merged OR plus a sort
+        query = query.where(and_(
+            timestamp_column <= after_timestamp,
+            or_(timestamp_column < after_timestamp, key_column < after_key)
+        ))
+    return query.order_by(timestamp_column.desc(), key_column.desc()).limit(limit + 1)
+
+
+def split_page(rows: List[Any], limit: int, timestamp_of, key_of) -> Tuple[List[Any], Optional[str]]:
+    """Trim the look-ahead row and build the cursor for the next page (None on the last page)"""
+    if len(rows) <= limit:
+        return rows, None
+    rows = rows[:limit]
+    return rows, encode_cursor(timestamp_of(rows[-1]), key_of(rows[-1]))
@@ -0,0 +1,230 @@
+import asyncio
+import logging
+import random
+import time
+from typing import Any, Dict, List, Optional
+from sqlalchemy import insert
+from ..config.database import AsyncSessionLocal
+from ..config.settings import settings
+from ..models.schemas import ShadowDecision
+from .feature_store import CustomerProfile
+from .metrics import metrics, StageTimer
+
+logger = logging.getLogger(__name__)
+
+# Per agent: (subject id key, decision key, score key) of a decision
+DECISION_FIELDS = {
+    "fraud": ("transaction_id", "action", "fraud_probability"),
+    "credit": ("application_id", "decision", "risk_score")
+}
+# Deterministic decisions every configuration shares; re-scoring them only repeats the answer
+UNSHADOWED = ("fast_path", "stored", "degraded")
+
+shadow_decisions = metrics.counter(
+    "shadow_decisions_total",
+    "Challenger decisions scored in shadow, by challenger and outcome",
+    ("challenger", "outcome")
+)
+shadow_seconds = metrics.histogram(
+    "shadow_decision_seconds",
+    "Time a challenger took to score one decision",
+    ("challenger",)
+)
+
+
+class Challenger:
+    """A candidate agent configuration, built from one SHADOW_CHALLENGERS entry.
+
+    Unset fields keep the production value. Its agent has its own fast-path
+    and fraud-model scorers and LLM circuit breaker so shadow traffic never
+    moves production stats or trips the production breaker.
+    """
+
+    def __init__(self, name: str, agent: str, model: str = None, temperature: float = None,
+                 prompt_variant: str = None, fraud_model_path: str = None, fraud_model_mode: str = None,
+                 sample_rate: float = None):
+        if agent not in DECISION_FIELDS:
+            raise ValueError(f"Challenger {name}: unknown agent {agent}")
+        self.name = name
+        self.agent_type = agent
+        self.model = model
+        self.temperature = temperature
+        self.prompt_variant = prompt_variant
+        self.fraud_model_path = fraud_model_path
+        self.fraud_model_mode = fraud_model_mode
+        self.sample_rate = settings.SHADOW_SAMPLE_RATE if sample_rate is None else sample_rate
+        self._agent = None
+
+    @classmethod
+    def from_spec(cls, spec: Dict[str, Any]) -> "Challenger":
+        return cls(**spec)
+
+    @property
+    def agent(self):
+        if self._agent is None:
+            self._agent = self._build_agent()
+        return self._agent
+
+    def _build_agent(self):
+        from ..agents.credit_agent import CreditAssessmentAgent
+        from ..agents.fraud_agent import FraudDetectionAgent
+        from .circuit_breaker import CircuitBreaker
+        from .fast_path import FastPathScorer
+        from .fraud_model import FraudModelScorer
+
+        if self.agent_type == "fraud":
+            agent = FraudDetectionAgent()
+            agent.fast_path = FastPathScorer()
+            # A candidate artifact may decide in shadow without being promoted
+            agent.ml_model = FraudModelScorer(
+                mode=self.fraud_model_mode, path=self.fraud_model_path, require_promoted=self.fraud_model_path is None
+            )
+        else:
+            agent = CreditAssessmentAgent()
+        agent.breaker = CircuitBreaker(f"shadow-{self.name}")
+        if self.model is not None:
+            agent.model = self.model
+        if self.temperature is not None:
+            agent.temperature = self.temperature
+        if self.prompt_variant is not None:
+            agent.prompt_variant = self.prompt_variant
+        return agent
+
+    async def score(self, data: Dict[str, Any], profile: Optional[CustomerProfile]) -> Dict[str, Any]:
+        timer = StageTimer(f"shadow_{self.agent_type}")
+        if self.agent_type == "fraud":
+            return await self.agent.acheck_transaction(
+                data,
+                customer_history=profile.as_history() if profile else None,
+                customer_profile=profile,
+                timer=timer
+            )
+        return await self.agent.aassess_application(data, timer=timer)
+
+
+def comparison_row(challenger: Challenger, champion: Dict[str, Any], decision: Dict[str, Any], seconds: float) -> Dict[str, Any]:
+    """ShadowDecision column values for a challenger decision next to the production one"""
+    subject_key, decision_key, score_key = DECISION_FIELDS[challenger.agent_type]
+    return {
+        "challenger": challenger.name,
+        "agent_type": challenger.agent_type,
+        "subject_id": champion.get(subject_key),
+        "champion_version": champion.get("agent_version"),
+        "champion_decision": champion.get(decision_key),
+        "champion_score": champion.get(score_key),
+        "challenger_decision": decision.get(decision_key),
+        "challenger_score": decision.get(score_key),
+        "agreed": champion.get(decision_key) == decision.get(decision_key),
+        "latency_ms": round(seconds * 1000, 1),
+        "challenger_json": {key: value for key, value in decision.items() if key != "timings_ms"}
+    }
+
+
+class ShadowScorer:
+    """Challengers re-scoring a sample of production decisions off the request path.
+
+    `submit` only samples and schedules, so the champion's decision goes back
+    to the caller without waiting for any challenger. At most
+    `max_concurrency` challenger calls run at once; with `max_pending`
+    scheduled, further samples are dropped instead of queued. Decisions are
+    inserted into `shadow_decisions` in batches, best effort: a failed insert
+    is logged and counted, never retried.
+    """
+
+    def __init__(self, challengers: List = None, max_concurrency: int = None, max_pending: int = None):
+        specs = settings.SHADOW_CHALLENGERS if challengers is None else challengers
+        self.challengers = [c if isinstance(c, Challenger) else Challenger.from_spec(c) for c in specs]
+        self.max_concurrency = max_concurrency or settings.SHADOW_MAX_CONCURRENCY
+        self.max_pending = max_pending or settings.SHADOW_MAX_PENDING
+        self._semaphore: Optional[asyncio.Semaphore] = None  # Created inside the serving event loop
+        self._tasks = set()
+        self._rows: List[Dict[str, Any]] = []
+        self._flushing = False
+        self._random = random.Random()
+        self.counters = {"sampled": 0, "dropped": 0, "agreed": 0, "disagreed": 0, "errors": 0, "stored": 0, "store_errors": 0}
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.challengers)
+
+    def submit(self, agent_type: str, data: Dict[str, Any], champion: Dict[str, Any], profile: Optional[CustomerProfile] = None):
+        """Schedule the challengers of `agent_type` that sample this decision; returns immediately"""
+        if champion.get("decided_by") in UNSHADOWED or champion.get("degraded"):
+            return
+        snapshot = None
+        for challenger in self.challengers:
+            if challenger.agent_type != agent_type or self._random.random() >= challenger.sample_rate:
+                continue
+            if len(self._tasks) >= self.max_pending:
+                self.counters["dropped"] += 1
+                shadow_decisions.inc(challenger=challenger.name, outcome="dropped")
+                continue
+            if snapshot is None and profile is not None:
+                snapshot = profile.snapshot()  # The live profile moves on once this transaction is observed
+            self.counters["sampled"] += 1
+            task = asyncio.create_task(self._run(challenger, data, champion, snapshot))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _run(self, challenger: Challenger, data: Dict[str, Any], champion: Dict[str, Any], profile: Optional[CustomerProfile]):
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        async with self._semaphore:
+            started = time.perf_counter()
+            try:
+                decision = await challenger.score(data, profile)
+            except Exception as e:
+                self.counters["errors"] += 1
+                shadow_decisions.inc(challenger=challenger.name, outcome="error")
+                logger.warning("Challenger %s failed: %s", challenger.name, e)
+                return
+            seconds = time.perf_counter() - started
+
+        shadow_seconds.observe(seconds, challenger=challenger.name)
+        row = comparison_row(challenger, champion, decision, seconds)
+        outcome = "agreed" if row["agreed"] else "disagreed"
+        self.counters[outcome] += 1
+        shadow_decisions.inc(challenger=challenger.name, outcome=outcome)
+        self._rows.append(row)
+        await self.flush()
+
+    async def flush(self):
+        """Insert buffered challenger decisions; rows arriving meanwhile join the running flush"""
+        if self._flushing:
+            return
+        self._flushing = True
+        try:
+            while self._rows:
+                rows, self._rows = self._rows, []
+                try:
+                    async with AsyncSessionLocal() as db:
+                        await db.execute(insert(ShadowDecision), rows)
+                        await db.commit()
+                    self.counters["stored"] += len(rows)
+                except Exception as e:
+                    self.counters["store_errors"] += len(rows)
+                    logger.warning("Storing %d shadow decisions failed: %s", len(rows), e)
+        finally:
+            self._flushing = False
+
+    async def stop(self, timeout: float = 10.0):
+        """Give scheduled challengers `timeout` seconds to finish, cancel the rest and flush"""
+        if self._tasks:
+            _, pending = await asyncio.wait(set(self._tasks), timeout=timeout)
+            for task in pending:
+                task.cancel()
+        await self.flush()
+
+    def stats(self) -> Dict[str, Any]:
+        compared = self.counters["agreed"] + self.counters["disagreed"]
+        return {
+            "challengers": [
+                {"name": c.name, "agent": c.agent_type, "sample_rate": c.sample_rate} for c in self.challengers
+            ],
+            "pending": len(self._tasks),
+            **self.counters,
+            "agreement_rate": round(self.counters["agreed"] / compared, 4) if compared else 0.0
+        }
+
+
+shadow_scorer = ShadowScorer()
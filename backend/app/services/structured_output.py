@@ -0,0 +1,147 @@
+import json
+import threading
+from typing import Any, Dict, List, Optional, Tuple, Type
+from langchain_core.messages import HumanMessage, SystemMessage
+from pydantic import BaseModel, ValidationError
+from ..config.settings import settings
+from .llm_clients import Deadline, ainvoke_within, invoke_within
+from .metrics import metrics
+from .token_usage import token_ledger
+
+PARSE_OUTCOMES = metrics.counter(
+    "llm_output_parse_total",
+    "LLM answers by parsing outcome: ok, extracted (JSON found inside prose or fences), repaired, failed",
+    ("agent", "outcome")
+)
+
+REPAIR_SYSTEM_PROMPT = "You fix malformed model output. Reply with one JSON object only: no prose, no code fences."
+
+_decoder = json.JSONDecoder()
+_counts: Dict[str, Dict[str, int]] = {}  # Per agent, shared by every instance of it
+_counts_lock = threading.Lock()
+
+
+def extract_json(content: Any) -> Optional[Dict[str, Any]]:
+    """The first JSON object in an LLM answer, tolerating code fences and surrounding prose"""
+    if not isinstance(content, str):
+        return None
+    try:
+        value = json.loads(content)
+        return value if isinstance(value, dict) else None
+    except ValueError:
+        pass
+    # Try every opening brace; raw_decode stops at the end of a complete object
+    start = content.find("{")
+    while start != -1:
+        try:
+            value, _ = _decoder.raw_decode(content, start)
+            if isinstance(value, dict):
+                return value
+        except ValueError:
+            pass
+        start = content.find("{", start + 1)
+    return None
+
+
+class StructuredOutput:
+    """Parses an agent's JSON answer against its schema, with one cheap repair round.
+
+    `parse()` accepts strict JSON first, then a JSON object embedded in
+    prose or code fences, and validates it against the pydantic schema.
+    When that fails, `repair()` makes one short LLM call carrying only the
+    bad answer, the schema and the error (not the original context); if that
+    fails too the agent falls back to its default decision. Every outcome is
+    counted per agent.
+    """
+
+    def __init__(self, agent: str, schema: Type[BaseModel]):
+        self.agent = agent
+        self.schema = schema
+        self.schema_json = json.dumps(schema.model_json_schema()["properties"], separators=(",", ":"))
+        with _counts_lock:
+            self.counts = _counts.setdefault(agent, {"ok": 0, "extracted": 0, "repaired": 0, "failed": 0})
+
+    def _count(self, outcome: str):
+        with _counts_lock:
+            self.counts[outcome] += 1
+        PARSE_OUTCOMES.inc(agent=self.agent, outcome=outcome)
+
+    def validate(self, content: Any) -> Tuple[Optional[Dict[str, Any]], Optional[str]]:
+        """(decision, None) for a usable answer, else (None, reason); counts nothing"""
+        value = extract_json(content)
+        if value is None:
+            return None, "no JSON object found"
+        try:
+            return self.schema.model_validate(value).model_dump(), None
+        except ValidationError as e:
+            return None, "; ".join(f"{'.'.join(map(str, error['loc']))}: {error['msg']}" for error in e.errors())
+
+    def parse(self, content: Any) -> Tuple[Optional[Dict[str, Any]], Optional[str]]:
+        result, error = self.validate(content)
+        if result is not None:
+            self._count("ok" if _is_plain_json(content) else "extracted")
+        return result, error
+
+    def repair(self, llm, content: Any, error: str, variant: str = "full", deadline: Deadline = None) -> Optional[Dict[str, Any]]:
+        """One short LLM call to fix an unusable answer; None when that fails too"""
+        if not settings.LLM_OUTPUT_REPAIR:
+            self._count("failed")
+            return None
+        messages = self.repair_messages(content, error)
+        try:
+            response = invoke_within(llm, messages, deadline, self.agent)
+        except Exception:
+            self._count("failed")
+            return None
+        token_ledger.record(self.agent, variant, "repair", response, messages)
+        return self._parse_repair(response.content)
+
+    async def arepair(self, llm, content: Any, error: str, variant: str = "full", deadline: Deadline = None) -> Optional[Dict[str, Any]]:
+        """Async variant of repair"""
+        if not settings.LLM_OUTPUT_REPAIR:
+            self._count("failed")
+            return None
+        messages = self.repair_messages(content, error)
+        try:
+            response = await ainvoke_within(llm, messages, deadline, self.agent)
+        except Exception:
+            self._count("failed")
+            return None
+        token_ledger.record(self.agent, variant, "repair", response, messages)
+        return self._parse_repair(response.content)
+
+    def repair_messages(self, content: Any, error: str) -> List:
+        return [
+            SystemMessage(content=REPAIR_SYSTEM_PROMPT),
+            HumanMessage(content=(
+                f"Required JSON schema (properties): {self.schema_json}\n"
+                f"Problem: {error}\n"
+                f"Output to fix:\n{str(content)[:4000]}"
+            ))
+        ]
+
+    def _parse_repair(self, content: Any) -> Optional[Dict[str, Any]]:
+        result, _ = self.validate(content)
+        self._count("repaired" if result is not None else "failed")
+        return result
+
+
+def parse_stats() -> Dict[str, Any]:
+    """Outcome counts and parse-failure rate of every agent, flattened as <agent>_<field>"""
+    with _counts_lock:
+        snapshot = {agent: dict(counts) for agent, counts in _counts.items()}
+    stats = {}
+    for agent, counts in snapshot.items():
+        total = sum(counts.values())
+        stats.update({f"{agent}_{outcome}": count for outcome, count in counts.items()})
+        stats[f"{agent}_total"] = total
+        stats[f"{agent}_failure_rate"] = round(counts["failed"] / total, 4) if total else 0.0
+    return stats
+
+
+def _is_plain_json(content: Any) -> bool:
+    try:
+        json.loads(content)
+        return True
+    except (TypeError, ValueError):
+        return False
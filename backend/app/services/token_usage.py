@@ -0,0 +1,114 @@
+import threading
+import time
+from collections import deque
+from typing import Any, Deque, Dict, List, Tuple
+from .metrics import metrics
+
+CHARS_PER_TOKEN = 4  # Rough English average; only used when the API reports no usage
+
+LLM_TOKENS = metrics.counter(
+    "llm_tokens_total",
+    "Prompt and completion tokens sent to / received from the LLM",
+    ("agent", "variant", "call", "direction")
+)
+LLM_CALLS = metrics.counter(
+    "llm_calls_total",
+    "LLM calls by agent, prompt variant and call kind (score, repair) or cache hit",
+    ("agent", "variant", "call")
+)
+
+
+def estimate_tokens(content: Any) -> int:
+    """Cheap token estimate of a string or a list of messages"""
+    if isinstance(content, (list, tuple)):
+        return sum(estimate_tokens(getattr(message, "content", message)) for message in content)
+    return (len(str(content or "")) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
+
+def usage_of(response, messages) -> Tuple[int, int, bool]:
+    """(prompt_tokens, completion_tokens, estimated) of an LLM response"""
+    usage = getattr(response, "usage_metadata", None)
+    if usage and usage.get("input_tokens") is not None:
+        return usage["input_tokens"], usage.get("output_tokens", 0), False
+    token_usage = (getattr(response, "response_metadata", None) or {}).get("token_usage") or {}
+    if token_usage.get("prompt_tokens") is not None:
+        return token_usage["prompt_tokens"], token_usage.get("completion_tokens", 0), False
+    return estimate_tokens(messages), estimate_tokens(getattr(response, "content", "")), True
+
+
+class TokenLedger:
+    """Token usage per LLM call and running totals per agent and prompt variant.
+
+    Uses the usage the API reports with each response; calls without it
+    (test doubles, some proxies) are estimated and flagged. Cache hits are
+    counted as calls that cost nothing.
+    """
+
+    def __init__(self, recent: int = 200):
+        self._lock = threading.Lock()
+        self._totals: Dict[Tuple[str, str], Dict[str, int]] = {}
+        self._recent: Deque[Dict[str, Any]] = deque(maxlen=recent)
+
+    def record(self, agent: str, variant: str, call: str, response, messages) -> Dict[str, Any]:
+        """Account one LLM response; returns the per-call record"""
+        prompt_tokens, completion_tokens, estimated = usage_of(response, messages)
+        entry = {
+            "agent": agent,
+            "variant": variant,
+            "call": call,
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "estimated": estimated,
+            "at": time.time()
+        }
+        with self._lock:
+            totals = self._entry(agent, variant)
+            totals["calls"] += 1
+            totals["prompt_tokens"] += prompt_tokens
+            totals["completion_tokens"] += completion_tokens
+            totals["estimated_calls"] += estimated
+            totals["repair_calls"] += call == "repair"
+            self._recent.append(entry)
+        LLM_CALLS.inc(agent=agent, variant=variant, call=call)
+        LLM_TOKENS.inc(prompt_tokens, agent=agent, variant=variant, call=call, direction="prompt")
+        LLM_TOKENS.inc(completion_tokens, agent=agent, variant=variant, call=call, direction="completion")
+        return entry
+
+    def record_cache_hit(self, agent: str, variant: str):
+        with self._lock:
+            self._entry(agent, variant)["cache_hits"] += 1
+        LLM_CALLS.inc(agent=agent, variant=variant, call="cache_hit")
+
+    def record_budget_trim(self, agent: str, variant: str):
+        """A prompt that was cut down to fit the agent's token budget"""
+        with self._lock:
+            self._entry(agent, variant)["budget_trims"] += 1
+
+    def _entry(self, agent: str, variant: str) -> Dict[str, int]:
+        return self._totals.setdefault((agent, variant), {
+            "calls": 0,
+            "cache_hits": 0,
+            "repair_calls": 0,
+            "prompt_tokens": 0,
+            "completion_tokens": 0,
+            "estimated_calls": 0,
+            "budget_trims": 0
+        })
+
+    def recent(self, limit: int = 20) -> List[Dict[str, Any]]:
+        with self._lock:
+            return list(self._recent)[-limit:]
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            totals = {key: dict(values) for key, values in self._totals.items()}
+        agents: Dict[str, Dict[str, Any]] = {}
+        for (agent, variant), values in sorted(totals.items()):
+            calls = values["calls"]
+            values["avg_prompt_tokens"] = round(values["prompt_tokens"] / calls, 1) if calls else 0.0
+            values["avg_completion_tokens"] = round(values["completion_tokens"] / calls, 1) if calls else 0.0
+            agents.setdefault(agent, {})[variant] = values
+        return {"agents": agents, "recent_calls": self.recent()}
+
+
+token_ledger = TokenLedger()
@@ -0,0 +1,427 @@
+import asyncio
+import fcntl
+import glob
+import json
+import logging
+import os
+import time
+import uuid
+from collections import deque
+from contextlib import suppress
+from datetime import datetime
+from decimal import Decimal
+from enum import Enum
+from typing import Any, Deque, Dict, List, Optional, Tuple
+from sqlalchemy import insert, select, DateTime, Enum as SqlEnum, Numeric
+from sqlalchemy.exc import IntegrityError
+from ..config.database import AsyncSessionLocal
+from ..config.settings import settings
+from ..models.schemas import Transaction, FraudCase, CreditApplication
+from .metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+# Insert order of one flush; fraud cases reference their transaction
+TABLES = {table.name: table for table in (Transaction.__table__, FraudCase.__table__, CreditApplication.__table__)}
+
+FLUSH_SECONDS = metrics.histogram(
+    "write_behind_flush_duration_seconds",
+    "Time to insert and commit one write-behind batch"
+)
+FLUSHED_ROWS = metrics.counter(
+    "write_behind_rows_total",
+    "Rows handled by the write-behind flusher by outcome",
+    ("table", "outcome")
+)
+
+Rows = Dict[str, List[Dict[str, Any]]]  # table name -> column values
+
+
+def _encode(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return str(value)
+    if isinstance(value, Enum):
+        return value.value
+    raise TypeError(f"Cannot journal {type(value).__name__}")
+
+
+def _decode(rows: Rows) -> Rows:
+    """Restore the Python types _encode flattened, using the column types"""
+    decoded = {}
+    for name, table_rows in rows.items():
+        columns = TABLES[name].c
+        decoded[name] = []
+        for row in table_rows:
+            row = dict(row)
+            for key, value in row.items():
+                column_type = columns[key].type
+                if value is None:
+                    continue
+                if isinstance(column_type, SqlEnum) and column_type.enum_class:
+                    row[key] = column_type.enum_class(value)
+                elif isinstance(column_type, DateTime):
+                    row[key] = datetime.fromisoformat(value)
+                elif isinstance(column_type, Numeric) and isinstance(value, str):
+                    row[key] = Decimal(value)
+            decoded[name].append(row)
+    return decoded
+
+
+class _Segment:
+    """One spill file, flock-ed for as long as it holds uncommitted decisions"""
+
+    def __init__(self, path: str, handle):
+        self.path = path
+        self.handle = handle
+        self.last_seq = 0
+        self.units = 0
+
+    def close(self, delete: bool):
+        self.handle.close()
+        if delete:
+            with suppress(FileNotFoundError):
+                os.remove(self.path)
+
+
+class _Journal:
+    """Append-only spill files holding every queued decision until it is committed.
+
+    Each worker writes its own files and holds an exclusive lock on them, so a
+    worker starting up can claim (lock and replay) the files of a worker that
+    died without touching those of live ones. A file is deleted once every
+    decision in it is committed.
+    """
+
+    def __init__(self, directory: str, segment_units: int, fsync: bool):
+        self.directory = directory
+        self.segment_units = segment_units
+        self.fsync = fsync
+        self.segments: List[_Segment] = []
+        self.current: Optional[_Segment] = None
+        os.makedirs(directory, exist_ok=True)
+
+    def _open_segment(self) -> _Segment:
+        # Locked under a temporary name first so no other worker can claim it in between
+        temporary = os.path.join(self.directory, f".{uuid.uuid4().hex}.tmp")
+        handle = open(temporary, "a")
+        fcntl.flock(handle, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        path = os.path.join(self.directory, f"segment-{time.time_ns()}-{os.getpid()}.jsonl")
+        os.rename(temporary, path)
+        segment = _Segment(path, handle)
+        self.segments.append(segment)
+        return segment
+
+    def claim_orphans(self) -> List[Tuple[_Segment, List[Rows]]]:
+        """Lock and read the spill files whose worker is gone, oldest first"""
+        claimed = []
+        for path in sorted(glob.glob(os.path.join(self.directory, "segment-*.jsonl")) + glob.glob(os.path.join(self.directory, ".*.tmp"))):
+            handle = open(path, "a+")
+            try:
+                fcntl.flock(handle, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                handle.close()  # Owned by a live worker
+                continue
+            if path.endswith(".tmp"):
+                _Segment(path, handle).close(delete=True)  # Died before its first write
+                continue
+            handle.seek(0)
+            entries = []
+            for line in handle:
+                try:
+                    entries.append(_decode(json.loads(line)["rows"]))
+                except (ValueError, KeyError):
+                    logger.warning("Skipping a torn write-behind journal line in %s", path)
+            segment = _Segment(path, handle)
+            self.segments.append(segment)
+            claimed.append((segment, entries))
+        return claimed
+
+    def append(self, seq: int, rows: Rows):
+        if self.current is None or self.current.units >= self.segment_units:
+            self.current = self._open_segment()
+        self.current.handle.write(json.dumps({"seq": seq, "rows": rows}, default=_encode) + "\n")
+        self.current.handle.flush()
+        if self.fsync:
+            os.fsync(self.current.handle.fileno())
+        self.current.last_seq = seq
+        self.current.units += 1
+
+    def committed(self, seq: int):
+        """Delete the files whose decisions are all committed (everything up to seq)"""
+        for segment in [segment for segment in self.segments if segment.last_seq <= seq]:
+            segment.close(delete=True)
+            self.segments.remove(segment)
+            if segment is self.current:
+                self.current = None
+
+    def reject(self, rows: Rows, error: str):
+        """Keep decisions the database refused (e.g. unknown customer) for an operator to inspect"""
+        with open(os.path.join(self.directory, "rejected.jsonl"), "a") as f:
+            f.write(json.dumps({"rejected_at": datetime.utcnow(), "error": error, "rows": rows}, default=_encode) + "\n")
+
+    def close(self):
+        for segment in self.segments:
+            segment.close(delete=False)  # Still holding uncommitted decisions; replayed on next start
+        self.segments = []
+        self.current = None
+
+
+class _Unit:
+    """The rows of one decision; always written in the same commit"""
+
+    __slots__ = ("seq", "rows", "size", "enqueued_at")
+
+    def __init__(self, seq: int, rows: Rows):
+        self.seq = seq
+        self.rows = rows
+        self.size = sum(len(table_rows) for table_rows in rows.values())
+        self.enqueued_at = time.monotonic()
+
+
+class WriteBehindQueue:
+    """Optional write-behind persistence for fraud and credit decisions.
+
+    The routers hand the rows of a decision to `offer()` and respond as soon
+    as they are queued and journaled; a background task drains the queue in
+    batches, one multi-row INSERT per table and one commit per batch. When the
+    queue is full `offer()` waits up to WRITE_BEHIND_ENQUEUE_TIMEOUT_SECONDS
+    for room and then returns False, and the caller writes synchronously.
+
+    Every queued decision is appended to a local spill file first, so
+    decisions not yet committed when the process dies are replayed on the
+    next start. Rows that turn out to be stored already (a replayed batch
+    that had committed, or a transaction_id another worker stored first) are
+    skipped; rows the database rejects go to `rejected.jsonl`.
+    """
+
+    def __init__(self):
+        self.enabled = settings.WRITE_BEHIND_ENABLED
+        self._units: Deque[_Unit] = deque()
+        self._pending_rows = 0
+        self._pending_transactions: Dict[str, _Unit] = {}
+        self._seq = 0
+        self._journal: Optional[_Journal] = None
+        self._task: Optional[asyncio.Task] = None
+        self._wakeup: Optional[asyncio.Event] = None
+        self._space: Optional[asyncio.Event] = None
+        self.last_flush: Optional[Dict[str, Any]] = None
+        self.counters = {
+            "enqueued": 0,
+            "replayed": 0,
+            "flushes": 0,
+            "flush_errors": 0,
+            "written_rows": 0,
+            "duplicate_rows": 0,
+            "rejected_decisions": 0,
+            "full_fallbacks": 0
+        }
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    async def start(self):
+        """Replay decisions left by a crashed worker and start the flusher (no-op when disabled)"""
+        if not self.enabled or self.running:
+            return
+        self._wakeup = asyncio.Event()
+        self._space = asyncio.Event()
+        self._journal = _Journal(
+            settings.WRITE_BEHIND_SPILL_DIR,
+            settings.WRITE_BEHIND_SEGMENT_DECISIONS,
+            settings.WRITE_BEHIND_FSYNC
+        )
+        for segment, entries in self._journal.claim_orphans():
+            if not entries:
+                self._journal.segments.remove(segment)
+                segment.close(delete=True)
+                continue
+            for rows in entries:
+                self._enqueue(rows)
+                segment.last_seq = self._seq
+            self.counters["replayed"] += len(entries)
+        if self.counters["replayed"]:
+            logger.info("Replaying %d queued decisions from %s", self.counters["replayed"], settings.WRITE_BEHIND_SPILL_DIR)
+            self._wakeup.set()
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Flush everything still queued; what cannot be written stays in the spill files"""
+        if self._task is None:
+            return
+        self._task.cancel()
+        with suppress(asyncio.CancelledError):
+            await self._task
+        self._task = None
+        while self._units:
+            try:
+                await self._flush(self._take())
+            except Exception as e:
+                logger.error("Write-behind drain failed, %d decisions left for replay: %s", len(self._units), e)
+                break
+        self._journal.close()
+        self._units.clear()
+        self._pending_transactions.clear()
+        self._pending_rows = 0
+
+    async def offer(self, rows: Rows) -> bool:
+        """Queue the rows of one decision; False means the caller must write them itself"""
+        if not self.running:
+            return False
+        size = sum(len(table_rows) for table_rows in rows.values())
+        if size == 0:
+            return True
+        deadline = time.monotonic() + settings.WRITE_BEHIND_ENQUEUE_TIMEOUT_SECONDS
+        # A decision larger than the whole queue is still accepted into an empty one
+        while self._pending_rows and self._pending_rows + size > settings.WRITE_BEHIND_MAX_PENDING_ROWS:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                self.counters["full_fallbacks"] += 1
+                return False
+            self._space.clear()
+            with suppress(asyncio.TimeoutError):
+                await asyncio.wait_for(self._space.wait(), remaining)
+        self._enqueue(rows, journal=True)
+        self.counters["enqueued"] += 1
+        self._wakeup.set()
+        return True
+
+    def _enqueue(self, rows: Rows, journal: bool = False):
+        self._seq += 1
+        if journal:
+            self._journal.append(self._seq, rows)
+        unit = _Unit(self._seq, rows)
+        self._units.append(unit)
+        self._pending_rows += unit.size
+        for row in rows.get("transactions", ()):
+            self._pending_transactions[row["txn_id"]] = unit
+
+    def pending_transactions(self, txn_ids: List[str]) -> Dict[str, Dict[str, Any]]:
+        """Queued, not yet committed transactions among txn_ids, with their fraud probability"""
+        found = {}
+        for txn_id in txn_ids:
+            unit = self._pending_transactions.get(txn_id)
+            if unit is None:
+                continue
+            transaction = next(row for row in unit.rows["transactions"] if row["txn_id"] == txn_id)
+            case = next((row for row in unit.rows.get("fraud_cases", ()) if row["txn_id"] == txn_id), None)
+            found[txn_id] = {**transaction, "fraud_probability": case["fraud_probability"] if case else None}
+        return found
+
+    async def _run(self):
+        while True:
+            await self._wakeup.wait()
+            await asyncio.sleep(settings.WRITE_BEHIND_LINGER_SECONDS)  # Let concurrent decisions join the batch
+            self._wakeup.clear()
+            while self._units:
+                try:
+                    await self._flush(self._take())
+                except Exception as e:
+                    # Database unavailable: keep the batch at the head of the queue and retry
+                    self.counters["flush_errors"] += 1
+                    logger.warning("Write-behind flush failed, retrying: %s", e)
+                    await asyncio.sleep(settings.WRITE_BEHIND_RETRY_SECONDS)
+
+    def _take(self) -> List[_Unit]:
+        """Oldest decisions up to WRITE_BEHIND_BATCH_ROWS rows; left queued until committed"""
+        batch, rows = [], 0
+        for unit in self._units:
+            if batch and rows + unit.size > settings.WRITE_BEHIND_BATCH_ROWS:
+                break
+            batch.append(unit)
+            rows += unit.size
+        return batch
+
+    async def _flush(self, batch: List[_Unit]):
+        started = time.perf_counter()
+        try:
+            await self._write(batch)
+        except IntegrityError as e:
+            if len(batch) > 1:
+                for unit in batch:  # Isolate the decision the database refuses
+                    await self._flush([unit])
+                return
+            logger.error("Write-behind decision rejected by the database: %s", e)
+            self._journal.reject(batch[0].rows, str(e.orig))
+            self.counters["rejected_decisions"] += 1
+            for name, table_rows in batch[0].rows.items():
+                FLUSHED_ROWS.inc(len(table_rows), table=name, outcome="rejected")
+        elapsed = time.perf_counter() - started
+        FLUSH_SECONDS.observe(elapsed)
+        self.counters["flushes"] += 1
+        self.last_flush = {"decisions": len(batch), "ms": round(elapsed * 1000, 3)}
+        self._complete(batch)
+
+    async def _write(self, batch: List[_Unit]):
+        rows: Rows = {name: [] for name in TABLES}
+        for unit in batch:
+            for name, table_rows in unit.rows.items():
+                rows[name].extend(table_rows)
+        async with AsyncSessionLocal() as db:
+            try:
+                await self._insert(db, rows)
+            except IntegrityError:
+                await db.rollback()
+                # Replayed after a crash that followed the commit, or stored by another worker first
+                kept = await self._without_stored(db, rows)
+                for name in rows:
+                    FLUSHED_ROWS.inc(len(rows[name]) - len(kept[name]), table=name, outcome="duplicate")
+                    self.counters["duplicate_rows"] += len(rows[name]) - len(kept[name])
+                rows = kept
+                await self._insert(db, rows)
+        for name, table_rows in rows.items():
+            FLUSHED_ROWS.inc(len(table_rows), table=name, outcome="written")
+            self.counters["written_rows"] += len(table_rows)
+
+    async def _insert(self, db, rows: Rows):
+        for name, table in TABLES.items():
+            if rows[name]:
+                await db.execute(insert(table), rows[name])
+        await db.commit()
+
+    async def _without_stored(self, db, rows: Rows) -> Rows:
+        async def stored(column, values):
+            if not values:
+                return set()
+            return set((await db.execute(select(column).where(column.in_(values)))).scalars().all())
+
+        stored_txns = await stored(Transaction.txn_id, [row["txn_id"] for row in rows["transactions"]])
+        stored_cases = await stored(FraudCase.case_id, [row["case_id"] for row in rows["fraud_cases"]])
+        stored_apps = await stored(CreditApplication.app_id, [row["app_id"] for row in rows["credit_applications"]])
+        return {
+            "transactions": [row for row in rows["transactions"] if row["txn_id"] not in stored_txns],
+            # A stored transaction keeps the fraud case it was stored with
+            "fraud_cases": [
+                row for row in rows["fraud_cases"]
+                if row["txn_id"] not in stored_txns and row["case_id"] not in stored_cases
+            ],
+            "credit_applications": [row for row in rows["credit_applications"] if row["app_id"] not in stored_apps]
+        }
+
+    def _complete(self, batch: List[_Unit]):
+        for unit in batch:
+            self._units.popleft()
+            self._pending_rows -= unit.size
+            for row in unit.rows.get("transactions", ()):
+                if self._pending_transactions.get(row["txn_id"]) is unit:
+                    del self._pending_transactions[row["txn_id"]]
+        self._journal.committed(batch[-1].seq)
+        self._space.set()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "enabled": self.enabled,
+            "running": self.running,
+            "pending_decisions": len(self._units),
+            "pending_rows": self._pending_rows,
+            "max_pending_rows": settings.WRITE_BEHIND_MAX_PENDING_ROWS,
+            "oldest_pending_seconds": round(time.monotonic() - self._units[0].enqueued_at, 3) if self._units else 0.0,
+            "spill_files": len(self._journal.segments) if self._journal else 0,
+            "last_flush": self.last_flush,
+            **self.counters
+        }
+
+
+write_behind = WriteBehindQueue()
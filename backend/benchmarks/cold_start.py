@@ -0,0 +1,104 @@
+"""Cold-start cost of one API worker.
+
+Imports `app.main` in fresh interpreters and runs the FastAPI lifespan with the
+database and LLM untouched, reporting wall time and resident memory for each
+phase. Run it before and after a change to see its effect on worker startup.
+
+Usage:
+    python benchmarks/cold_start.py --runs 5
+    python benchmarks/cold_start.py --runs 5 --no-api-key   # import must not need OPENAI_API_KEY
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Runs in the child interpreter; prints one JSON line
+PROBE = r"""
+import json, resource, sys, time
+
+def rss_mb():
+    with open("/proc/self/status") as f:
+        for line in f:
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1]) / 1024
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+report = {"baseline_rss_mb": rss_mb()}
+started = time.perf_counter()
+try:
+    import app.main
+except Exception as e:
+    print(json.dumps({"error": f"{type(e).__name__}: {e}"}))
+    sys.exit(0)
+report["import_seconds"] = time.perf_counter() - started
+report["import_rss_mb"] = rss_mb()
+
+import asyncio
+from app.services.feature_store import feature_store
+
+async def startup():
+    async def no_rebuild():
+        return {}
+    feature_store.rebuild = no_rebuild  # Keep the database out of the measurement
+    async with app.main.app.router.lifespan_context(app.main.app):
+        report["startup_seconds"] = time.perf_counter() - started
+        report["startup_rss_mb"] = rss_mb()
+
+asyncio.run(startup())
+print(json.dumps(report))
+"""
+
+
+def run_once(env) -> dict:
+    output = subprocess.run(
+        [sys.executable, "-c", PROBE],
+        cwd=BACKEND_DIR,
+        env=env,
+        capture_output=True,
+        text=True,
+        check=True
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure API worker cold start")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--no-api-key", action="store_true", help="Unset OPENAI_API_KEY for the probe")
+    parser.add_argument("--json", action="store_true", help="Print machine-readable results only")
+    args = parser.parse_args()
+
+    env = dict(os.environ)
+    if args.no_api_key:
+        env.pop("OPENAI_API_KEY", None)
+    else:
+        env.setdefault("OPENAI_API_KEY", "sk-cold-start-probe")
+
+    reports = [run_once(env) for _ in range(args.runs)]
+    failures = [r["error"] for r in reports if "error" in r]
+    if failures:
+        print(f"❌ Import failed: {failures[0]}")
+        sys.exit(1)
+
+    summary = {
+        key: round(statistics.median(r[key] for r in reports), 3)
+        for key in ("import_seconds", "startup_seconds", "baseline_rss_mb", "import_rss_mb", "startup_rss_mb")
+    }
+    summary["runs"] = args.runs
+
+    if args.json:
+        print(json.dumps(summary))
+        return
+    print(f"🚀 Cold start over {args.runs} runs (median)")
+    print(f"   import app.main : {summary['import_seconds'] * 1000:8.1f} ms   RSS {summary['import_rss_mb']:7.1f} MB")
+    print(f"   + lifespan      : {summary['startup_seconds'] * 1000:8.1f} ms   RSS {summary['startup_rss_mb']:7.1f} MB")
+    print(f"   interpreter     : {'':8s}      RSS {summary['baseline_rss_mb']:7.1f} MB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,414 @@
+"""End-to-end benchmark of the FastAPI backend.
+
+Starts `app.main:app` under uvicorn against a scratch database (SQLite in a
+temp directory unless --database-url is given) with a stand-in LLM
+(LLM_BACKEND=synthetic, or replay of recorded answers), seeds customers with
+transaction history, then drives mixed fraud-check / credit-assessment
+traffic and reports throughput, latency percentiles, the share of server
+time spent in the database and resident memory per worker.
+
+Traffic is open-loop at --rate requests/s (latency measured from the
+scheduled send time, so client-side queueing counts) or closed-loop with
+--concurrency clients when --rate is 0. Results are JSON, for comparing
+runs across commits; --baseline fails the run on a regression.
+
+Usage:
+    python benchmarks/e2e.py --duration 30 --rate 50 --concurrency 64 --workers 2
+    python benchmarks/e2e.py --rate 0 --concurrency 16 --output results/e2e.json
+    python benchmarks/e2e.py --baseline results/e2e.json --max-regression 0.10
+    python benchmarks/e2e.py --env WRITE_BEHIND_ENABLED=true --llm-latency-ms 400 --json
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import re
+import shutil
+import signal
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import uuid
+
+import httpx
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+ROUTES = {"fraud": "/api/v1/fraud/check", "credit": "/api/v1/credit/assess"}
+MERCHANT_CATEGORIES = ["grocery", "online", "fuel", "dining", "travel", "retail", "utilities", "pharmacy"]
+LOAN_PURPOSES = ["home_renovation", "debt_consolidation", "auto", "education", "business", "medical"]
+EMPLOYMENT = ["employed", "self_employed", "unemployed", "retired", "student"]
+
+# Runs in a child interpreter against the scratch database; prints one JSON line
+SEED = r"""
+import json, random, sys
+from datetime import datetime, timedelta
+from app.config.database import SessionLocal
+from app.models.schemas import Customer, KYCStatus, Transaction, TransactionStatus
+
+customers, history, seed = int(sys.argv[1]), int(sys.argv[2]), int(sys.argv[3])
+rng = random.Random(seed)
+db = SessionLocal()
+if db.query(Customer).first() is not None:
+    print(json.dumps({"error": "database is not empty; point --database-url at a scratch database"}))
+    sys.exit(0)
+now = datetime.utcnow()
+for i in range(customers):
+    customer_id = f"cust-bench-{i:05d}"
+    db.add(Customer(customer_id=customer_id, first_name="Bench", last_name=f"{i:05d}", email=f"{customer_id}@bench.example",
+                    kyc_status=KYCStatus.VERIFIED, risk_score=rng.randint(300, 850)))
+    db.flush()
+    home = (20 + (i % 50) * 0.3, 70 + (i % 40) * 0.3)
+    for j in range(history):
+        db.add(Transaction(
+            txn_id=f"txn-bench-seed-{i:05d}-{j:03d}", customer_id=customer_id, amount=round(rng.lognormvariate(4, 0.6), 2),
+            transaction_type="debit", merchant_id=f"merchant-{(i + j) % 40:03d}", merchant_category="grocery",
+            location_lat=home[0], location_long=home[1], device_fingerprint=f"device-{i:05d}", ip_address=f"10.0.{i % 250}.{j % 250}",
+            timestamp=now - timedelta(hours=6 * (history - j)), status=TransactionStatus.APPROVED
+        ))
+    if i % 200 == 0:
+        db.commit()
+db.commit()
+print(json.dumps({"customers": customers, "transactions": customers * history}))
+"""
+
+
+class Traffic:
+    """Realistic request bodies: mostly in-pattern transactions, a share of anomalous ones, and credit applications"""
+
+    def __init__(self, customers: int, anomaly_share: float, seed: int):
+        self.customers = customers
+        self.anomaly_share = anomaly_share
+        self.rng = random.Random(seed)
+
+    def fraud(self) -> dict:
+        i = self.rng.randrange(self.customers)
+        home = (20 + (i % 50) * 0.3, 70 + (i % 40) * 0.3)
+        anomalous = self.rng.random() < self.anomaly_share
+        return {
+            "transaction_id": f"txn-bench-{uuid.uuid4().hex[:20]}",
+            "customer_id": f"cust-bench-{i:05d}",
+            "amount": round(self.rng.lognormvariate(7.5 if anomalous else 4, 0.8), 2),
+            "merchant_id": f"merchant-{self.rng.randrange(400 if anomalous else 40):03d}",
+            "merchant_category": self.rng.choice(MERCHANT_CATEGORIES),
+            "location": {
+                "lat": home[0] + (self.rng.uniform(-30, 30) if anomalous else self.rng.uniform(-0.05, 0.05)),
+                "long": home[1] + (self.rng.uniform(-60, 60) if anomalous else self.rng.uniform(-0.05, 0.05))
+            },
+            "device_fingerprint": f"device-{uuid.uuid4().hex[:8]}" if anomalous else f"device-{i:05d}",
+            "ip_address": f"198.51.100.{self.rng.randrange(250)}" if anomalous else f"10.0.{i % 250}.{self.rng.randrange(250)}"
+        }
+
+    def credit(self) -> dict:
+        income = round(self.rng.lognormvariate(11, 0.5), 2)
+        return {
+            "customer_id": f"cust-bench-{self.rng.randrange(self.customers):05d}",
+            "requested_amount": round(income * self.rng.uniform(0.1, 1.5), 2),
+            "loan_purpose": self.rng.choice(LOAN_PURPOSES),
+            "employment_status": self.rng.choice(EMPLOYMENT),
+            "annual_income": income,
+            "credit_bureau_score": int(min(850, max(300, self.rng.gauss(680, 80)))),
+            "alternative_data": {
+                "utility_payment_score": self.rng.randint(300, 900),
+                "rent_payment_history": self.rng.choice(["excellent", "good", "fair", "poor"])
+            }
+        }
+
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def latency_summary(values):
+    return {
+        "count": len(values),
+        "p50_ms": round(percentile(values, 50), 2),
+        "p95_ms": round(percentile(values, 95), 2),
+        "p99_ms": round(percentile(values, 99), 2),
+        "mean_ms": round(statistics.mean(values), 2) if values else 0.0
+    }
+
+
+SAMPLE = re.compile(r'^([a-zA-Z_:][a-zA-Z0-9_:]*)(\{[^}]*\})?\s+(\S+)$')
+
+
+def parse_metrics(text: str) -> dict:
+    """{(name, labels): value} from the Prometheus text format"""
+    samples = {}
+    for line in text.splitlines():
+        match = SAMPLE.match(line)
+        if match:
+            samples[(match.group(1), match.group(2) or "")] = float(match.group(3))
+    return samples
+
+
+def metric_sum(samples: dict, name: str, label_filter: str = "") -> float:
+    return sum(value for (sample, labels), value in samples.items() if sample == name and label_filter in labels)
+
+
+async def scrape_workers(url: str, workers: int) -> dict:
+    """Metrics of every worker, by pid; each scrape opens a new connection so the kernel spreads them"""
+    by_pid = {}
+    for _ in range(workers * 20):
+        async with httpx.AsyncClient(base_url=url, timeout=10.0) as client:
+            samples = parse_metrics((await client.get("/metrics", headers={"Connection": "close"})).text)
+        by_pid[int(samples.get(("process_pid", ""), 0))] = samples
+        if len(by_pid) >= workers:
+            break
+    return by_pid
+
+
+def server_totals(before: dict, after: dict) -> dict:
+    """Request and DB seconds the workers spent during the measured window, plus their memory"""
+    request_seconds = db_seconds = 0.0
+    for pid, samples in after.items():
+        previous = before.get(pid, {})
+        for route in ROUTES.values():
+            label = f'route="{route}"'
+            request_seconds += metric_sum(samples, "http_request_duration_seconds_sum", label) - metric_sum(previous, "http_request_duration_seconds_sum", label)
+        db_seconds += metric_sum(samples, "db_statement_duration_seconds_sum") - metric_sum(previous, "db_statement_duration_seconds_sum")
+    memory = {pid: round(samples.get(("process_resident_memory_bytes", ""), 0) / 1024 / 1024, 1) for pid, samples in after.items()}
+    return {
+        "server_request_seconds": round(request_seconds, 3),
+        "db_seconds": round(db_seconds, 3),
+        "db_time_share": round(db_seconds / request_seconds, 4) if request_seconds > 0 else 0.0,
+        "workers_sampled": len(after),
+        "rss_mb_per_worker": memory,
+        "rss_mb_max": max(memory.values(), default=0.0),
+        "rss_mb_mean": round(statistics.mean(memory.values()), 1) if memory else 0.0
+    }
+
+
+async def drive(url, traffic, args, duration, record):
+    """Send traffic for `duration` seconds; appends (kind, status, latency_ms) to `record`"""
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    semaphore = asyncio.Semaphore(args.concurrency)
+    deadline = time.perf_counter() + duration
+
+    async with httpx.AsyncClient(base_url=url, limits=limits, timeout=args.timeout) as client:
+        async def send(scheduled):
+            kind = "credit" if traffic.rng.random() < args.credit_share else "fraud"
+            payload = traffic.credit() if kind == "credit" else traffic.fraud()
+            async with semaphore:
+                try:
+                    status = (await client.post(ROUTES[kind], json=payload)).status_code
+                except httpx.HTTPError:
+                    status = 0
+            record.append((kind, status, (time.perf_counter() - scheduled) * 1000))
+
+        if args.rate > 0:
+            # Open loop: Poisson arrivals, independent of how fast the server answers
+            tasks = []
+            next_send = time.perf_counter()
+            while next_send < deadline:
+                await asyncio.sleep(max(0.0, next_send - time.perf_counter()))
+                tasks.append(asyncio.create_task(send(next_send)))
+                next_send += traffic.rng.expovariate(args.rate)
+            await asyncio.gather(*tasks)
+        else:
+            async def client_loop():
+                while time.perf_counter() < deadline:
+                    await send(time.perf_counter())
+            await asyncio.gather(*(client_loop() for _ in range(args.concurrency)))
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=BACKEND_DIR, capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def server_env(args, scratch):
+    env = dict(os.environ)
+    env.update({
+        "DATABASE_URL": args.database_url or f"sqlite:///{os.path.join(scratch, 'bench.db')}",
+        "LLM_BACKEND": "replay" if args.replay else "synthetic",
+        "LLM_SYNTHETIC_LATENCY": args.llm_latency,
+        "LLM_SYNTHETIC_LATENCY_MS": str(args.llm_latency_ms),
+        "LLM_SYNTHETIC_LATENCY_P99_MS": str(args.llm_latency_p99_ms),
+        "LLM_SYNTHETIC_SEED": str(args.seed),
+        "WRITE_BEHIND_SPILL_DIR": os.path.join(scratch, "write_behind"),
+        "BULK_CHECKPOINT_DIR": os.path.join(scratch, "bulk_jobs")
+    })
+    if args.replay:
+        env["LLM_REPLAY_PATH"] = os.path.abspath(args.replay)
+    env.pop("LLM_RECORD_PATH", None)
+    env.pop("LLM_CACHE_DISK_PATH", None)
+    for item in args.env:
+        key, _, value = item.partition("=")
+        env[key] = value
+    return env
+
+
+def prepare_database(env, args):
+    subprocess.run([sys.executable, "migrate.py"], cwd=BACKEND_DIR, env=env, capture_output=True, check=True)
+    output = subprocess.run(
+        [sys.executable, "-c", SEED, str(args.customers), str(args.history), str(args.seed)],
+        cwd=BACKEND_DIR, env=env, capture_output=True, text=True, check=True
+    ).stdout
+    seeded = json.loads(output.strip().splitlines()[-1])
+    if "error" in seeded:
+        raise RuntimeError(seeded["error"])
+    return seeded
+
+
+async def wait_ready(url, server, timeout=120.0):
+    deadline = time.perf_counter() + timeout
+    async with httpx.AsyncClient(base_url=url, timeout=2.0) as client:
+        while time.perf_counter() < deadline:
+            if server.poll() is not None:
+                raise RuntimeError(f"uvicorn exited with code {server.returncode}")
+            try:
+                if (await client.get("/health")).status_code == 200:
+                    return
+            except httpx.HTTPError:
+                pass
+            await asyncio.sleep(0.25)
+    raise RuntimeError("server did not become ready")
+
+
+def compare(report, baseline, max_regression):
+    """Regressions beyond the allowed fraction: lower RPS or higher p95/p99"""
+    regressions = []
+    checks = [("rps", report["rps"], baseline["rps"], False)]
+    for key in ("p95_ms", "p99_ms"):
+        checks.append((f"latency {key}", report["latency_ms"]["all"][key], baseline["latency_ms"]["all"][key], True))
+    for name, value, reference, higher_is_worse in checks:
+        if reference <= 0:
+            continue
+        change = (value - reference) / reference
+        if (change if higher_is_worse else -change) > max_regression:
+            regressions.append(f"{name}: {reference} -> {value} ({change:+.1%})")
+    return regressions
+
+
+async def run(args, scratch):
+    env = server_env(args, scratch)
+    seeded = prepare_database(env, args)
+    port = free_port()
+    url = f"http://127.0.0.1:{port}"
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--host", "127.0.0.1", "--port", str(port),
+         "--workers", str(args.workers), "--log-level", "warning"],
+        cwd=BACKEND_DIR, env=env, stdout=subprocess.DEVNULL, stderr=open(os.path.join(scratch, "server.log"), "w"),
+        start_new_session=True
+    )
+    try:
+        await wait_ready(url, server)
+        traffic = Traffic(args.customers, args.anomaly_share, args.seed)
+        if args.warmup > 0:
+            await drive(url, traffic, args, args.warmup, [])
+        before = await scrape_workers(url, args.workers)
+        record = []
+        started = time.perf_counter()
+        await drive(url, traffic, args, args.duration, record)
+        elapsed = time.perf_counter() - started
+        after = await scrape_workers(url, args.workers)
+    finally:
+        os.killpg(server.pid, signal.SIGTERM)
+        try:
+            server.wait(timeout=30)
+        except subprocess.TimeoutExpired:
+            os.killpg(server.pid, signal.SIGKILL)
+
+    ok = [r for r in record if r[1] == 200]
+    status_codes = {}
+    for _, status, _ in record:
+        status_codes[str(status)] = status_codes.get(str(status), 0) + 1
+    return {
+        "commit": git_commit(),
+        "config": {
+            "workers": args.workers, "rate": args.rate, "concurrency": args.concurrency, "duration": args.duration,
+            "credit_share": args.credit_share, "anomaly_share": args.anomaly_share, "customers": args.customers,
+            "llm_backend": env["LLM_BACKEND"], "llm_latency": args.llm_latency, "llm_latency_ms": args.llm_latency_ms,
+            "llm_latency_p99_ms": args.llm_latency_p99_ms, "database": env["DATABASE_URL"].split(":", 1)[0],
+            "env": args.env, "seeded": seeded
+        },
+        "requests": len(record),
+        "errors": len(record) - len(ok),
+        "status_codes": status_codes,
+        "rps": round(len(ok) / elapsed, 2) if elapsed > 0 else 0.0,
+        "latency_ms": {
+            "all": latency_summary([r[2] for r in ok]),
+            **{kind: latency_summary([r[2] for r in ok if r[0] == kind]) for kind in ROUTES}
+        },
+        **server_totals(before, after)
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="End-to-end backend benchmark with a stand-in LLM")
+    parser.add_argument("--duration", type=float, default=30.0, help="Measured seconds of traffic")
+    parser.add_argument("--warmup", type=float, default=5.0, help="Unmeasured seconds of traffic first")
+    parser.add_argument("--rate", type=float, default=50.0, help="Open-loop requests/s (0 = closed loop)")
+    parser.add_argument("--concurrency", type=int, default=64, help="Max in-flight requests (closed loop: clients)")
+    parser.add_argument("--workers", type=int, default=1, help="uvicorn worker processes")
+    parser.add_argument("--credit-share", type=float, default=0.2, help="Fraction of requests that are credit assessments")
+    parser.add_argument("--anomaly-share", type=float, default=0.1, help="Fraction of transactions that are out of pattern")
+    parser.add_argument("--customers", type=int, default=500)
+    parser.add_argument("--history", type=int, default=10, help="Seeded past transactions per customer")
+    parser.add_argument("--database-url", help="Scratch database (must be empty); default a temp SQLite file")
+    parser.add_argument("--replay", help="Recorded LLM answers (LLM_RECORD_PATH output) instead of synthetic ones")
+    parser.add_argument("--llm-latency", choices=["fixed", "uniform", "lognormal"], default="lognormal")
+    parser.add_argument("--llm-latency-ms", type=float, default=800.0, help="Median stand-in LLM latency")
+    parser.add_argument("--llm-latency-p99-ms", type=float, default=3000.0)
+    parser.add_argument("--env", action="append", default=[], metavar="KEY=VALUE", help="Extra server setting (repeatable)")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--timeout", type=float, default=60.0)
+    parser.add_argument("--output", help="Also write the JSON report to this file")
+    parser.add_argument("--baseline", help="Earlier JSON report; exit 1 on a regression beyond --max-regression")
+    parser.add_argument("--max-regression", type=float, default=0.10)
+    parser.add_argument("--keep", action="store_true", help="Keep the scratch directory (database, server log)")
+    parser.add_argument("--json", action="store_true", help="Print machine-readable results only")
+    args = parser.parse_args()
+
+    scratch = tempfile.mkdtemp(prefix="e2e-bench-")
+    try:
+        report = asyncio.run(run(args, scratch))
+    except (RuntimeError, subprocess.CalledProcessError) as e:
+        print(f"❌ Benchmark failed: {e} (server log in {scratch})")
+        sys.exit(1)
+    if not args.keep:
+        shutil.rmtree(scratch, ignore_errors=True)
+
+    if args.output:
+        os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+    regressions = []
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(report, json.load(f), args.max_regression)
+        report["regressions"] = regressions
+
+    if args.json:
+        print(json.dumps(report))
+    else:
+        print(f"🚀 {report['requests']} requests in {args.duration:.0f}s ({report['errors']} errors), {report['rps']:.1f} RPS")
+        print(f"{'':8s} {'count':>7} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}")
+        for kind, stats in report["latency_ms"].items():
+            print(f"{kind:8s} {stats['count']:>7} {stats['p50_ms']:>9.1f} {stats['p95_ms']:>9.1f} {stats['p99_ms']:>9.1f}")
+        print(f"🗄️  DB time share {report['db_time_share']:.1%} ({report['db_seconds']:.1f}s of {report['server_request_seconds']:.1f}s server time)")
+        print(f"💾 RSS per worker: max {report['rss_mb_max']:.1f} MB, mean {report['rss_mb_mean']:.1f} MB ({report['workers_sampled']} of {args.workers} sampled)")
+        for regression in regressions:
+            print(f"❌ Regression: {regression}")
+    if regressions:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,235 @@
+"""LLM client timeouts, retries, fallbacks and circuit breaker against a local stub server.
+
+Starts an OpenAI-compatible stub on localhost and points the fraud agent at
+it (OPENAI_BASE_URL), one scenario per base path:
+
+    ok      answers immediately
+    flaky   503 for the first LLM_MAX_RETRIES requests, then answers
+    slow    answers only after the per-request deadline
+    down    always 500
+
+and checks, through both the sync and async agent paths, that answers come
+back, transient errors are retried, a slow or failing LLM degrades to a local
+decision within the deadline, and sequential calls reuse pooled keep-alive
+connections. Then that the circuit breaker trips on the failing LLM, answers
+from the degraded scorer without calling it while open, and closes again
+after successful half-open probes. Exits 1 if any check fails.
+
+Usage:
+    python benchmarks/llm_timeouts.py
+    python benchmarks/llm_timeouts.py --deadline 1.5 --call-timeout 1.0 --json
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("OPENAI_API_KEY", "stub")
+
+from app.config.settings import settings  # noqa: E402
+from app.agents.fraud_agent import FraudDetectionAgent  # noqa: E402
+from app.services.circuit_breaker import CLOSED, OPEN, CircuitBreaker  # noqa: E402
+from app.services.fast_path import FastPathScorer  # noqa: E402
+from app.services.fraud_model import FraudModelScorer  # noqa: E402
+from app.services.llm_clients import llm_http_clients  # noqa: E402
+
+ANSWER = json.dumps({
+    "fraud_probability": 72,
+    "risk_level": "high",
+    "action": "verify",
+    "anomalies": ["Stub anomaly"],
+    "reasoning": "Stub answer"
+})
+TRANSACTION = {
+    "transaction_id": "stub-txn",
+    "customer_id": "stub-customer",
+    "amount": 250.0,
+    "merchant_id": "stub-merchant",
+    "location": {"lat": 40.7, "long": -74.0}
+}
+
+
+class NoFastPath(FastPathScorer):
+    """Sends every transaction to the LLM; still scores degraded decisions"""
+
+    def score(self, transaction_data, customer_profile):
+        return None
+
+
+class StubServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, slow_seconds):
+        super().__init__(("127.0.0.1", 0), StubHandler)
+        self.slow_seconds = slow_seconds
+        self.requests = {}  # Scenario -> requests received
+        self.connections = set()  # Client (host, port) pairs seen
+        self.lock = threading.Lock()
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.server_address[1]}"
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # Keep-alive
+
+    def log_message(self, *args):
+        pass
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        scenario = self.path.strip("/").split("/")[0]
+        with self.server.lock:
+            count = self.server.requests[scenario] = self.server.requests.get(scenario, 0) + 1
+            self.server.connections.add(self.client_address)
+
+        if scenario == "down" or (scenario == "flaky" and count <= settings.LLM_MAX_RETRIES):
+            return self._reply(503 if scenario == "flaky" else 500, {"error": {"message": f"stub {scenario}"}})
+        if scenario == "slow":
+            time.sleep(self.server.slow_seconds)
+        self._reply(200, {
+            "id": "chatcmpl-stub",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": "stub",
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": ANSWER}, "finish_reason": "stop"}],
+            "usage": {"prompt_tokens": 100, "completion_tokens": 20, "total_tokens": 120}
+        })
+
+    def _reply(self, status, body):
+        payload = json.dumps(body).encode()
+        try:
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+        except (BrokenPipeError, ConnectionResetError):
+            pass  # The client gave up first (slow scenario)
+
+
+def build_agent(server, scenario, breaker=None):
+    settings.OPENAI_BASE_URL = f"{server.url}/{scenario}/v1"
+    agent = FraudDetectionAgent()
+    agent.fast_path = NoFastPath()
+    agent.ml_model = FraudModelScorer(mode="off")
+    agent.breaker = breaker or CircuitBreaker(scenario, enabled=False)
+    agent.llm  # Built now, against this scenario's base URL
+    return agent
+
+
+async def run_scenario(server, scenario, use_async, agent=None):
+    agent = agent or build_agent(server, scenario)
+    started = time.perf_counter()
+    if use_async:
+        decision = await agent.acheck_transaction(dict(TRANSACTION), bypass_cache=True)
+    else:
+        decision = await asyncio.to_thread(agent.check_transaction, dict(TRANSACTION), bypass_cache=True)
+    return decision, time.perf_counter() - started
+
+
+async def main(args):
+    settings.LLM_BACKEND = "openai"
+    settings.LLM_REQUEST_DEADLINE_SECONDS = args.deadline
+    settings.LLM_CALL_TIMEOUT_SECONDS = args.call_timeout
+    settings.LLM_RETRY_BASE_SECONDS = 0.05
+    settings.LLM_RETRY_MAX_SECONDS = 0.2
+    settings.LLM_CACHE_ENABLED = False
+
+    server = StubServer(slow_seconds=args.deadline * 3)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    checks = []
+
+    def check(name, passed, detail):
+        checks.append({"check": name, "passed": bool(passed), "detail": detail})
+
+    limit = args.deadline + 0.5  # Deadline plus scheduling slack
+    for use_async in (False, True):
+        path = "async" if use_async else "sync"
+        server.requests.clear()
+
+        decision, seconds = await run_scenario(server, "ok", use_async)
+        check(f"{path} ok answers", decision["decided_by"] == "llm" and decision["action"] == "verify", f"{decision['decided_by']} in {seconds:.2f}s")
+
+        decision, seconds = await run_scenario(server, "flaky", use_async)
+        check(
+            f"{path} flaky is retried",
+            decision["decided_by"] == "llm" and server.requests.get("flaky") == settings.LLM_MAX_RETRIES + 1,
+            f"{decision['decided_by']} after {server.requests.get('flaky')} requests in {seconds:.2f}s"
+        )
+
+        decision, seconds = await run_scenario(server, "slow", use_async)
+        check(
+            f"{path} slow degrades within deadline",
+            decision["decided_by"] == "degraded" and seconds <= limit,
+            f"{decision['decided_by']} in {seconds:.2f}s (deadline {args.deadline}s)"
+        )
+
+        decision, seconds = await run_scenario(server, "down", use_async)
+        check(
+            f"{path} down degrades",
+            decision["decided_by"] == "degraded" and seconds <= limit,
+            f"{decision['decided_by']} after {server.requests.get('down')} requests in {seconds:.2f}s"
+        )
+
+    # Sequential calls should ride the same pooled connections
+    server.connections.clear()
+    agent = build_agent(server, "ok")
+    for _ in range(args.calls):
+        await agent.acheck_transaction(dict(TRANSACTION), bypass_cache=True)
+    check(
+        "keep-alive reuses connections",
+        len(server.connections) <= 2,
+        f"{args.calls} calls over {len(server.connections)} connection(s)"
+    )
+
+    # A failing LLM trips the breaker; while open nothing reaches it, then half-open probes close it
+    breaker = CircuitBreaker("benchmark", enabled=True, min_calls=3, open_seconds=args.open_seconds, half_open_probes=2)
+    agent = build_agent(server, "down", breaker)
+    for _ in range(breaker.min_calls):
+        await run_scenario(server, "down", True, agent)
+    check("breaker trips on errors", breaker.state == OPEN, breaker.last_trip_reason)
+
+    server.requests.clear()
+    decision, seconds = await run_scenario(server, "down", True, agent)
+    check(
+        "open breaker short-circuits",
+        decision["decided_by"] == "degraded" and not server.requests.get("down") and seconds < 0.1,
+        f"{decision['decided_by']} after {server.requests.get('down', 0)} requests in {seconds * 1000:.1f}ms"
+    )
+
+    await asyncio.sleep(args.open_seconds)
+    agent = build_agent(server, "ok", breaker)
+    decisions = [(await run_scenario(server, "ok", True, agent))[0] for _ in range(breaker.half_open_probes)]
+    check(
+        "half-open probes close it",
+        breaker.state == CLOSED and all(d["decided_by"] == "llm" for d in decisions),
+        f"{breaker.state} after {len(decisions)} probes"
+    )
+
+    await llm_http_clients.aclose()
+    server.shutdown()
+
+    failed = [c for c in checks if not c["passed"]]
+    if args.json:
+        print(json.dumps({"checks": checks, "failed": len(failed)}))
+    else:
+        for c in checks:
+            print(f"{'✅' if c['passed'] else '❌'} {c['check']}: {c['detail']}")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Check LLM timeouts, retries and fallbacks against a stub server")
+    parser.add_argument("--deadline", type=float, default=1.5, help="LLM_REQUEST_DEADLINE_SECONDS for the run")
+    parser.add_argument("--call-timeout", type=float, default=1.0, help="LLM_CALL_TIMEOUT_SECONDS for the run")
+    parser.add_argument("--calls", type=int, default=50, help="Sequential calls for the keep-alive check")
+    parser.add_argument("--open-seconds", type=float, default=1.0, help="Breaker open time for the breaker check")
+    parser.add_argument("--json", action="store_true", help="Print machine-readable results only")
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,113 @@
+"""Concurrency sweep against a running backend.
+
+Fires fraud-check (or credit-assessment) requests at increasing concurrency
+levels and reports throughput and latency for each level. With the async
+request path, RPS should grow with concurrency until the LLM concurrency cap
+(MAX_CONCURRENT_LLM_CALLS) or the upstream rate limit is reached.
+
+Usage:
+    python benchmarks/load_test.py --url http://localhost:8000 --levels 1,2,4,8,16 --requests 64
+"""
+import argparse
+import asyncio
+import time
+import uuid
+
+import httpx
+
+
+def fraud_payload(customer_id: str) -> dict:
+    return {
+        "transaction_id": f"txn-load-{uuid.uuid4().hex[:16]}",
+        "customer_id": customer_id,
+        "amount": 125.50,
+        "merchant_id": "merchant-load",
+        "merchant_category": "online",
+        "location": {"lat": 26.9124, "long": 75.7873},
+        "device_fingerprint": "device-load",
+        "ip_address": "203.0.113.45"
+    }
+
+
+def credit_payload(customer_id: str) -> dict:
+    return {
+        "customer_id": customer_id,
+        "requested_amount": 25000,
+        "loan_purpose": "home_renovation",
+        "employment_status": "employed",
+        "annual_income": 75000,
+        "credit_bureau_score": 720,
+        "alternative_data": {"utility_payment_score": 850, "rent_payment_history": "excellent"}
+    }
+
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+async def run_level(client, endpoint, make_payload, concurrency, total):
+    """Send `total` requests with at most `concurrency` in flight"""
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+    errors = 0
+
+    async def one():
+        nonlocal errors
+        async with semaphore:
+            start = time.perf_counter()
+            try:
+                response = await client.post(endpoint, json=make_payload())
+                if response.status_code != 200:
+                    errors += 1
+            except httpx.HTTPError:
+                errors += 1
+            latencies.append((time.perf_counter() - start) * 1000)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one() for _ in range(total)))
+    elapsed = time.perf_counter() - started
+
+    return {
+        "concurrency": concurrency,
+        "requests": total,
+        "errors": errors,
+        "rps": total / elapsed if elapsed > 0 else 0.0,
+        "p50_ms": percentile(latencies, 50),
+        "p99_ms": percentile(latencies, 99)
+    }
+
+
+async def main(args):
+    if args.task == "fraud":
+        endpoint, make_payload = "/api/v1/fraud/check", lambda: fraud_payload(args.customer_id)
+    else:
+        endpoint, make_payload = "/api/v1/credit/assess", lambda: credit_payload(args.customer_id)
+
+    levels = [int(level) for level in args.levels.split(",")]
+    limits = httpx.Limits(max_connections=max(levels), max_keepalive_connections=max(levels))
+
+    print(f"🚀 Load testing {args.url}{endpoint}")
+    print(f"{'concurrency':>12} {'requests':>9} {'errors':>7} {'rps':>9} {'p50 ms':>9} {'p99 ms':>9}")
+
+    async with httpx.AsyncClient(base_url=args.url, limits=limits, timeout=args.timeout) as client:
+        for level in levels:
+            stats = await run_level(client, endpoint, make_payload, level, args.requests)
+            print(
+                f"{stats['concurrency']:>12} {stats['requests']:>9} {stats['errors']:>7} "
+                f"{stats['rps']:>9.2f} {stats['p50_ms']:>9.1f} {stats['p99_ms']:>9.1f}"
+            )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Concurrency sweep load test")
+    parser.add_argument("--url", default="http://localhost:8000")
+    parser.add_argument("--task", choices=["fraud", "credit"], default="fraud")
+    parser.add_argument("--customer-id", default="cust-12345")
+    parser.add_argument("--levels", default="1,2,4,8,16,32")
+    parser.add_argument("--requests", type=int, default=64, help="Requests per concurrency level")
+    parser.add_argument("--timeout", type=float, default=60.0)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,163 @@
+"""Full vs compact prompts on a recorded dataset.
+
+Scores every recorded request with both prompt variants (response cache
+bypassed, fraud fast path off, so every request reaches the LLM) and reports
+how often the compact prompt reaches the same decision, plus latency and
+token usage per variant. Run it before switching an agent to
+FRAUD_PROMPT_VARIANT / CREDIT_PROMPT_VARIANT=compact.
+
+The dataset is JSON lines, one request each:
+    {"agent": "fraud", "request": {...transaction...}, "customer_history": {...}}
+    {"agent": "credit", "request": {...application...}}
+`customer_history` is optional and has the shape of CustomerProfile.as_history().
+
+Usage:
+    python benchmarks/prompt_variants.py --dataset recorded.jsonl --concurrency 8
+    python benchmarks/prompt_variants.py --dataset recorded.jsonl --agent fraud --limit 200 --json
+"""
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.agents.credit_agent import CreditAssessmentAgent  # noqa: E402
+from app.agents.fraud_agent import FraudDetectionAgent  # noqa: E402
+from app.services.token_usage import token_ledger  # noqa: E402
+
+VARIANTS = ("full", "compact")
+
+
+class NoFastPath:
+    """Sends every transaction to the LLM"""
+
+    def score(self, transaction_data, customer_profile):
+        return None
+
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def load_dataset(path, agent, limit):
+    records = []
+    with open(path) as f:
+        for line in f:
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            if agent in (None, record["agent"]):
+                records.append(record)
+            if limit and len(records) >= limit:
+                break
+    return records
+
+
+def build_agent(kind, variant):
+    agent = FraudDetectionAgent() if kind == "fraud" else CreditAssessmentAgent()
+    agent.prompt_variant = variant
+    agent.token_budget = 0  # Compare the variants as written, not as trimmed
+    if kind == "fraud":
+        agent.fast_path = NoFastPath()
+    return agent
+
+
+async def score_all(kind, variant, records, concurrency):
+    """Decisions and latencies of one variant over the records, in dataset order"""
+    agent = build_agent(kind, variant)
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one(record):
+        async with semaphore:
+            started = time.perf_counter()
+            if kind == "fraud":
+                decision = await agent.acheck_transaction(
+                    record["request"], customer_history=record.get("customer_history"), bypass_cache=True
+                )
+            else:
+                decision = await agent.aassess_application(record["request"], bypass_cache=True)
+            return decision, (time.perf_counter() - started) * 1000
+
+    return await asyncio.gather(*(one(record) for record in records))
+
+
+def compare(kind, records, results):
+    """Agreement of the compact variant with the full one, per request"""
+    full, compact = results["full"], results["compact"]
+    label, score = ("action", "fraud_probability") if kind == "fraud" else ("decision", "risk_score")
+    agree = sum(a[0][label] == b[0][label] for a, b in zip(full, compact))
+    score_diffs = [abs(float(a[0][score]) - float(b[0][score])) for a, b in zip(full, compact)]
+    report = {
+        "requests": len(records),
+        "decision_agreement": round(agree / len(records), 4) if records else 0.0,
+        f"mean_abs_{score}_diff": round(statistics.mean(score_diffs), 2) if score_diffs else 0.0,
+        "variants": {}
+    }
+    usage = token_ledger.stats()["agents"].get(kind, {})
+    for variant in VARIANTS:
+        latencies = [latency for _, latency in results[variant]]
+        tokens = usage.get(variant, {})
+        report["variants"][variant] = {
+            "p50_ms": round(percentile(latencies, 50), 1),
+            "p95_ms": round(percentile(latencies, 95), 1),
+            "mean_ms": round(statistics.mean(latencies), 1) if latencies else 0.0,
+            "fallbacks": sum(
+                decision.get("decided_by") in ("fallback", "degraded") or decision.get("degraded", False)
+                or "Unable to parse LLM response" in decision.get("risk_factors", [])
+                for decision, _ in results[variant]
+            ),
+            "avg_prompt_tokens": tokens.get("avg_prompt_tokens", 0.0),
+            "avg_completion_tokens": tokens.get("avg_completion_tokens", 0.0),
+            "repair_calls": tokens.get("repair_calls", 0)
+        }
+    return report
+
+
+async def main(args):
+    records = load_dataset(args.dataset, args.agent, args.limit)
+    if not records:
+        print(f"❌ No matching records in {args.dataset}")
+        sys.exit(1)
+
+    reports = {}
+    for kind in ("fraud", "credit"):
+        subset = [r for r in records if r["agent"] == kind]
+        if not subset:
+            continue
+        results = {}
+        for variant in VARIANTS:
+            results[variant] = await score_all(kind, variant, subset, args.concurrency)
+        reports[kind] = compare(kind, subset, results)
+
+    if args.json:
+        print(json.dumps(reports))
+        return
+    for kind, report in reports.items():
+        print(f"📊 {kind}: {report['requests']} requests, decision agreement {report['decision_agreement']:.1%}")
+        for key, value in report.items():
+            if key.startswith("mean_abs_"):
+                print(f"   {key}: {value}")
+        for variant, stats in report["variants"].items():
+            print(
+                f"   {variant:8s} p50 {stats['p50_ms']:8.1f} ms  p95 {stats['p95_ms']:8.1f} ms  "
+                f"prompt {stats['avg_prompt_tokens']:7.1f} tok  completion {stats['avg_completion_tokens']:6.1f} tok  "
+                f"fallbacks {stats['fallbacks']}"
+            )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare full and compact prompts on recorded requests")
+    parser.add_argument("--dataset", required=True, help="JSON lines of recorded requests")
+    parser.add_argument("--agent", choices=["fraud", "credit"], help="Only score one agent's records")
+    parser.add_argument("--limit", type=int, default=0, help="Max records to score (0 = all)")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--json", action="store_true", help="Print machine-readable results only")
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,56 @@
+"""Re-score a loan book through the credit agent.
+
+Streams a CSV or JSONL portfolio file in constant memory, assesses rows with a
+worker pool, bulk-inserts CreditApplication rows per chunk and checkpoints after
+every chunk. Re-running the same command after a crash resumes where it stopped.
+
+Usage:
+    python bulk_assess.py portfolio.csv --workers 16 --chunk-size 500
+"""
+import argparse
+import asyncio
+from app.agents.orchestrator import OrchestratorAgent
+from app.services.bulk_credit import BulkCreditJob
+
+
+def print_progress(progress):
+    total = progress["rows_total"] or 0
+    pct = progress["rows_done"] / total * 100 if total else 0
+    eta = progress["eta_seconds"]
+    eta_text = f"{eta / 60:.1f} min" if eta is not None else "n/a"
+    print(
+        f"   {progress['rows_done']:,}/{total:,} rows ({pct:.1f}%) | "
+        f"✅ {progress['succeeded']:,} ❌ {progress['failed']:,} | "
+        f"{progress['rows_per_sec']:.1f} rows/s | ETA {eta_text}",
+        flush=True
+    )
+
+
+async def main(args):
+    job = BulkCreditJob(
+        args.source,
+        OrchestratorAgent(),
+        checkpoint_path=args.checkpoint,
+        chunk_size=args.chunk_size,
+        workers=args.workers,
+        on_progress=print_progress
+    )
+
+    print(f"📂 Bulk credit assessment: {args.source}")
+    print(f"   Checkpoint: {job.checkpoint_path}")
+    print(f"   Errors log: {job.errors_path}")
+    print("=" * 60)
+
+    progress = await job.run()
+
+    print("=" * 60)
+    print(f"✅ Completed: {progress['succeeded']:,} assessed, {progress['failed']:,} failed")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Bulk credit re-scoring from CSV/JSONL")
+    parser.add_argument("source", help="Portfolio file (.csv or .jsonl)")
+    parser.add_argument("--checkpoint", default=None, help="Checkpoint path (default: BULK_CHECKPOINT_DIR/<job_id>.checkpoint.json)")
+    parser.add_argument("--chunk-size", type=int, default=None)
+    parser.add_argument("--workers", type=int, default=None)
+    asyncio.run(main(parser.parse_args()))
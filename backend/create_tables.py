@@ -1,5 +1,5 @@
 from app.config.database import engine, Base
-from app.models.schemas import Customer, Transaction, FraudCase, CreditApplication, AgentLearningLog
+from app.models.schemas import Customer, Transaction, FraudCase, CreditApplication, AgentLearningLog, AgentOutcomeCounter, ShadowDecision
 
 print("Creating database tables...")
 Base.metadata.create_all(bind=engine)
@@ -0,0 +1,142 @@
+"""Apply schema changes to an existing database.
+
+`create_tables.py` only creates missing tables, so columns and indexes added
+to the models later are applied here. Each step is idempotent and recorded in
+`schema_migrations`; run this after pulling new code:
+
+    python migrate.py            # apply pending steps
+    python migrate.py --status   # list steps and whether they are applied
+"""
+import argparse
+from datetime import datetime
+from sqlalchemy import inspect, select, update, text, Table, Column, String, DateTime, MetaData, Index
+from sqlalchemy.orm import Session
+from app.config.database import engine, Base
+from app.models.schemas import CreditApplication
+from app.services import outcome_counters
+
+migration_table = Table(
+    "schema_migrations",
+    MetaData(),
+    Column("migration_id", String(100), primary_key=True),
+    Column("applied_at", DateTime, nullable=False)
+)
+
+
+def add_column(table: str, column: str):
+    """Step that adds a model column (DDL taken from the model) if it is missing"""
+    def step(conn):
+        if column in {c["name"] for c in inspect(conn).get_columns(table)}:
+            return
+        model_column = Base.metadata.tables[table].c[column]
+        column_type = model_column.type.compile(dialect=conn.dialect)
+        conn.execute(text(f"ALTER TABLE {table} ADD COLUMN {column} {column_type}"))
+    return step
+
+
+def create_index(table: str, name: str):
+    """Step that creates an index declared on the model if it is missing.
+
+    An index no longer declared on the model has been superseded by a later
+    step; creating it here would only leave that step to drop it again.
+    """
+    def step(conn):
+        if name in {i["name"] for i in inspect(conn).get_indexes(table)}:
+            return
+        index = next((i for i in Base.metadata.tables[table].indexes if i.name == name), None)
+        if index is not None:
+            index.create(conn)
+    return step
+
+
+def drop_index(table: str, name: str):
+    """Step that drops an index the models no longer declare, if it exists"""
+    def step(conn):
+        if name not in {i["name"] for i in inspect(conn).get_indexes(table)}:
+            return
+        Index(name, _table=Table(table, MetaData())).drop(conn)  # Detached: must not join the models
+    return step
+
+
+def backfill_credit_feedback(conn):
+    """Copy feedback recorded only in explainability_json into the indexed columns"""
+    outcome = CreditApplication.explainability_json["actual_outcome"].as_string()
+    correct = CreditApplication.explainability_json["prediction_correct"].as_boolean()
+    conn.execute(
+        update(CreditApplication)
+        .where(CreditApplication.feedback_outcome.is_(None), outcome.isnot(None))
+        .values(feedback_outcome=outcome, prediction_correct=correct)
+    )
+
+
+def seed_outcome_counters(conn):
+    """Count feedback recorded before agent_outcome_counters existed"""
+    with Session(bind=conn) as db:
+        outcome_counters.rebuild(db)
+        db.commit()  # Joins the migration's transaction; committed with it
+
+
+# Ordered; never edit or reorder an applied step, append a new one instead
+MIGRATIONS = [
+    ("0001_transactions_fraud_decision", add_column("transactions", "fraud_decision")),
+    ("0002_credit_applications_feedback_outcome", add_column("credit_applications", "feedback_outcome")),
+    ("0003_credit_applications_prediction_correct", add_column("credit_applications", "prediction_correct")),
+    ("0004_backfill_credit_feedback", backfill_credit_feedback),
+    ("0005_ix_credit_applications_feedback", create_index("credit_applications", "ix_credit_applications_feedback")),
+    ("0006_ix_fraud_cases_status_detected", create_index("fraud_cases", "ix_fraud_cases_status_detected")),
+    ("0007_seed_agent_outcome_counters", seed_outcome_counters),
+    ("0008_ix_credit_applications_decision_ts", create_index("credit_applications", "ix_credit_applications_decision_ts")),
+    ("0009_ix_credit_applications_customer_ts", create_index("credit_applications", "ix_credit_applications_customer_ts")),
+    ("0010_ix_fraud_cases_detected_case", create_index("fraud_cases", "ix_fraud_cases_detected_case")),
+    ("0011_ix_transactions_customer_ts", create_index("transactions", "ix_transactions_customer_ts")),
+    ("0012_ix_fraud_cases_status_detected_case", create_index("fraud_cases", "ix_fraud_cases_status_detected_case")),
+    ("0013_drop_ix_fraud_cases_status_detected", drop_index("fraud_cases", "ix_fraud_cases_status_detected")),
+    ("0014_agent_learning_logs_pr_auc", add_column("agent_learning_logs", "pr_auc")),
+    ("0015_agent_learning_logs_brier_score", add_column("agent_learning_logs", "brier_score")),
+    ("0016_agent_learning_logs_decision_threshold", add_column("agent_learning_logs", "decision_threshold")),
+    ("0017_agent_learning_logs_evaluation_json", add_column("agent_learning_logs", "evaluation_json")),
+]
+
+
+def applied_migrations(conn) -> set:
+    migration_table.create(conn, checkfirst=True)
+    return set(conn.execute(select(migration_table.c.migration_id)).scalars())
+
+
+def migrate() -> list:
+    """Apply pending steps in order; returns the ids that ran"""
+    Base.metadata.create_all(bind=engine)  # New tables get every current column directly
+    ran = []
+    with engine.begin() as conn:
+        done = applied_migrations(conn)
+    for migration_id, step in MIGRATIONS:
+        if migration_id in done:
+            continue
+        with engine.begin() as conn:
+            step(conn)
+            conn.execute(migration_table.insert().values(migration_id=migration_id, applied_at=datetime.utcnow()))
+        ran.append(migration_id)
+    return ran
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Apply pending schema migrations")
+    parser.add_argument("--status", action="store_true", help="List migrations without applying them")
+    args = parser.parse_args()
+
+    if args.status:
+        with engine.begin() as conn:
+            done = applied_migrations(conn)
+        for migration_id, _ in MIGRATIONS:
+            print(f"{'✅' if migration_id in done else '⏳'} {migration_id}")
+        return
+
+    print("Applying schema migrations...")
+    ran = migrate()
+    for migration_id in ran:
+        print(f"  ✅ {migration_id}")
+    print(f"✅ Database schema up to date ({len(ran)} applied)")
+
+
+if __name__ == "__main__":
+    main()
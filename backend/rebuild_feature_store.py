@@ -0,0 +1,50 @@
+"""Rebuild the customer feature store from the transactions table.
+
+Each API worker keeps its own in-process copy of the per-customer aggregates
+(built at startup and kept current by tailing `transactions`). This command
+asks a running backend to discard and rebuild them, e.g. after a backfill or
+manual data fix. Run it once per worker, or restart the workers.
+
+Without --url it rebuilds locally and prints the resulting stats, which is a
+quick way to check build time and memory footprint against a database.
+
+Usage:
+    python rebuild_feature_store.py --url http://localhost:8000
+    python rebuild_feature_store.py --customer cust-12345
+"""
+import argparse
+import asyncio
+import httpx
+from app.services.feature_store import feature_store
+
+
+async def rebuild_locally(customer_id: str = None):
+    stats = await feature_store.rebuild()
+    print(f"✅ Rebuilt {stats['customers']:,} customer profiles from {stats['transactions']:,} transactions in {stats['seconds']}s")
+
+    if customer_id:
+        profile = feature_store.get(customer_id)
+        if not profile:
+            print(f"⚠️  No transactions for {customer_id}")
+            return
+        print(f"\n👤 {customer_id}")
+        print(f"   Transactions: {profile.count}")
+        print(f"   Amount mean/std: {profile.mean_amount:,.2f} / {profile.std_amount:,.2f}")
+        print(f"   Top merchants: {', '.join(profile.merchants.top())}")
+        print(f"   Top locations: {', '.join(profile.locations.top())}")
+        print(f"   Frequency: {profile.as_history()['frequency']}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Rebuild the customer feature store")
+    parser.add_argument("--url", default=None, help="Backend base URL; rebuilds the store inside the running API")
+    parser.add_argument("--customer", default=None, help="Print the rebuilt profile for this customer (local mode)")
+    args = parser.parse_args()
+
+    if args.url:
+        response = httpx.post(f"{args.url}/api/v1/fraud/features/rebuild", timeout=None)
+        response.raise_for_status()
+        stats = response.json()
+        print(f"✅ Backend rebuilt {stats['customers']:,} customer profiles from {stats['transactions']:,} transactions in {stats['seconds']}s")
+    else:
+        asyncio.run(rebuild_locally(args.customer))
@@ -1,112 +1,105 @@
 from app.config.database import SessionLocal
-from app.models.schemas import CreditApplication, FraudCase, AgentLearningLog
-from datetime import datetime
-import json
+from app.models.schemas import AgentLearningLog
+from app.services import evaluation, outcome_counters
+import argparse
+import sys
 
-def calculate_credit_metrics(db):
+# Misclassification costs for the threshold sweep, relative to each other
+CREDIT_COSTS = {"false_positive": 5.0, "false_negative": 1.0}  # Approving a default vs turning away a good payer
+FRAUD_COSTS = {"false_positive": 1.0, "false_negative": 10.0}  # Investigating a legitimate case vs missing fraud
+
+def calculate_credit_metrics(db, costs=CREDIT_COSTS):
     """Calculate credit agent performance metrics"""
     
-    apps = db.query(CreditApplication).filter(
-        CreditApplication.explainability_json.isnot(None)
-    ).all()
-    
-    apps_with_feedback = [
-        app for app in apps 
-        if app.explainability_json and "actual_outcome" in app.explainability_json
-    ]
+    # Operating point from the confusion counters maintained by the feedback router;
+    # one column-wise query over the scored outcomes for the curves, calibration and threshold sweep
+    counts = outcome_counters.totals(db, "credit")
+    metrics = evaluation.evaluate_credit(db, counts, costs["false_positive"], costs["false_negative"]) if counts["samples"] else None
     
-    if not apps_with_feedback:
+    if not metrics:
         print("⚠️  No feedback data available for credit agent")
         return None
     
-    total = len(apps_with_feedback)
-    correct = len([
-        app for app in apps_with_feedback 
-        if app.explainability_json.get("prediction_correct") == True
-    ])
-    
-    # Calculate precision and recall
-    true_positives = len([
-        app for app in apps_with_feedback 
-        if app.decision.value == "approved" 
-        and app.explainability_json.get("actual_outcome") == "paid_on_time"
-    ])
-    
-    false_positives = len([
-        app for app in apps_with_feedback 
-        if app.decision.value == "approved" 
-        and app.explainability_json.get("actual_outcome") == "default"
-    ])
-    
-    false_negatives = len([
-        app for app in apps_with_feedback 
-        if app.decision.value == "rejected" 
-        and app.explainability_json.get("actual_outcome") == "paid_on_time"
-    ])
-    
-    accuracy = correct / total if total > 0 else 0
-    precision = true_positives / (true_positives + false_positives) if (true_positives + false_positives) > 0 else 0
-    recall = true_positives / (true_positives + false_negatives) if (true_positives + false_negatives) > 0 else 0
-    f1_score = 2 * (precision * recall) / (precision + recall) if (precision + recall) > 0 else 0
-    
-    return {
-        "accuracy": accuracy,
-        "precision": precision,
-        "recall": recall,
-        "f1_score": f1_score,
-        "training_samples": total
-    }
+    metrics["training_samples"] = counts["samples"]
+    return metrics
 
-def calculate_fraud_metrics(db):
+def calculate_fraud_metrics(db, costs=FRAUD_COSTS):
     """Calculate fraud agent performance metrics"""
     
-    cases = db.query(FraudCase).filter(
-        FraudCase.investigation_status.in_(["confirmed", "false_positive"])
-    ).all()
+    counts = outcome_counters.totals(db, "fraud")
+    metrics = evaluation.evaluate_fraud(db, counts, costs["false_positive"], costs["false_negative"]) if counts["samples"] else None
     
-    if not cases:
+    if not metrics:
         print("⚠️  No resolved fraud cases for training")
         return None
     
-    total = len(cases)
-    correct = len([
-        case for case in cases 
-        if (case.fraud_probability > 60 and case.investigation_status == "confirmed") or
-           (case.fraud_probability <= 60 and case.investigation_status == "false_positive")
-    ])
-    
-    # Calculate metrics
-    true_positives = len([
-        case for case in cases 
-        if case.fraud_probability > 60 and case.investigation_status == "confirmed"
-    ])
-    
-    false_positives = len([
-        case for case in cases 
-        if case.fraud_probability > 60 and case.investigation_status == "false_positive"
-    ])
-    
-    false_negatives = len([
-        case for case in cases 
-        if case.fraud_probability <= 60 and case.investigation_status == "confirmed"
-    ])
+    metrics["training_samples"] = counts["samples"]
+    return metrics
+
+def print_evaluation(metrics):
+    """Curve, calibration and threshold results shared by both agents"""
+    optimal = metrics["optimal_threshold"]
+    threshold = "predict none" if optimal["threshold"] is None else f"{optimal['threshold']:g}"
+    print(f"   AUC-ROC: {metrics['auc_roc']:.4f}" if metrics["auc_roc"] is not None else "   AUC-ROC: n/a (one class only)")
+    print(f"   PR AUC: {metrics['pr_auc']:.4f}" if metrics["pr_auc"] is not None else "   PR AUC: n/a (no positives)")
+    print(f"   Brier Score: {metrics['brier_score']:.4f} (ECE {metrics['expected_calibration_error']:.4f})")
+    print(
+        f"   Cost-optimal threshold: {threshold} "
+        f"(cost/sample {optimal['cost_per_sample']:.4f} vs {optimal['operating_cost_per_sample']:.4f} today)"
+    )
+
+def learning_log(agent_type, metrics, promoted, model_version="v1.1", extra=None):
+    """AgentLearningLog row for an evaluation"""
+    return AgentLearningLog(
+        agent_type=agent_type,
+        model_version=model_version,
+        accuracy=metrics['accuracy'],
+        precision_score=metrics['precision'],
+        recall_score=metrics['recall'],
+        f1_score=metrics['f1_score'],
+        auc_roc=metrics['auc_roc'],
+        false_positive_rate=metrics['false_positive_rate'],
+        pr_auc=metrics['pr_auc'],
+        brier_score=metrics['brier_score'],
+        decision_threshold=metrics['optimal_threshold']['threshold'],
+        evaluation_json={
+            "optimal_threshold": metrics['optimal_threshold'],
+            "calibration": metrics['bins'],
+            "expected_calibration_error": metrics['expected_calibration_error'],
+            "curves": metrics['curves'],
+            "confusion": {name: metrics[name] for name in outcome_counters.CELLS},
+            **(extra or {})
+        },
+        training_samples=metrics['training_samples'],
+        promoted_to_production=promoted
+    )
+
+def verify_counters(rebuild: bool = False) -> bool:
+    """Recount every labeled row and compare with the stored counters"""
     
-    accuracy = correct / total if total > 0 else 0
-    precision = true_positives / (true_positives + false_positives) if (true_positives + false_positives) > 0 else 0
-    recall = true_positives / (true_positives + false_negatives) if (true_positives + false_negatives) > 0 else 0
-    f1_score = 2 * (precision * recall) / (precision + recall) if (precision + recall) > 0 else 0
-    fpr = false_positives / (false_positives + len([c for c in cases if c.investigation_status == "false_positive"])) if total > 0 else 0
+    db = SessionLocal()
     
-    return {
-        "accuracy": accuracy,
-        "precision": precision,
-        "recall": recall,
-        "f1_score": f1_score,
-        "false_positive_rate": fpr,
-        "training_samples": total
-    }
+    try:
+        print("🔍 Verifying outcome counters against a full recount...")
+        mismatches = outcome_counters.verify(db)
+        
+        for (agent_type, model_version), diff in sorted(mismatches.items()):
+            print(f"   ❌ {agent_type} {model_version}: stored {diff['stored']} != recount {diff['expected']}")
+        
+        if not mismatches:
+            print("   ✅ Counters match the labeled rows")
+        
+        if rebuild:
+            counters = outcome_counters.rebuild(db)
+            db.commit()
+            print(f"   🔧 Counters rebuilt for {len(counters)} agent versions")
+            return True
+        
+        return not mismatches
+    finally:
+        db.close()
 
-def retrain_agents():
+def retrain_agents(credit_costs=CREDIT_COSTS, fraud_costs=FRAUD_COSTS):
     """Main retraining function"""
     
     db = SessionLocal()
@@ -117,27 +110,18 @@ def retrain_agents():
         
         # Credit Agent
         print("\n📊 Evaluating Credit Assessment Agent...")
-        credit_metrics = calculate_credit_metrics(db)
+        credit_metrics = calculate_credit_metrics(db, credit_costs)
         
         if credit_metrics:
             print(f"   Accuracy: {credit_metrics['accuracy']:.2%}")
             print(f"   Precision: {credit_metrics['precision']:.2%}")
             print(f"   Recall: {credit_metrics['recall']:.2%}")
             print(f"   F1 Score: {credit_metrics['f1_score']:.2%}")
+            print_evaluation(credit_metrics)
             print(f"   Training Samples: {credit_metrics['training_samples']}")
             
             # Log metrics
-            log = AgentLearningLog(
-                agent_type="credit",
-                model_version="v1.1",
-                accuracy=credit_metrics['accuracy'],
-                precision_score=credit_metrics['precision'],
-                recall_score=credit_metrics['recall'],
-                f1_score=credit_metrics['f1_score'],
-                training_samples=credit_metrics['training_samples'],
-                promoted_to_production=credit_metrics['accuracy'] > 0.75
-            )
-            db.add(log)
+            db.add(learning_log("credit", credit_metrics, credit_metrics['accuracy'] > 0.75))
             
             if credit_metrics['accuracy'] > 0.75:
                 print("   ✅ Model promoted to production")
@@ -146,7 +130,7 @@ def retrain_agents():
         
         # Fraud Agent
         print("\n🚨 Evaluating Fraud Detection Agent...")
-        fraud_metrics = calculate_fraud_metrics(db)
+        fraud_metrics = calculate_fraud_metrics(db, fraud_costs)
         
         if fraud_metrics:
             print(f"   Accuracy: {fraud_metrics['accuracy']:.2%}")
@@ -154,21 +138,11 @@ def retrain_agents():
             print(f"   Recall: {fraud_metrics['recall']:.2%}")
             print(f"   F1 Score: {fraud_metrics['f1_score']:.2%}")
             print(f"   False Positive Rate: {fraud_metrics['false_positive_rate']:.2%}")
+            print_evaluation(fraud_metrics)
             print(f"   Training Samples: {fraud_metrics['training_samples']}")
             
             # Log metrics
-            log = AgentLearningLog(
-                agent_type="fraud",
-                model_version="v1.1",
-                accuracy=fraud_metrics['accuracy'],
-                precision_score=fraud_metrics['precision'],
-                recall_score=fraud_metrics['recall'],
-                f1_score=fraud_metrics['f1_score'],
-                false_positive_rate=fraud_metrics['false_positive_rate'],
-                training_samples=fraud_metrics['training_samples'],
-                promoted_to_production=fraud_metrics['accuracy'] > 0.85
-            )
-            db.add(log)
+            db.add(learning_log("fraud", fraud_metrics, fraud_metrics['accuracy'] > 0.85))
             
             if fraud_metrics['accuracy'] > 0.85:
                 print("   ✅ Model promoted to production")
@@ -187,4 +161,19 @@ def retrain_agents():
         db.close()
 
 if __name__ == "__main__":
-    retrain_agents()
+    parser = argparse.ArgumentParser(description="Evaluate the agents from recorded feedback")
+    parser.add_argument("--verify", action="store_true", help="Recount labeled rows and check the outcome counters")
+    parser.add_argument("--rebuild-counters", action="store_true", help="Replace the outcome counters with a full recount")
+    parser.add_argument("--credit-fp-cost", type=float, default=CREDIT_COSTS["false_positive"], help="Cost of approving a default")
+    parser.add_argument("--credit-fn-cost", type=float, default=CREDIT_COSTS["false_negative"], help="Cost of rejecting a good payer")
+    parser.add_argument("--fraud-fp-cost", type=float, default=FRAUD_COSTS["false_positive"], help="Cost of flagging a legitimate case")
+    parser.add_argument("--fraud-fn-cost", type=float, default=FRAUD_COSTS["false_negative"], help="Cost of missing fraud")
+    args = parser.parse_args()
+    
+    if args.verify or args.rebuild_counters:
+        sys.exit(0 if verify_counters(rebuild=args.rebuild_counters) else 1)
+    
+    retrain_agents(
+        credit_costs={"false_positive": args.credit_fp_cost, "false_negative": args.credit_fn_cost},
+        fraud_costs={"false_positive": args.fraud_fp_cost, "false_negative": args.fraud_fn_cost}
+    )
@@ -0,0 +1,205 @@
+"""Train the in-process fraud model on resolved fraud cases.
+
+Replays the transactions table in time order through the same per-customer
+aggregates the feature store keeps, so every labeled transaction gets the
+features it had when it was scored. Fits an L2-regularized logistic
+regression on the older part of the labels and evaluates it on the newest
+part (--holdout), next to the production scores of the same cases.
+
+Every run writes a versioned artifact to FRAUD_MODEL_DIR and an
+AgentLearningLog row. A model that clears --min-auc and does at least as well
+as production on the holdout is promoted: it is also written as the artifact
+the API loads (FRAUD_MODEL_MODE=shadow or challenger), then picked up by
+restarting the workers or POST /api/v1/fraud/model/reload.
+
+Only flagged transactions get fraud cases, so labels cover the escalated
+band; --negative-sample adds a share of never-flagged transactions as
+legitimate examples. A model trained without any (--negative-sample 0) has
+never seen a normal low-risk transaction: its report records that, and in
+challenger mode it may block but never approves on its own.
+
+Usage:
+    python train_fraud_model.py --holdout 0.2 --negative-sample 0.05
+    python train_fraud_model.py --no-promote
+"""
+import argparse
+import os
+import random
+import sys
+import time
+from datetime import datetime
+import numpy as np
+from sqlalchemy import select
+from app.config.database import SessionLocal
+from app.config.settings import settings
+from app.models.schemas import FraudCase, Transaction
+from app.services import evaluation
+from app.services.feature_store import CustomerProfile
+from app.services.fraud_model import FraudModel, PROMOTED_ARTIFACT, fit_logistic, model_features
+from app.services.outcome_counters import FRAUD_THRESHOLD, RESOLVED_STATUSES
+from retrain_models import FRAUD_COSTS, learning_log
+
+STREAM_BATCH = 5000
+
+
+def load_cases(db):
+    """{txn_id: (investigation_status, production fraud_probability)} of every fraud case"""
+    rows = db.execute(select(FraudCase.txn_id, FraudCase.investigation_status, FraudCase.fraud_probability)).all()
+    return {row.txn_id: (row.investigation_status, row.fraud_probability) for row in rows}
+
+
+def build_dataset(db, cases, negative_sample, seed):
+    """Point-in-time features, labels and production scores (NaN when there is no case), oldest first"""
+    sampler = random.Random(seed)
+    profiles = {}
+    features, labels, production = [], [], []
+    query = select(
+        Transaction.txn_id,
+        Transaction.customer_id,
+        Transaction.amount,
+        Transaction.merchant_id,
+        Transaction.location_lat,
+        Transaction.location_long,
+        Transaction.device_fingerprint,
+        Transaction.ip_address,
+        Transaction.timestamp
+    ).order_by(Transaction.timestamp)
+
+    for row in db.execute(query.execution_options(yield_per=STREAM_BATCH)).mappings():
+        txn = dict(row)
+        profile = profiles.get(txn["customer_id"])
+        case = cases.get(txn["txn_id"])
+        if case is not None:
+            label = case[0] == "confirmed" if case[0] in RESOLVED_STATUSES else None
+        else:
+            label = False if negative_sample and sampler.random() < negative_sample else None
+
+        if label is not None:
+            transaction_data = {
+                "amount": txn["amount"],
+                "location": {"lat": txn["location_lat"], "long": txn["location_long"]},
+                "device_fingerprint": txn["device_fingerprint"],
+                "ip_address": txn["ip_address"]
+            }
+            features.append(model_features(transaction_data, profile, now=txn["timestamp"].timestamp()))
+            labels.append(label)
+            production.append(case[1] if case is not None else np.nan)
+
+        if profile is None:
+            profile = profiles[txn["customer_id"]] = CustomerProfile()
+        profile.update(txn)
+
+    if not labels:
+        return None
+    return np.vstack(features), np.array(labels, dtype=np.bool_), np.array(production, dtype=np.float64)
+
+
+def evaluate_scores(scores, labels, costs):
+    return evaluation.evaluate(
+        scores, labels, evaluation.confusion_metrics(scores > FRAUD_THRESHOLD, labels), 100.0,
+        costs["false_positive"], costs["false_negative"]
+    )
+
+
+def train(args):
+    db = SessionLocal()
+    try:
+        print("🧠 Training fraud model...")
+        print("=" * 60)
+        started = time.perf_counter()
+        cases = load_cases(db)
+        dataset = build_dataset(db, cases, args.negative_sample, args.seed)
+        if dataset is None:
+            print("⚠️  No labeled transactions to train on")
+            return False
+        X, y, production = dataset
+        print(f"   Labeled transactions: {len(y):,} ({int(y.sum()):,} confirmed fraud) in {time.perf_counter() - started:.1f}s")
+
+        split = int(len(y) * (1 - args.holdout))
+        if split == 0 or split == len(y) or y[:split].all() or not y[:split].any():
+            print("⚠️  Not enough labels of both classes for a train/holdout split")
+            return False
+
+        fit_started = time.perf_counter()
+        weights, bias, mean, scale = fit_logistic(X[:split], y[:split], l2=args.l2)
+        version = f"lr-{datetime.utcnow():%Y%m%d%H%M%S}"
+        model = FraudModel(weights, bias, mean, scale, version)
+        print(f"   Fitted {version} on {split:,} transactions in {time.perf_counter() - fit_started:.2f}s")
+
+        costs = {"false_positive": args.fp_cost, "false_negative": args.fn_cost}
+        holdout_y = y[split:]
+        metrics = evaluate_scores(model.predict_proba(X[split:]) * 100, holdout_y, costs)
+
+        # Production scores exist only for transactions that got a case
+        has_case = ~np.isnan(production[split:])
+        model_on_cases = evaluate_scores(model.predict_proba(X[split:][has_case]) * 100, holdout_y[has_case], costs)
+        champion = evaluate_scores(production[split:][has_case], holdout_y[has_case], costs)
+
+        print(f"\n📊 Holdout ({len(holdout_y):,} transactions)")
+        print(f"   Accuracy: {metrics['accuracy']:.2%}")
+        print(f"   Precision: {metrics['precision']:.2%}")
+        print(f"   Recall: {metrics['recall']:.2%}")
+        print(f"   AUC-ROC: {metrics['auc_roc']:.4f}" if metrics["auc_roc"] is not None else "   AUC-ROC: n/a (one class only)")
+        print(f"   Brier Score: {metrics['brier_score']:.4f}")
+        model_auc = model_on_cases["auc_roc"] if model_on_cases else None
+        champion_auc = champion["auc_roc"] if champion else None
+        if model_auc is not None and champion_auc is not None:
+            print(f"   On fraud cases: model AUC {model_auc:.4f} vs production {champion_auc:.4f}")
+
+        promoted = (
+            not args.no_promote
+            and metrics["auc_roc"] is not None and metrics["auc_roc"] >= args.min_auc
+            and (model_auc is None or champion_auc is None or model_auc >= champion_auc)
+        )
+        model.promoted = promoted
+        # Without never-flagged negatives the model cannot tell a normal transaction from an escalated one
+        never_flagged = int(np.count_nonzero(np.isnan(production[:split])))
+        if not never_flagged:
+            print("   ⚠️  No never-flagged transactions in training: the model will not auto-approve")
+        model.report = {
+            "training_samples": split,
+            "never_flagged_negatives": never_flagged,
+            "negative_sample": args.negative_sample,
+            "can_approve": never_flagged > 0,
+            "holdout_samples": len(holdout_y),
+            "auc_roc": metrics["auc_roc"],
+            "pr_auc": metrics["pr_auc"],
+            "brier_score": metrics["brier_score"],
+            "production_auc_roc": champion_auc
+        }
+
+        artifact = os.path.join(settings.FRAUD_MODEL_DIR, f"fraud_model-{version}.json")
+        model.save(artifact)
+        print(f"\n💾 Saved {artifact}")
+        if promoted:
+            model.save(os.path.join(settings.FRAUD_MODEL_DIR, PROMOTED_ARTIFACT))
+            print("   ✅ Model promoted to production")
+        else:
+            print(f"   ⚠️  Not promoted (needs AUC >= {args.min_auc} and no worse than production)")
+
+        metrics["training_samples"] = split
+        db.add(learning_log("fraud", metrics, promoted, model_version=version, extra={
+            "artifact": artifact,
+            "never_flagged_negatives": never_flagged,
+            "can_approve": never_flagged > 0,
+            "model_on_fraud_cases": {key: model_on_cases[key] for key in ("auc_roc", "pr_auc", "brier_score")} if model_on_cases else None,
+            "production_on_fraud_cases": {key: champion[key] for key in ("auc_roc", "pr_auc", "brier_score")} if champion else None
+        }))
+        db.commit()
+        return True
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Train the in-process fraud model on resolved fraud cases")
+    parser.add_argument("--holdout", type=float, default=0.2, help="Newest share of labels kept for evaluation")
+    parser.add_argument("--negative-sample", type=float, default=0.02, help="Share of never-flagged transactions added as legitimate")
+    parser.add_argument("--l2", type=float, default=1.0, help="L2 regularization strength")
+    parser.add_argument("--min-auc", type=float, default=0.75, help="Holdout AUC needed for promotion")
+    parser.add_argument("--fp-cost", type=float, default=FRAUD_COSTS["false_positive"], help="Cost of flagging a legitimate transaction")
+    parser.add_argument("--fn-cost", type=float, default=FRAUD_COSTS["false_negative"], help="Cost of missing fraud")
+    parser.add_argument("--no-promote", action="store_true", help="Only write the versioned artifact")
+    parser.add_argument("--seed", type=int, default=0, help="Seed for --negative-sample")
+    args = parser.parse_args()
+    sys.exit(0 if train(args) else 1)